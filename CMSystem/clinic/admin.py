@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Bill, MedicalRecord, MedicineType, Staff, Department, Salary, Gender, Specialization, Doctor, Receptionist, TimeSlot, Schedule, Patient, Appointment, Token, Medicine, Prescription, Consultation
+from .models import Bill, MedicalRecord, MedicineType, Staff, Department, Salary, Gender, Specialization, Doctor, Receptionist, TimeSlot, Schedule, Patient, Appointment, Token, TokenCounter, Medicine, Prescription, Consultation, DailyRollup, DailyDiagnosisRollup, Job
 # Register your models here.
 admin.site.register(Staff)
 admin.site.register(Department)
@@ -13,9 +13,13 @@ admin.site.register(Schedule)
 admin.site.register(Patient)
 admin.site.register(Appointment)
 admin.site.register(Token)
+admin.site.register(TokenCounter)
 admin.site.register(Medicine)
 admin.site.register(Prescription)
 admin.site.register(Consultation)
 admin.site.register(MedicalRecord)
 admin.site.register(Bill)
 admin.site.register(MedicineType)
+admin.site.register(DailyRollup)
+admin.site.register(DailyDiagnosisRollup)
+admin.site.register(Job)
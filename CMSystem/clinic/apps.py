@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ClinicConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'clinic'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        # Modules defining background jobs, so run_jobs workers know them
+        from . import photos, reporting  # noqa: F401
@@ -0,0 +1,122 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .history import ensure_month_partitions, hot_since, month_of
+from .models import (
+    Appointment, ArchivedAppointment, ArchivedConsultation, ArchivedSchedule, ArchivedToken, Consultation,
+    Schedule, Token,
+)
+from .token_events import muted_token_events
+
+
+# Archiving inactive rows
+# archive_inactive moves rows that were inactive before a cutoff into the
+# Archived* tables (see models.py), a batch at a time, each batch copied and
+# deleted in one transaction. A row that live rows still point at (a
+# cancelled appointment with a bill, a completed token with a consultation)
+# stays where it is. Consultations are archived first, then tokens,
+# appointments and schedules, so one run can clear a whole chain. Inactive
+# rows count in neither the rollups nor schedule capacity, so removing them
+# changes neither.
+#
+# archive_history moves whole months of tokens, active or not, older than the
+# hot months (see history.py) together with their consultations. The
+# consultations' medical records stay and read them from the archive. The
+# daily rollups already count the archived consultations and keep them;
+# backfill_rollups over archived months would drop them.
+
+# (model, archive model, the date a row is aged by)
+ARCHIVES = [
+    (Consultation, ArchivedConsultation, 'created_at'),
+    (Token, ArchivedToken, 'issued_at'),
+    (Appointment, ArchivedAppointment, 'appointment_date'),
+    (Schedule, ArchivedSchedule, 'schedule_date'),
+]
+
+BATCH_SIZE = 1000
+
+
+def _unreferenced(model):
+    return [
+        ~Exists(relation.related_model._base_manager.filter(**{relation.field.name: OuterRef('pk')}))
+        for relation in model._meta.related_objects if not relation.many_to_many
+    ]
+
+
+def archivable(model, date_field, cutoff):
+    """Inactive rows of ``model`` older than ``cutoff`` that no live row refers to."""
+    if not isinstance(model._meta.get_field(date_field), models.DateTimeField):
+        cutoff = cutoff.date()
+    return (
+        model.all_objects.exclude(model.active_condition)
+        .filter(*_unreferenced(model), **{f'{date_field}__lt': cutoff})
+    )
+
+
+def _archive_batch(model, archive, pks):
+    rows = list(model._base_manager.filter(pk__in=pks).values(*[field.attname for field in model._meta.concrete_fields]))
+    links = {}
+    for field in model._meta.many_to_many:
+        through = field.remote_field.through
+        source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+        links[field.name] = defaultdict(list)
+        for pk, related in through.objects.filter(**{f'{source}__in': pks}).values_list(source, target):
+            links[field.name][pk].append(related)
+    if archive.period_field:
+        ensure_month_partitions(archive, {month_of(row[archive.period_field]) for row in rows})
+    archive.objects.bulk_create([
+        archive(**row, **{name: ids[row['id']] for name, ids in links.items()}) for row in rows
+    ])
+    with muted_token_events():
+        model._base_manager.filter(pk__in=pks).delete()
+    return len(rows)
+
+
+def archive_inactive(days, batch_size=BATCH_SIZE, dry_run=False):
+    """Move inactive rows older than ``days`` to the archive tables; returns the count per model."""
+    cutoff = timezone.now() - timedelta(days=days)
+    counts = {}
+    for model, archive, date_field in ARCHIVES:
+        counts[model._meta.model_name] = 0
+        if dry_run:
+            counts[model._meta.model_name] = archivable(model, date_field, cutoff).count()
+            continue
+        while True:
+            with transaction.atomic():
+                pks = list(
+                    archivable(model, date_field, cutoff).select_for_update()
+                    .order_by('pk').values_list('pk', flat=True)[:batch_size]
+                )
+                if not pks:
+                    break
+                counts[model._meta.model_name] += _archive_batch(model, archive, pks)
+    return counts
+
+
+def archive_history(months=None, batch_size=BATCH_SIZE, dry_run=False):
+    """Move tokens issued before the hot months, and their consultations, to the archive tables."""
+    cutoff = hot_since(months)
+    tokens = Token._base_manager.filter(issued_at__lt=cutoff)
+    if dry_run:
+        return {
+            'consultation': Consultation._base_manager.filter(token__in=tokens).count(),
+            'token': tokens.count(),
+        }
+    counts = {'consultation': 0, 'token': 0}
+    while True:
+        with transaction.atomic():
+            token_pks = list(tokens.select_for_update().order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not token_pks:
+                break
+            consultation_pks = list(
+                Consultation._base_manager.filter(token__in=token_pks).order_by('pk').values_list('pk', flat=True)
+            )
+            # Consultations first: deleting a token would cascade to them.
+            if consultation_pks:
+                counts['consultation'] += _archive_batch(Consultation, ArchivedConsultation, consultation_pks)
+            counts['token'] += _archive_batch(Token, ArchivedToken, token_pks)
+    return counts
@@ -0,0 +1,153 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import serializers
+from rest_framework.utils.encoders import JSONEncoder
+
+from .field_selection import selection_from_request
+from .models import Appointment, Patient, Token
+from .query_plans import apply_query_plan
+from .search import mobile_prefix, search_by_mobile, search_by_name
+from .token_events import channel_name, queue_snapshot, token_broker
+from .serializers import (
+    AppointmentSerializer, DoctorDayQuerySerializer, PatientSearchQuerySerializer, PatientSerializer,
+    TokenSerializer
+)
+
+
+# Async read endpoints
+# Native async views for the busiest reads, for deployments served through
+# asgi.py (e.g. uvicorn). Rows are fetched with the async ORM, so a request
+# waiting on the database does not hold a worker thread. The query plan is
+# applied before fetching, which keeps serialization free of queries.
+# Responses match the corresponding DRF endpoints, including ?fields=/?expand=.
+# Permissions match too: these endpoints are open, like their viewsets.
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def _validated(serializer_class, request):
+    query = serializer_class(data=request.GET)
+    if not query.is_valid():
+        return None, _json(query.errors, status=400)
+    return query.validated_data, None
+
+
+async def _fetch(queryset):
+    return [row async for row in queryset]
+
+
+async def _render(request, queryset, serializer_class, fetch=_fetch):
+    selection = selection_from_request(request)
+    try:
+        queryset = apply_query_plan(queryset, serializer_class, selection)
+    except serializers.ValidationError as exc:
+        return _json(exc.detail, status=400)
+    rows = await fetch(queryset)
+    return _json(serializer_class(rows, many=True, selection=selection).data)
+
+
+# Appointments for a doctor on a day
+@require_GET
+async def doctor_appointments(request):
+    params, error = _validated(DoctorDayQuerySerializer, request)
+    if error:
+        return error
+    queryset = Appointment.objects.filter(
+        doctor_id=params['doctor'], appointment_date=params['date']
+    ).order_by('id')
+    return await _render(request, queryset, AppointmentSerializer)
+
+
+# Token queue for a doctor on a day
+# Like the tokens endpoint, only active tokens in the live table; completed
+# and archived ones drop out of the queue.
+@require_GET
+async def token_queue(request):
+    params, error = _validated(DoctorDayQuerySerializer, request)
+    if error:
+        return error
+    queryset = Token.objects.filter(
+        appointment__doctor_id=params['doctor'], appointment__appointment_date=params['date']
+    ).order_by('token_number', 'id')
+    return await _render(request, queryset, TokenSerializer)
+
+
+# Patient lookup by mobile prefix or name
+@require_GET
+async def patient_lookup(request):
+    params, error = _validated(PatientSearchQuerySerializer, request)
+    if error:
+        return error
+    term, limit = params['q'].strip(), params['limit']
+    digits = mobile_prefix(term)
+
+    async def fetch(queryset):
+        if digits is not None:
+            return await _fetch(search_by_mobile(queryset, digits)[:limit])
+        # Name search may go through a raw full-text query, which has no async API.
+        return await sync_to_async(lambda: list(search_by_name(queryset, term, limit)))()
+
+    return await _render(request, Patient.objects.all(), PatientSerializer, fetch)
+
+
+# Live token queue for a doctor on a day (Server-Sent Events, ASGI only)
+def _sse(event_type, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event_type}", f"data: {json.dumps(data, cls=JSONEncoder)}"]
+    return "\n".join(lines) + "\n\n"
+
+
+def _last_event_id(request):
+    value = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+async def _token_events(channel, doctor, day, last_event_id):
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def deliver(event):
+        loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    keepalive = getattr(settings, 'CLINIC_TOKEN_STREAM_KEEPALIVE', 15)
+    # Subscribe before reading the snapshot so no event falls in between.
+    missed = token_broker.subscribe(channel, deliver, last_event_id)
+    try:
+        if missed is None:
+            yield _sse('snapshot', await sync_to_async(queue_snapshot)(doctor, day))
+        else:
+            for event in missed:
+                yield _sse(event['type'], event['token'], event['id'])
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield _sse(event['type'], event['token'], event['id'])
+    finally:
+        token_broker.unsubscribe(channel, deliver)
+
+
+@require_GET
+async def token_stream(request):
+    params, error = _validated(DoctorDayQuerySerializer, request)
+    if error:
+        return error
+    channel = channel_name(params['doctor'], params['date'])
+    response = StreamingHttpResponse(
+        _token_events(channel, params['doctor'], params['date'], _last_event_id(request)),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,132 @@
+import atexit
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DatabaseError
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+# Authentication caching
+# JWT authentication normally loads the Staff row on every request. The
+# cached variant keeps the user's AUTH_FIELDS, with its groups prefetched,
+# and an md5 of its password hash for the revoke check in the cache alias
+# named by CLINIC_AUTH_CACHE for CLINIC_AUTH_CACHE_TIMEOUT seconds; other
+# fields load on first access. Saving or deleting a Staff member or changing
+# group membership drops that user's entry, and any Group change retires
+# every entry (see signals.py). Queryset update()s of Staff rows call
+# forget_users themselves. With a per-process cache other workers may see
+# such a change only after the timeout, so keep it short or use a shared
+# cache.
+
+def get_auth_cache():
+    return caches[getattr(settings, 'CLINIC_AUTH_CACHE', 'default')]
+
+
+GROUPS_VERSION_KEY = 'clinic:auth:groups-version'
+
+AUTH_FIELDS = ('id', 'username', 'first_name', 'last_name', 'email', 'is_active', 'is_staff', 'is_superuser')
+
+
+def _user_key(user_id):
+    version = get_auth_cache().get(GROUPS_VERSION_KEY, 0)
+    return f"clinic:auth:staff:{version}:{user_id}"
+
+
+def forget_users(user_ids):
+    get_auth_cache().delete_many([_user_key(user_id) for user_id in user_ids])
+
+
+def forget_all_users():
+    cache = get_auth_cache()
+    try:
+        cache.incr(GROUPS_VERSION_KEY)
+    except ValueError:
+        cache.set(GROUPS_VERSION_KEY, 1, timeout=None)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that serves the user from the cache when it can."""
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        cache = get_auth_cache()
+        key = _user_key(user_id)
+        cached = cache.get(key)
+        if cached is None:
+            loaded = super().get_user(validated_token)
+            # Keep the password hash out of the cache: store only what authentication reads.
+            names = [field.attname for field in self.user_model._meta.concrete_fields if field.attname in AUTH_FIELDS]
+            user = self.user_model.from_db(loaded._state.db, names, [getattr(loaded, name) for name in names])
+            prefetch_related_objects([user], 'groups')
+            cache.set(key, (user, get_md5_hash_password(loaded.password)),
+                      getattr(settings, 'CLINIC_AUTH_CACHE_TIMEOUT', 60))
+            return user
+
+        # The same checks JWTAuthentication applies to a freshly loaded user.
+        user, password_hash = cached
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != password_hash:
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+
+# Deferred last_login
+# Logins record last_login in memory and write the pending values with one
+# bulk UPDATE once CLINIC_LAST_LOGIN_BATCH logins are pending or the oldest
+# has waited CLINIC_LAST_LOGIN_FLUSH_SECONDS, and again at process exit.
+# Set the batch size to 1 to write on every login.
+
+class LastLoginBuffer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.oldest = None
+
+    def record(self, user):
+        user.last_login = timezone.now()
+        batch = getattr(settings, 'CLINIC_LAST_LOGIN_BATCH', 100)
+        interval = getattr(settings, 'CLINIC_LAST_LOGIN_FLUSH_SECONDS', 60)
+        with self.lock:
+            self.pending[user.pk] = user.last_login
+            if self.oldest is None:
+                self.oldest = time.monotonic()
+            due = len(self.pending) >= batch or time.monotonic() - self.oldest >= interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending, self.oldest = self.pending, {}, None
+        if not pending:
+            return 0
+        User = get_user_model()
+        User.objects.bulk_update(
+            [User(pk=pk, last_login=last_login) for pk, last_login in pending.items()],
+            ['last_login'], batch_size=500,
+        )
+        return len(pending)
+
+
+last_login_buffer = LastLoginBuffer()
+
+
+@atexit.register
+def _flush_last_login():
+    try:
+        last_login_buffer.flush()
+    except DatabaseError:
+        pass
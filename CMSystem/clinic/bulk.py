@@ -0,0 +1,172 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .serializers import BulkPrimaryKeyRelatedField
+
+
+# Bulk create / partial update
+# POST <endpoint>/bulk/ takes a list of objects and PATCH <endpoint>/bulk/ a
+# list of partial objects carrying their "id". Items are validated in one
+# pass with related ids preloaded, valid items are written in batches, and
+# invalid ones are reported by index without aborting the rest. Viewsets can
+# reject valid items that conflict with stored rows or with each other by
+# overriding check_bulk_instances.
+
+def _relation_fields(serializer):
+    for name, field in serializer.fields.items():
+        if isinstance(field, BulkPrimaryKeyRelatedField):
+            yield name, field, False
+        elif isinstance(field, serializers.ManyRelatedField) and isinstance(field.child_relation, BulkPrimaryKeyRelatedField):
+            yield name, field.child_relation, True
+
+
+def _to_pk(model, value):
+    try:
+        return model._meta.pk.to_python(value)
+    except (TypeError, ValueError, DjangoValidationError):
+        return None
+
+
+class BulkActionMixin:
+    bulk_serializer_class = None
+    bulk_batch_size = 500
+
+    def get_bulk_context(self, items):
+        ids = {}
+        fields = {}
+        for name, field, many in _relation_fields(self.bulk_serializer_class()):
+            model = field.queryset.model
+            fields[model] = field
+            for item in items:
+                values = item.get(name) if isinstance(item, dict) else None
+                if values is None:
+                    continue
+                for value in (values if many and isinstance(values, list) else [values]):
+                    pk = _to_pk(model, value)
+                    if pk is not None:
+                        ids.setdefault(model, set()).add(pk)
+        related_cache = {
+            model: field.queryset.in_bulk(ids.get(model, ())) for model, field in fields.items()
+        }
+        return {**self.get_serializer_context(), 'related_cache': related_cache}
+
+    def get_bulk_items(self, request):
+        if not isinstance(request.data, list):
+            raise serializers.ValidationError({'non_field_errors': ["Expected a list of items."]})
+        return request.data
+
+    def split_m2m(self, model, validated_data):
+        m2m = {}
+        for field in model._meta.many_to_many:
+            if field.name in validated_data:
+                m2m[field] = validated_data.pop(field.name)
+        return m2m
+
+    def write_m2m(self, rows, replace=False):
+        # rows: [(instance, {m2m_field: [related, ...]})]
+        by_field = {}
+        for instance, m2m in rows:
+            for field, related in m2m.items():
+                by_field.setdefault(field, []).append((instance, related))
+        for field, pairs in by_field.items():
+            through = field.remote_field.through
+            source = field.m2m_field_name()
+            target = field.m2m_reverse_field_name()
+            if replace:
+                through.objects.filter(**{f'{source}__in': [instance.pk for instance, _ in pairs]}).delete()
+            through.objects.bulk_create(
+                [
+                    through(**{f'{source}_id': instance.pk, f'{target}_id': obj.pk})
+                    for instance, related in pairs for obj in related
+                ],
+                batch_size=self.bulk_batch_size,
+                ignore_conflicts=True,
+            )
+
+    def check_bulk_instances(self, instances):
+        """Return ``{position: errors}`` for instances to leave out; runs in the write transaction."""
+        return {}
+
+    def drop_rejected(self, rows, indexes, errors):
+        rejected = self.check_bulk_instances([instance for instance, _ in rows])
+        if not rejected:
+            return rows
+        errors.extend({'index': indexes[position], 'errors': error} for position, error in rejected.items())
+        errors.sort(key=lambda error: error['index'])
+        return [row for position, row in enumerate(rows) if position not in rejected]
+
+    def bulk_response(self, key, ids, errors):
+        if errors and not ids:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif errors:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED if key == 'created' else status.HTTP_200_OK
+        return Response({key: ids, 'errors': errors}, status=response_status)
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        items = self.get_bulk_items(request)
+        context = self.get_bulk_context(items)
+        model = self.bulk_serializer_class.Meta.model
+
+        rows = []
+        indexes = []
+        errors = []
+        for index, item in enumerate(items):
+            serializer = self.bulk_serializer_class(data=item, context=context)
+            if serializer.is_valid():
+                data = dict(serializer.validated_data)
+                m2m = self.split_m2m(model, data)
+                rows.append((model(**data), m2m))
+                indexes.append(index)
+            else:
+                errors.append({'index': index, 'errors': serializer.errors})
+
+        with transaction.atomic():
+            rows = self.drop_rejected(rows, indexes, errors)
+            instances = model.objects.bulk_create(
+                [instance for instance, _ in rows], batch_size=self.bulk_batch_size
+            )
+            self.write_m2m(rows)
+        return self.bulk_response('created', [instance.pk for instance in instances], errors)
+
+    @bulk.mapping.patch
+    def bulk_partial_update(self, request):
+        items = self.get_bulk_items(request)
+        context = self.get_bulk_context(items)
+        model = self.bulk_serializer_class.Meta.model
+        ids = [_to_pk(model, item.get('id')) for item in items if isinstance(item, dict)]
+        existing = model.objects.in_bulk([pk for pk in ids if pk is not None])
+
+        rows = []
+        indexes = []
+        fields = set()
+        errors = []
+        for index, item in enumerate(items):
+            instance = existing.get(_to_pk(model, item.get('id'))) if isinstance(item, dict) else None
+            if instance is None:
+                errors.append({'index': index, 'errors': {'id': ["Object with this id does not exist."]}})
+                continue
+            serializer = self.bulk_serializer_class(instance, data=item, partial=True, context=context)
+            if not serializer.is_valid():
+                errors.append({'index': index, 'errors': serializer.errors})
+                continue
+            data = dict(serializer.validated_data)
+            m2m = self.split_m2m(model, data)
+            for name, value in data.items():
+                setattr(instance, name, value)
+            fields.update(data)
+            rows.append((instance, m2m))
+            indexes.append(index)
+
+        with transaction.atomic():
+            rows = self.drop_rejected(rows, indexes, errors)
+            instances = [instance for instance, _ in rows]
+            if fields:
+                model.objects.bulk_update(instances, sorted(fields), batch_size=self.bulk_batch_size)
+            self.write_m2m(rows, replace=True)
+        return self.bulk_response('updated', [instance.pk for instance in instances], errors)
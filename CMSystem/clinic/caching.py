@@ -0,0 +1,91 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+
+# Reference data cache
+# List/retrieve responses of rarely changing tables are cached under a key
+# that embeds a version per model. Saving or deleting a row replaces the
+# model's version once the transaction commits (see signals.py), so stale
+# entries are never read again and simply expire. Versions are nanosecond
+# timestamps rather than a counter: if the version key itself is evicted, the
+# next read seeds a fresh one instead of falling back to a value that old
+# entries were cached under. The backend is the cache alias named by
+# CLINIC_REFERENCE_CACHE (Django's local-memory cache unless configured);
+# use a shared backend such as Redis when running several worker processes.
+
+def get_reference_cache():
+    return caches[getattr(settings, 'CLINIC_REFERENCE_CACHE', 'default')]
+
+
+def _version_key(model):
+    return f"clinic:ref:version:{model._meta.label_lower}"
+
+
+def bump_model_version(model):
+    get_reference_cache().set(_version_key(model), time.time_ns(), timeout=None)
+
+
+def compute_etag(data):
+    payload = json.dumps(data, cls=JSONEncoder, sort_keys=True).encode()
+    return '"%s"' % hashlib.md5(payload).hexdigest()
+
+
+def _etag_matches(request, etag):
+    header = request.headers.get('If-None-Match', '')
+    return header.strip() == '*' or etag in [tag.strip() for tag in header.split(',')]
+
+
+class ReferenceCacheMixin:
+    """Caches list/retrieve responses and answers ``If-None-Match`` with 304.
+
+    ``cache_models`` lists every model whose rows appear in the response,
+    including nested ones, so a change to any of them invalidates the entry.
+    """
+    cache_models = ()
+
+    def get_cache_models(self):
+        return self.cache_models or (self.queryset.model,)
+
+    def get_cache_key(self, request):
+        cache = get_reference_cache()
+        version_keys = [_version_key(model) for model in self.get_cache_models()]
+        versions = cache.get_many(version_keys)
+        for key in version_keys:
+            if key not in versions:
+                cache.add(key, time.time_ns(), timeout=None)
+                versions[key] = cache.get(key)
+        version = '.'.join(str(versions[key]) for key in version_keys)
+        return f"clinic:ref:{self.basename}:{version}:{request.get_full_path()}"
+
+    def cached_response(self, request, view, *args, **kwargs):
+        cache = get_reference_cache()
+        key = self.get_cache_key(request)
+        entry = cache.get(key)
+        response = None
+        if entry is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = (compute_etag(response.data), response.data)
+            cache.set(key, entry, getattr(settings, 'CLINIC_REFERENCE_CACHE_TIMEOUT', 3600))
+
+        etag, data = entry
+        if _etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        if response is None:
+            response = Response(data)
+        response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
@@ -0,0 +1,157 @@
+from bisect import bisect_left, bisect_right
+
+from django.db import connections
+from django.db.models import Q
+
+from .models import (
+    OVERLAP_CONSTRAINTS, TIMED_APPOINTMENT, Appointment, AppointmentConflict, Schedule, ScheduleFull, capacity_key,
+    lock_bookings,
+)
+
+
+# Appointment conflicts in bulk
+# check_batch validates a batch of appointments against the database and
+# against each other with one query: the day's timed appointments of every
+# doctor and patient in the batch are loaded into an IntervalIndex, then the
+# batch is checked in order, each accepted appointment joining the index.
+# check_capacity does the same for schedule tokens, so a bulk import leaves
+# out the appointments a full schedule cannot take instead of failing.
+# The PostgreSQL exclusion constraints named in models.OVERLAP_CONSTRAINTS
+# live outside the model definitions and are (re)created from post_migrate.
+
+class IntervalIndex:
+    """Half-open ``[start, end)`` intervals per key, with overlap queries.
+
+    Each key keeps its intervals sorted by start together with the running
+    maximum of their ends. A query bisects to the last interval starting
+    before its end and walks back only while some earlier interval still
+    reaches past its start: O(log n + k), where k counts the intervals
+    walked, which a long early interval can make exceed the hits. ``add`` is
+    O(n) per key, for the list inserts and the running maximum. Keys are one
+    doctor or patient on one day, so n stays small.
+    """
+
+    def __init__(self):
+        self.keys = {}
+
+    def add(self, key, start, end, label):
+        starts, ends, labels, reach = self.keys.setdefault(key, ([], [], [], []))
+        position = bisect_right(starts, start)
+        starts.insert(position, start)
+        ends.insert(position, end)
+        labels.insert(position, label)
+        reach.insert(position, end)
+        furthest = reach[position - 1] if position else end
+        for index in range(position, len(ends)):
+            furthest = max(furthest, ends[index])
+            reach[index] = furthest
+
+    def overlapping(self, key, start, end):
+        if key not in self.keys:
+            return []
+        starts, ends, labels, reach = self.keys[key]
+        found = []
+        index = bisect_left(starts, end) - 1
+        while index >= 0 and reach[index] > start:
+            if ends[index] > start:
+                found.append(labels[index])
+            index -= 1
+        return found[::-1]
+
+
+def check_batch(appointments, lock=True):
+    """Return ``{position: errors}`` for the appointments that overlap the database or an earlier one.
+
+    Run it in the transaction that saves the accepted appointments.
+    """
+    timed = []
+    for position, appointment in enumerate(appointments):
+        appointment.fill_interval()
+        if appointment.is_timed:
+            timed.append((position, appointment))
+    if not timed:
+        return {}
+
+    doctors = {appointment.doctor_id for _, appointment in timed}
+    patients = {appointment.patient_id for _, appointment in timed}
+    if lock:
+        lock_bookings(doctors, patients)
+    existing = Appointment.objects.filter(
+        TIMED_APPOINTMENT, Q(doctor_id__in=doctors) | Q(patient_id__in=patients),
+        appointment_date__in={appointment.appointment_date for _, appointment in timed},
+    ).exclude(pk__in=[appointment.pk for _, appointment in timed if appointment.pk is not None])
+
+    index = IntervalIndex()
+    for pk, doctor_id, patient_id, day, start, end in existing.values_list(
+        'pk', 'doctor_id', 'patient_id', 'appointment_date', 'start_time', 'end_time'
+    ):
+        index.add(('doctor', doctor_id, day), start, end, f"appointment {pk}")
+        index.add(('patient', patient_id, day), start, end, f"appointment {pk}")
+
+    rejected = {}
+    for position, appointment in timed:
+        keys = {
+            'doctor': ('doctor', appointment.doctor_id, appointment.appointment_date),
+            'patient': ('patient', appointment.patient_id, appointment.appointment_date),
+        }
+        conflicts = {
+            role: index.overlapping(key, appointment.start_time, appointment.end_time) for role, key in keys.items()
+        }
+        if conflicts['doctor'] or conflicts['patient']:
+            rejected[position] = AppointmentConflict(conflicts).message_dict
+            continue
+        for key in keys.values():
+            index.add(key, appointment.start_time, appointment.end_time, f"item {position}")
+    return rejected
+
+
+def check_capacity(appointments):
+    """Return ``{position: errors}`` for the appointments whose schedule has no tokens left.
+
+    Locks the schedules involved; run it in the transaction that saves the
+    accepted appointments. A token freed by moving or cancelling an
+    appointment is available to the appointments after it.
+    """
+    held = {
+        pk: capacity_key(schedule_id, is_active) for pk, schedule_id, is_active in Appointment.all_objects.filter(
+            pk__in=[appointment.pk for appointment in appointments if appointment.pk is not None]
+        ).values_list('pk', 'schedule_id', 'is_active')
+    }
+    wanted = [capacity_key(appointment.schedule_id, appointment.is_active) for appointment in appointments]
+    left = dict(
+        Schedule.all_objects.select_for_update()
+        .filter(pk__in={*wanted, *held.values()} - {None}).values_list('pk', 'remaining_tokens')
+    )
+
+    rejected = {}
+    for position, (appointment, schedule_id) in enumerate(zip(appointments, wanted)):
+        old_schedule_id = held.get(appointment.pk)
+        if schedule_id == old_schedule_id:
+            continue
+        if left.get(schedule_id) is not None:
+            if left[schedule_id] <= 0:
+                rejected[position] = ScheduleFull([schedule_id]).message_dict
+                continue
+            left[schedule_id] -= 1
+        if left.get(old_schedule_id) is not None:
+            left[old_schedule_id] += 1
+    return rejected
+
+
+def install_appointment_exclusion_constraints(using='default'):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    table = Appointment._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        for name, column in zip(OVERLAP_CONSTRAINTS, ('doctor_id', 'patient_id')):
+            cursor.execute("SELECT 1 FROM pg_constraint WHERE conname = %s", [name])
+            if cursor.fetchone():
+                continue
+            cursor.execute(
+                f"ALTER TABLE {table} ADD CONSTRAINT {name} EXCLUDE USING gist ("
+                f"{column} WITH =, "
+                f"tsrange(appointment_date + start_time, appointment_date + end_time) WITH &&"
+                f") WHERE (is_active AND start_time IS NOT NULL AND end_time IS NOT NULL)"
+            )
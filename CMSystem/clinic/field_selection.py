@@ -0,0 +1,132 @@
+from collections import namedtuple
+
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+# Field selection
+# Opt-in per request on GET: ?fields=id,diagnosis,tokens.token_number limits
+# the rendered fields (dotted names reach into nested serializers) and
+# ?expand=tokens.appointment lists the nested serializers to render in full.
+# Once either parameter is present every nested serializer that is not
+# expanded collapses to its primary key, or is dropped when the serializer
+# already exposes that relation as a primary key field (e.g. "token" next to
+# "tokens"). Without either parameter responses are unchanged.
+
+FieldSelection = namedtuple('FieldSelection', ['fields', 'expand'])
+
+
+def _new_node():
+    return {'fields': None, 'expand': {}}
+
+
+def _split(value):
+    return [path for path in (part.strip() for part in value.split(',')) if path]
+
+
+def _freeze(node):
+    fields = frozenset(node['fields']) if node['fields'] is not None else None
+    expand = tuple(sorted((name, _freeze(child)) for name, child in node['expand'].items()))
+    return FieldSelection(fields, expand)
+
+
+def parse_selection(fields='', expand=''):
+    """Parse ``fields``/``expand`` query values into a hashable ``FieldSelection``.
+
+    Returns ``None`` when both are empty, which leaves the serializer untouched.
+    """
+    fields, expand = _split(fields or ''), _split(expand or '')
+    if not fields and not expand:
+        return None
+    root = _new_node()
+    for path in expand:
+        node = root
+        for name in path.split('.'):
+            node = node['expand'].setdefault(name, _new_node())
+    for path in fields:
+        node = root
+        *parents, name = path.split('.')
+        for parent in parents:
+            node['fields'] = (node['fields'] or set()) | {parent}
+            node = node['expand'].setdefault(parent, _new_node())
+        node['fields'] = (node['fields'] or set()) | {name}
+    return _freeze(root)
+
+
+def selection_from_request(request):
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    params = getattr(request, 'query_params', request.GET)
+    return parse_selection(params.get('fields', ''), params.get('expand', ''))
+
+
+def _nested(field):
+    return field.child if isinstance(field, serializers.ListSerializer) else field
+
+
+def _is_nested(field):
+    return isinstance(_nested(field), serializers.BaseSerializer)
+
+
+def _primary_key_field(name, field):
+    kwargs = {'read_only': True, 'many': isinstance(field, serializers.ListSerializer)}
+    if field.source and field.source != name:
+        kwargs['source'] = field.source
+    return serializers.PrimaryKeyRelatedField(**kwargs)
+
+
+def select_fields(fields, selection):
+    expand = dict(selection.expand)
+    names = selection.fields
+    unknown = sorted(((names or set()) | set(expand)) - set(fields))
+    if unknown:
+        raise serializers.ValidationError({'fields': f"Unknown field(s): {', '.join(unknown)}"})
+    flat = sorted(name for name in expand if not _is_nested(fields[name]))
+    if flat:
+        raise serializers.ValidationError({'expand': f"Cannot expand field(s): {', '.join(flat)}"})
+
+    kept = {name: field for name, field in fields.items() if names is None or name in names}
+    pk_sources = {field.source or name for name, field in kept.items() if not _is_nested(field)}
+    selected = {}
+    for name, field in kept.items():
+        if not _is_nested(field):
+            selected[name] = field
+        elif name in expand:
+            child = _nested(field)
+            if isinstance(child, FieldSelectionMixin):
+                child.selection = expand[name]
+            selected[name] = field
+        elif (field.source or name) not in pk_sources:
+            selected[name] = _primary_key_field(name, field)
+    return selected
+
+
+class FieldSelectionMixin:
+    """Serializer mixin applying the request's ``?fields=``/``?expand=`` selection.
+
+    The root serializer reads the selection from the request; nested
+    serializers receive their part of it from their parent. ``selection``
+    may also be passed explicitly, e.g. to build a query plan.
+    """
+
+    def __init__(self, *args, selection=None, **kwargs):
+        self.selection = selection
+        super().__init__(*args, **kwargs)
+
+    def is_root_serializer(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_selection(self):
+        if self.selection is None and self.is_root_serializer():
+            self.selection = selection_from_request(self.context.get('request'))
+        return self.selection
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = self.get_selection()
+        if selection is None:
+            return fields
+        return select_fields(fields, selection)
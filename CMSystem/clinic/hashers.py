@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+# Password hashing
+# Each login verifies one PBKDF2 hash, which dominates its CPU cost. To trade
+# work factor for login throughput, list this hasher first in
+# PASSWORD_HASHERS and set CLINIC_PASSWORD_ITERATIONS. It shares Django's
+# "pbkdf2_sha256" algorithm name, so existing hashes keep verifying and are
+# re-encoded with the configured iterations on each user's next login.
+# Without the setting it behaves exactly like Django's default hasher.
+
+class ClinicPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return getattr(settings, 'CLINIC_PASSWORD_ITERATIONS', PBKDF2PasswordHasher.iterations)
@@ -0,0 +1,156 @@
+import datetime
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.http import Http404
+from django.utils import timezone
+from rest_framework.generics import get_object_or_404
+
+from .models import ARCHIVE_MODELS, ArchivedConsultation, ArchivedToken
+from .serializers import HistoryWindowQuerySerializer
+
+
+# Historical tokens and consultations
+# Tokens and consultations are only hot for a few weeks. The hot tables keep
+# the last CLINIC_HOT_MONTHS calendar months (default 2, the current one
+# included); archive_history moves older months, a token together with its
+# consultations, to the archive tables, and medical records follow their
+# consultation there (see models.py). The archive tables are plain tables
+# indexed on issued_at/created_at. On PostgreSQL, the partition_archives
+# command rebuilds them, while still empty, range-partitioned by month of
+# that column, and a partition is then created per month as rows arrive. It
+# is a one-off step the operator runs after migrate, not part of migrate: it
+# changes the tables behind Django's back, so a later migration altering
+# these archive tables may have to be applied by hand. Token and
+# consultation lists and exports are scoped to the hot months unless the
+# request passes ``?since=YYYY-MM-DD``. Retrieving a single row by id falls
+# back to the archive table and returns the archived row read-only; other
+# detail actions only see the hot tables.
+
+PARTITIONED_ARCHIVES = (ArchivedToken, ArchivedConsultation)
+
+
+def hot_months():
+    return getattr(settings, 'CLINIC_HOT_MONTHS', 2)
+
+
+def add_months(day, months):
+    month = day.year * 12 + day.month - 1 + months
+    return datetime.date(month // 12, month % 12 + 1, 1)
+
+
+def day_start(day):
+    start = datetime.datetime.combine(day, datetime.time.min)
+    return timezone.make_aware(start) if settings.USE_TZ else start
+
+
+def hot_since(months=None):
+    """Start of the oldest hot month."""
+    if months is None:
+        months = hot_months()
+    return day_start(add_months(timezone.localdate(), 1 - months))
+
+
+def month_of(value):
+    if timezone.is_aware(value):
+        value = value.astimezone(datetime.timezone.utc)
+    return datetime.date(value.year, value.month, 1)
+
+
+def _partition_bound(day):
+    return f"{day.isoformat()} 00:00:00+00" if settings.USE_TZ else f"{day.isoformat()} 00:00:00"
+
+
+def _is_partitioned(cursor, table):
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace", [table],
+    )
+    return cursor.fetchone() is not None
+
+
+def partition_archives(using='default'):
+    """Rebuild the empty token and consultation archive tables as partitioned tables.
+
+    Returns ``{table: outcome}``; tables already partitioned or holding rows
+    are left alone.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return {archive._meta.db_table: "skipped, not PostgreSQL" for archive in PARTITIONED_ARCHIVES}
+    outcomes = {}
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        for archive in PARTITIONED_ARCHIVES:
+            table, column = archive._meta.db_table, archive._meta.get_field(archive.period_field).column
+            if _is_partitioned(cursor, table):
+                outcomes[table] = "already partitioned"
+                continue
+            cursor.execute(f"SELECT 1 FROM {table} LIMIT 1")
+            if cursor.fetchone():
+                outcomes[table] = "skipped, not empty"
+                continue
+            cursor.execute(
+                "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s "
+                "AND indexname <> %s", [table, f"{table}_pkey"],
+            )
+            indexes = [row[0] for row in cursor.fetchall()]
+            # A partitioned table's primary key must include the partition column.
+            cursor.execute(
+                f"CREATE TABLE {table}_partitioned (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS, "
+                f"CONSTRAINT {table}_pkey_partitioned PRIMARY KEY (id, {column})) PARTITION BY RANGE ({column})"
+            )
+            cursor.execute(f"DROP TABLE {table}")
+            cursor.execute(f"ALTER TABLE {table}_partitioned RENAME TO {table}")
+            cursor.execute(f"ALTER TABLE {table} RENAME CONSTRAINT {table}_pkey_partitioned TO {table}_pkey")
+            for index in indexes:
+                cursor.execute(index)
+            outcomes[table] = f"partitioned by month of {column}"
+    return outcomes
+
+
+def ensure_month_partitions(archive, months, using='default'):
+    """Create the monthly partitions of ``archive`` that rows of ``months`` go to."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql' or archive not in PARTITIONED_ARCHIVES:
+        return
+    table = archive._meta.db_table
+    with connection.cursor() as cursor:
+        if not _is_partitioned(cursor, table):
+            return
+        for month in sorted(months):
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {table}_{month:%Y%m} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{_partition_bound(month)}') TO ('{_partition_bound(add_months(month, 1))}')"
+            )
+
+
+class HotHistoryMixin:
+    """Scope a viewset's list and export to rows since the oldest hot month, or ``?since=``.
+
+    ``retrieve`` also finds rows that were moved to the archive table.
+    """
+    history_field = None
+    history_actions = ('list', 'export')
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            if self.action != 'retrieve':
+                raise
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        archive = ARCHIVE_MODELS[self.queryset.model]
+        archived = get_object_or_404(archive._base_manager.all(), **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        instance = archived.as_source()
+        self.check_object_permissions(self.request, instance)
+        return instance
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action not in self.history_actions:
+            return queryset
+        query = HistoryWindowQuerySerializer(data=self.request.query_params)
+        query.is_valid(raise_exception=True)
+        since = query.validated_data.get('since')
+        since = day_start(since) if since else hot_since()
+        return queryset.filter(**{f'{self.history_field}__gte': since})
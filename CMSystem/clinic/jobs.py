@@ -0,0 +1,126 @@
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+
+# Background jobs
+# Slow side effects are stored as Job rows and run by `manage.py run_jobs`
+# workers in their own processes. A job enqueued inside a transaction
+# commits or rolls back with the data it refers to. Workers claim a job with
+# a conditional UPDATE, so any number of them can share the table on any
+# database. A job that raises is retried after CLINIC_JOB_RETRY_DELAY
+# seconds, doubling each attempt, until it reaches max_attempts. Workers
+# claim one job at a time, right before running it, so a claimed job is never
+# left waiting behind others. A job left running for CLINIC_JOB_TIMEOUT
+# seconds (its worker died) is queued again, or marked failed once it has
+# used its attempts, so a job that kills its worker is not retried forever.
+# With CLINIC_JOBS_EAGER the job runs in-process once the transaction
+# commits, which suits tests and single-process development.
+
+registry = {}
+
+
+def job(name, max_attempts=3):
+    """Register the decorated function as the job ``name``; it is called with the payload as keywords."""
+    def register(func):
+        registry[name] = (func, max_attempts)
+        func.job_name = name
+        return func
+    return register
+
+
+def enqueue(name, payload=None, delay=0, max_attempts=None):
+    if name not in registry:
+        raise ValueError(f"No job registered as '{name}'.")
+    func, default_attempts = registry[name]
+    payload = payload or {}
+    if getattr(settings, 'CLINIC_JOBS_EAGER', False):
+        transaction.on_commit(lambda: func(**payload))
+        return None
+    return Job.objects.create(
+        name=name, payload=payload, max_attempts=max_attempts or default_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def purge_finished(days):
+    """Delete jobs that finished (done or failed) more than ``days`` days ago."""
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = Job.objects.filter(status__in=[Job.DONE, Job.FAILED], finished_at__lt=cutoff).delete()
+    return deleted
+
+
+class Worker:
+    def __init__(self, worker_id=None):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+
+    def requeue_stale(self):
+        """Queue jobs whose worker stopped again, or fail them once out of attempts; returns how many were queued."""
+        timeout = getattr(settings, 'CLINIC_JOB_TIMEOUT', 600)
+        now = timezone.now()
+        stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=timeout))
+        stale.filter(attempts__gte=F('max_attempts')).update(
+            status=Job.FAILED, finished_at=now,
+            last_error=f"Worker stopped without finishing the job within {timeout} seconds.",
+        )
+        return stale.update(status=Job.QUEUED, locked_by='', locked_at=None)
+
+    def claim(self, limit=1, due=None):
+        now = timezone.now()
+        candidates = (
+            Job.objects.filter(status=Job.QUEUED, run_at__lte=due or now)
+            .order_by('run_at', 'id').values_list('pk', flat=True)[:limit]
+        )
+        claimed = [
+            pk for pk in candidates
+            if Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+                status=Job.RUNNING, locked_by=self.worker_id, locked_at=now, attempts=F('attempts') + 1,
+            )
+        ]
+        return list(Job.objects.filter(pk__in=claimed).order_by('run_at', 'id'))
+
+    def run(self, job):
+        owned = Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=self.worker_id)
+        try:
+            func, _ = registry[job.name]
+        except KeyError:
+            func = None
+        try:
+            if func is None:
+                raise LookupError(f"No job registered as '{job.name}'.")
+            with transaction.atomic():
+                func(**job.payload)
+        except Exception:
+            error = traceback.format_exc()
+            if job.attempts < job.max_attempts:
+                delay = getattr(settings, 'CLINIC_JOB_RETRY_DELAY', 10) * 2 ** (job.attempts - 1)
+                owned.update(
+                    status=Job.QUEUED, locked_by='', locked_at=None, last_error=error,
+                    run_at=timezone.now() + timedelta(seconds=delay),
+                )
+            else:
+                owned.update(status=Job.FAILED, last_error=error, finished_at=timezone.now())
+            return False
+        owned.update(status=Job.DONE, finished_at=timezone.now())
+        return True
+
+    def run_pending(self, limit=10):
+        """Claim and run jobs due now one at a time, up to ``limit``; returns how many were run."""
+        # Retries scheduled during this pass wait for the next one.
+        due = timezone.now()
+        done = 0
+        while done < limit:
+            claimed = self.claim(due=due)
+            if not claimed:
+                break
+            self.run(claimed[0])
+            done += 1
+        return done
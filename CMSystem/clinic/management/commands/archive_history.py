@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from clinic.archive import BATCH_SIZE, archive_history
+from clinic.history import hot_months, hot_since
+
+
+class Command(BaseCommand):
+    help = (
+        "Move tokens issued before the last --months calendar months, and their consultations, to the "
+        "archive tables, month partitions on PostgreSQL. Medical records stay and read them from there."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months', type=int, default=None,
+            help="Hot months to keep, the current one included (default: CLINIC_HOT_MONTHS)",
+        )
+        parser.add_argument('--batch', type=int, default=BATCH_SIZE, help="Tokens moved per transaction")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the rows that would be archived")
+
+    def handle(self, *args, **options):
+        months = hot_months() if options['months'] is None else options['months']
+        if months < 1 or options['batch'] < 1:
+            raise CommandError("--months and --batch must be at least 1.")
+        counts = archive_history(months, options['batch'], options['dry_run'])
+        verb = "Would archive" if options['dry_run'] else "Archived"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {counts['token']} tokens and {counts['consultation']} consultations "
+            f"issued before {hot_since(months):%Y-%m-%d}."
+        ))
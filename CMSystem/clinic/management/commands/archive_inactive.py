@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from clinic.archive import BATCH_SIZE, archive_inactive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move consultations, tokens, appointments and schedules that have been inactive for more than "
+        "--days to their archive tables. Rows that live rows still refer to are kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help="Archive rows older than this many days")
+        parser.add_argument('--batch', type=int, default=BATCH_SIZE, help="Rows moved per transaction")
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Only count the rows that could be archived now, model by model",
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch'] < 1:
+            raise CommandError("--days must be zero or more and --batch at least 1.")
+        counts = archive_inactive(options['days'], options['batch'], options['dry_run'])
+        verb = "Would archive" if options['dry_run'] else "Archived"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} " + ", ".join(f"{count} {name}s" for name, count in counts.items()) + "."
+        ))
@@ -0,0 +1,40 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from clinic.jobs import enqueue
+from clinic.reporting import rebuild_rollups, rebuild_rollups_job
+
+
+def _date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}'; use YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the daily reporting rollups from appointments, consultations and bills, "
+        "for every day or for the given range."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', type=_date, help="First day to rebuild (YYYY-MM-DD)")
+        parser.add_argument('--date-to', type=_date, help="Last day to rebuild (YYYY-MM-DD)")
+        parser.add_argument('--enqueue', action='store_true', help="Queue the rebuild for the run_jobs worker")
+
+    def handle(self, *args, **options):
+        date_from, date_to = options['date_from'], options['date_to']
+        if date_from and date_to and date_from > date_to:
+            raise CommandError("--date-from must be on or before --date-to.")
+        if options['enqueue']:
+            enqueue(rebuild_rollups_job.job_name, {
+                'date_from': date_from and date_from.isoformat(), 'date_to': date_to and date_to.isoformat(),
+            })
+            self.stdout.write(self.style.SUCCESS("Queued the rollup rebuild."))
+            return
+        counts = rebuild_rollups(date_from, date_to)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {counts['rollups']} daily rollups and {counts['diagnosis_rollups']} diagnosis rollups."
+        ))
@@ -0,0 +1,216 @@
+import asyncio
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from clinic.models import Appointment, Patient
+from clinic.seeding import ClinicDataGenerator
+
+
+def _resident_bytes():
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a clinic dataset, then drive the async read endpoints with many concurrent requests "
+        "through Django's ASGI handler and through its WSGI handler on a thread pool, reporting "
+        "requests/second, latency, resident memory growth and threads. Seeded rows are deleted afterwards; "
+        "run it on a staging database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--requests', type=int, default=5000, help="Requests per endpoint and mode")
+        parser.add_argument('--concurrency', type=int, default=500, help="Requests in flight at once")
+        parser.add_argument('--threads', type=int, default=32, help="WSGI worker threads")
+        parser.add_argument('--output', help="Write results to this JSON file")
+
+    def handle(self, *args, **options):
+        generator = ClinicDataGenerator(scale=options['scale'], seed=options['seed'], tag='async')
+        try:
+            counts = generator.generate()
+            endpoints = self.endpoints()
+            # Worker threads and the async ORM open their own connections.
+            connection.close()
+            results = {}
+            for name, paths in endpoints.items():
+                results[name] = {
+                    'wsgi': self.run_wsgi(paths, options),
+                    'asgi': self.run_asgi(paths, options),
+                }
+        finally:
+            connections.close_all()
+            generator.cleanup()
+
+        report = {
+            'meta': {
+                'vendor': connection.vendor,
+                'python': sys.version.split()[0],
+                'rows': counts,
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'wsgi_threads': options['threads'],
+            },
+            'endpoints': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output)
+        else:
+            self.stdout.write(output)
+
+    def endpoints(self):
+        days = list(
+            Appointment.objects.filter(patient__gender__name__startswith='async-')
+            .values_list('doctor_id', 'appointment_date').distinct()[:200]
+        )
+        mobiles = Patient.objects.filter(gender__name__startswith='async-').values_list('mobile_number', flat=True)
+        return {
+            'appointments': [
+                ('/api/async/appointments/', urlencode({'doctor': doctor, 'date': day})) for doctor, day in days
+            ],
+            'token_queue': [
+                ('/api/async/tokens/queue/', urlencode({'doctor': doctor, 'date': day})) for doctor, day in days
+            ],
+            'patient_lookup': [
+                ('/api/async/patients/lookup/', urlencode({'q': mobile[:5]})) for mobile in mobiles[:200]
+            ],
+        }
+
+    def host(self):
+        hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+        return hosts[0] if hosts else 'localhost'
+
+    def measure(self, run):
+        """Call ``run()`` while sampling resident memory and the thread count."""
+        baseline = _resident_bytes()
+        peak = {'rss': baseline, 'threads': threading.active_count()}
+        done = threading.Event()
+
+        def sample():
+            while not done.wait(0.01):
+                if baseline is not None:
+                    peak['rss'] = max(peak['rss'], _resident_bytes())
+                peak['threads'] = max(peak['threads'], threading.active_count())
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            latencies, statuses = run()
+        finally:
+            elapsed = time.perf_counter() - started
+            done.set()
+            sampler.join()
+        latencies.sort()
+        return {
+            'requests_per_second': round(len(latencies) / elapsed, 1),
+            'status': statuses,
+            'mean_ms': round(statistics.mean(latencies), 3),
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p95_ms': round(latencies[max(int(len(latencies) * 0.95) - 1, 0)], 3),
+            'rss_growth_kb': round((peak['rss'] - baseline) / 1024, 1) if baseline is not None else None,
+            # The sampler thread is not counted.
+            'peak_threads': peak['threads'] - 1,
+        }
+
+    def run_wsgi(self, paths, options):
+        handler = WSGIHandler()
+        host = self.host()
+        lock = threading.Lock()
+        slots = threading.BoundedSemaphore(options['concurrency'])
+        latencies, statuses = [], {}
+
+        def call(path, query, queued_at):
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+                'SERVER_NAME': host, 'SERVER_PORT': '80', 'HTTP_HOST': host, 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+                'wsgi.version': (1, 0), 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+                'wsgi.run_once': False,
+            }
+            status = []
+            try:
+                response = handler(environ, lambda value, headers: status.append(value.split()[0]))
+                b''.join(response)
+                response.close()
+            finally:
+                slots.release()
+            with lock:
+                latencies.append((time.perf_counter() - queued_at) * 1000)
+                statuses[status[0]] = statuses.get(status[0], 0) + 1
+
+        def run():
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                for n in range(options['requests']):
+                    # A threaded WSGI server accepts the connection, then queues it for a worker thread.
+                    slots.acquire()
+                    path, query = paths[n % len(paths)]
+                    pool.submit(call, path, query, time.perf_counter())
+            return latencies, statuses
+
+        return self.measure(run)
+
+    def run_asgi(self, paths, options):
+        handler = ASGIHandler()
+        host = self.host().encode()
+        latencies, statuses = [], {}
+
+        async def call(path, query, slots):
+            async with slots:
+                scope = {
+                    'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                    'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+                    'query_string': query.encode(), 'headers': [(b'host', host)],
+                    'server': (host.decode(), 80), 'client': ('127.0.0.1', 0),
+                }
+                messages = []
+                requested = False
+
+                async def receive():
+                    nonlocal requested
+                    if requested:
+                        # Nothing more arrives on the connection; Django cancels this wait when done.
+                        await asyncio.Event().wait()
+                    requested = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+                async def send(message):
+                    messages.append(message)
+
+                queued_at = time.perf_counter()
+                await handler(scope, receive, send)
+                latencies.append((time.perf_counter() - queued_at) * 1000)
+                status = str(messages[0]['status'])
+                statuses[status] = statuses.get(status, 0) + 1
+
+        async def main():
+            slots = asyncio.Semaphore(options['concurrency'])
+            await asyncio.gather(*(
+                call(*paths[n % len(paths)], slots) for n in range(options['requests'])
+            ))
+
+        def run():
+            asyncio.run(main())
+            return latencies, statuses
+
+        return self.measure(run)
@@ -0,0 +1,124 @@
+import datetime
+import json
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from clinic.conflicts import IntervalIndex, check_batch
+from clinic.models import Appointment, AppointmentConflict, Doctor, Gender, Patient, Specialization
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 32  # 09:00 to 17:00
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure appointment bookings/second checked one save at a time and as a checked bulk import, "
+        "and the raw throughput of the interval index. Runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=20)
+        parser.add_argument('--patients', type=int, default=2000)
+        parser.add_argument('--days', type=int, default=5)
+        parser.add_argument('--bookings', type=int, default=2000, help="Booking attempts per variant")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        with transaction.atomic():
+            doctors, patients = self.seed(options)
+            bookings = [
+                (rnd.choice(doctors), rnd.choice(patients), rnd.randrange(options['days']), rnd.randrange(SLOTS_PER_DAY))
+                for _ in range(options['bookings'])
+            ]
+            report = {
+                'vendor': connection.vendor,
+                'bookings': len(bookings),
+                'single_save': self.isolated(self.measure_single, bookings),
+                'bulk_import': self.isolated(self.measure_batch, bookings),
+                'interval_index': self.measure_index(bookings),
+            }
+            transaction.set_rollback(True)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def seed(self, options):
+        gender = Gender.objects.create(name='booking-bench')
+        specialization = Specialization.objects.create(specialization_name='booking-bench')
+        User = get_user_model()
+        staff = User.objects.bulk_create([
+            User(username=f'booking-bench-{n}', mobile_number=f'booking-bench-{n}') for n in range(options['doctors'])
+        ])
+        doctors = Doctor.objects.bulk_create([
+            Doctor(staff=member, specialization=specialization, consultation_fee=100, year_of_experience=1)
+            for member in staff
+        ])
+        patients = Patient.objects.bulk_create([
+            Patient(full_name=f'Patient {n}', dob=datetime.date(1980, 1, 1), gender=gender,
+                    mobile_number=f'8{n:09d}', address='-')
+            for n in range(options['patients'])
+        ], batch_size=5000)
+        self.start = datetime.date(2024, 1, 1)
+        return [doctor.pk for doctor in doctors], [patient.pk for patient in patients]
+
+    def appointment(self, doctor_id, patient_id, day, slot):
+        start = datetime.datetime.combine(self.start, datetime.time(9)) + datetime.timedelta(minutes=slot * SLOT_MINUTES)
+        end = start + datetime.timedelta(minutes=SLOT_MINUTES)
+        return Appointment(
+            doctor_id=doctor_id, patient_id=patient_id, appointment_date=self.start + datetime.timedelta(days=day),
+            start_time=start.time(), end_time=end.time(),
+        )
+
+    def isolated(self, measure, bookings):
+        savepoint = transaction.savepoint()
+        try:
+            return measure(bookings)
+        finally:
+            transaction.savepoint_rollback(savepoint)
+
+    def measure_single(self, bookings):
+        accepted = 0
+        began = time.perf_counter()
+        for booking in bookings:
+            try:
+                self.appointment(*booking).save()
+                accepted += 1
+            except AppointmentConflict:
+                pass
+        elapsed = time.perf_counter() - began
+        return {'accepted': accepted, 'seconds': round(elapsed, 4), 'per_second': round(len(bookings) / elapsed, 1)}
+
+    def measure_batch(self, bookings):
+        began = time.perf_counter()
+        appointments = [self.appointment(*booking) for booking in bookings]
+        rejected = check_batch(appointments)
+        Appointment.objects.bulk_create(
+            [appointment for position, appointment in enumerate(appointments) if position not in rejected],
+            batch_size=500,
+        )
+        elapsed = time.perf_counter() - began
+        return {
+            'accepted': len(appointments) - len(rejected), 'seconds': round(elapsed, 4),
+            'per_second': round(len(bookings) / elapsed, 1),
+        }
+
+    def measure_index(self, bookings):
+        appointments = [self.appointment(*booking) for booking in bookings]
+        index = IntervalIndex()
+        accepted = 0
+        began = time.perf_counter()
+        for position, appointment in enumerate(appointments):
+            keys = [
+                ('doctor', appointment.doctor_id, appointment.appointment_date),
+                ('patient', appointment.patient_id, appointment.appointment_date),
+            ]
+            if any(index.overlapping(key, appointment.start_time, appointment.end_time) for key in keys):
+                continue
+            for key in keys:
+                index.add(key, appointment.start_time, appointment.end_time, position)
+            accepted += 1
+        elapsed = time.perf_counter() - began
+        return {'accepted': accepted, 'seconds': round(elapsed, 6), 'per_second': round(len(bookings) / elapsed, 1)}
@@ -0,0 +1,112 @@
+import json
+import statistics
+import threading
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import RequestFactory
+
+from clinic.pooling import connection_report, connection_settings, connection_stats, pool_available
+
+MODES = ('per_request', 'persistent', 'pool')
+
+
+class Command(BaseCommand):
+    help = (
+        "Send requests from many concurrent clients through the WSGI handler, as a threaded worker would "
+        "serve them, and report latency with a connection per request, persistent connections and a "
+        "connection pool. Read-only: it uses the rows already in the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=200, help="Concurrent client threads")
+        parser.add_argument('--requests', type=int, default=10, help="Requests per client")
+        parser.add_argument('--path', default='/api/api/appointments/?page_size=20')
+        parser.add_argument('--host', default='localhost', help="Host header; must be in ALLOWED_HOSTS")
+        parser.add_argument('--pool-max', type=int, default=20, help="Pool size for the pool mode")
+        parser.add_argument('--modes', nargs='*', choices=MODES, default=list(MODES))
+
+    def handle(self, *args, **options):
+        database = connections.settings[DEFAULT_DB_ALIAS]
+        original = {**database, 'OPTIONS': dict(database.get('OPTIONS', {}))}
+        handler = get_wsgi_application()
+        report = {'vendor': connections[DEFAULT_DB_ALIAS].vendor, 'clients': options['clients'], 'modes': {}}
+        try:
+            for mode in options['modes']:
+                if mode == 'pool' and not pool_available(original):
+                    report['modes'][mode] = {'skipped': "needs PostgreSQL with psycopg 3 and psycopg_pool"}
+                    continue
+                self.configure(database, original, mode, options)
+                report['modes'][mode] = self.measure(handler, options)
+        finally:
+            self.configure(database, original, None, options)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def configure(self, database, original, mode, options):
+        # Thread-local connections are created from this dict, so update it in place.
+        connections.close_all()
+        close_pool = getattr(connections[DEFAULT_DB_ALIAS], 'close_pool', None)
+        if close_pool is not None:
+            close_pool()
+        if mode is None:
+            settings_dict = original
+        elif mode == 'per_request':
+            settings_dict = {**original, 'CONN_MAX_AGE': 0}
+            settings_dict['OPTIONS'] = {key: value for key, value in original['OPTIONS'].items() if key != 'pool'}
+        else:
+            settings_dict = connection_settings(original, pool=mode == 'pool', pool_max=options['pool_max'])
+        database.clear()
+        database.update(settings_dict)
+
+    def measure(self, handler, options):
+        factory = RequestFactory()
+        barrier = threading.Barrier(options['clients'])
+        latencies = []
+        statuses = Counter()
+        lock = threading.Lock()
+
+        def client():
+            timings = []
+            codes = Counter()
+            try:
+                barrier.wait()
+                for _ in range(options['requests']):
+                    environ = factory.get(options['path'], HTTP_HOST=options['host']).environ
+                    started = time.perf_counter()
+                    response = handler(environ, lambda status, headers: None)
+                    b''.join(response)
+                    # Fires request_finished, which closes or returns the connection as configured.
+                    response.close()
+                    timings.append((time.perf_counter() - started) * 1000)
+                    codes[response.status_code] += 1
+            finally:
+                connections.close_all()
+                with lock:
+                    latencies.extend(timings)
+                    statuses.update(codes)
+
+        connection_stats.reset()
+        threads = [threading.Thread(target=client) for _ in range(options['clients'])]
+        began = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+        database = connection_report()['databases'][DEFAULT_DB_ALIAS]
+
+        latencies.sort()
+        return {
+            'requests': len(latencies),
+            'status': {str(code): count for code, count in sorted(statuses.items())},
+            'requests_per_second': round(len(latencies) / elapsed, 1),
+            'mean_ms': round(statistics.mean(latencies), 3),
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p95_ms': round(latencies[max(int(len(latencies) * 0.95) - 1, 0)], 3),
+            'p99_ms': round(latencies[max(int(len(latencies) * 0.99) - 1, 0)], 3),
+            'connects': database['connects'],
+            'pool': database['pool'],
+        }
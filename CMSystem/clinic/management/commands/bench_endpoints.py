@@ -0,0 +1,190 @@
+import json
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from clinic.models import (
+    Appointment, Consultation, Department, Doctor, Gender, MedicalRecord, Medicine, MedicineType, Patient,
+    Prescription, Schedule, Specialization, TimeSlot, Token
+)
+from clinic.seeding import ClinicDataGenerator
+from clinic.urls import router
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a clinic dataset inside a transaction, time list/retrieve/create on every router endpoint "
+        "through the full request stack and write JSON results. Everything is rolled back afterwards. "
+        "Use --compare with an earlier result file to flag regressions between commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--repeat', type=int, default=5, help="Requests per scenario")
+        parser.add_argument('--page-size', type=int, default=50, help="Page size for the paginated list scenario")
+        parser.add_argument('--only', nargs='*', help="Limit to these router prefixes, e.g. tokens patients")
+        parser.add_argument('--output', help="Write results to this JSON file")
+        parser.add_argument('--compare', help="Baseline JSON file to compare against")
+        parser.add_argument('--threshold', type=float, default=20.0, help="Regression threshold in percent")
+
+    def handle(self, *args, **options):
+        generator = ClinicDataGenerator(scale=options['scale'], seed=options['seed'])
+        with transaction.atomic():
+            counts = generator.generate()
+            self.ids = self.sample_ids()
+            client = APIClient()
+            client.raise_request_exception = False
+            client.force_authenticate(user=get_user_model().objects.create_superuser(
+                username='bench-admin', password=None, mobile_number='bench-admin'
+            ))
+            scenarios = {}
+            for prefix, viewset, basename in router.registry:
+                if options['only'] and prefix not in options['only']:
+                    continue
+                for name, method, url, payload in self.scenarios(prefix, options['page_size']):
+                    scenarios[f"{prefix}.{name}"] = self.run(client, method, url, payload, options['repeat'])
+            transaction.set_rollback(True)
+
+        results = {
+            'meta': {
+                'commit': self.git_commit(),
+                'vendor': connection.vendor,
+                'python': sys.version.split()[0],
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'scale': options['scale'],
+                'seed': options['seed'],
+                'repeat': options['repeat'],
+                'rows': counts,
+            },
+            'scenarios': scenarios,
+        }
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output)
+        else:
+            self.stdout.write(output)
+        if options['compare']:
+            self.compare(options['compare'], scenarios, options['threshold'])
+
+    def sample_ids(self):
+        models = {
+            'staff': get_user_model(), 'patients': Patient, 'appointments': Appointment, 'doctors': Doctor,
+            'schedules': Schedule, 'time-slots': TimeSlot, 'tokens': Token, 'consultations': Consultation,
+            'medical-records': MedicalRecord, 'prescriptions': Prescription, 'medicines': Medicine,
+            'medicine-types': MedicineType, 'genders': Gender, 'departments': Department,
+            'specializations': Specialization,
+        }
+        ids = {prefix: model.objects.order_by('pk').values_list('pk', flat=True).first() for prefix, model in models.items()}
+        ids['bills'] = Appointment.objects.filter(bills__isnull=False).values_list('bills', flat=True).first()
+        ids['salary'] = get_user_model().objects.filter(staff_salary__isnull=False).values_list('staff_salary', flat=True).first()
+        ids['receptionists'] = None
+        # Doctor creation needs staff members that are not doctors yet.
+        self.free_staff = list(
+            get_user_model().objects.filter(doctor__isnull=True, is_superuser=False).values_list('pk', flat=True)
+        )
+        return ids
+
+    def create_payload(self, prefix, n):
+        ids = self.ids
+        payloads = {
+            'staff': {'username': f'bench-new-{n}', 'first_name': 'New', 'last_name': 'Staff', 'email': f'new{n}@example.com'},
+            'patients': {'full_name': 'New Patient', 'dob': '1990-01-01', 'mobile_number': '9000000000', 'address': 'Kochi'},
+            'appointments': {'appointment_date': '2024-01-10'},
+            'specializations': {'specialization_name': f'bench new {n}'},
+            'doctors': {'staff': self.free_staff[n % len(self.free_staff)], 'specialization': ids['specializations'], 'consultation_fee': '300.00', 'year_of_experience': 4},
+            'schedules': {'schedule_date': '2024-01-10', 'token': 20},
+            'time-slots': {'type': 'bench-new', 'start_time': '09:00', 'end_time': '10:00'},
+            'tokens': {'token_number': 1},
+            'consultations': {'token': ids['tokens'], 'prescription': ids['prescriptions'], 'patient': ids['patients'],
+                              'symptoms': 'Cough', 'diagnosis': 'Cold', 'notes': '-', 'additional_notes': '-',
+                              'created_at': '2024-01-10T10:00:00Z'},
+            'medical-records': {'patient': ids['patients'], 'doctors': [ids['doctors']], 'record_date': '2024-01-10',
+                                'consultation': ids['consultations']},
+            'bills': {'total_amount': '300.00'},
+            'prescriptions': {'patient': ids['patients'], 'medicines': [ids['medicines']], 'dosage': '1',
+                              'frequency': '1', 'duration': '1'},
+            'salary': {'base_salary': '20000.00'},
+            'medicines': {'name': 'New Medicine', 'dose': '5mg'},
+            'medicine-types': {'type_name': f'bench-n{n}'},
+            'receptionists': {},
+            'genders': {'name': f'bench-n{n}'},
+            'departments': {'department_name': f'bench new {n}', 'base_salary': '20000.00'},
+        }
+        return payloads.get(prefix, {})
+
+    def scenarios(self, prefix, page_size):
+        base = f'/api/api/{prefix}/'
+        yield 'list', 'get', base, None
+        yield 'list_page', 'get', f'{base}?page_size={page_size}', None
+        if self.ids.get(prefix) is not None:
+            yield 'retrieve', 'get', f'{base}{self.ids[prefix]}/', None
+        yield 'create', 'post', base, lambda n: self.create_payload(prefix, n)
+
+    def run(self, client, method, url, payload, repeat):
+        timings = []
+        statuses = {}
+        queries = 0
+        size = 0
+        for n in range(repeat):
+            # A savepoint per request keeps one failing endpoint from poisoning the transaction.
+            with transaction.atomic(), CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                if payload is None:
+                    response = getattr(client, method)(url)
+                else:
+                    response = getattr(client, method)(url, payload(n), format='json')
+                timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code >= 500:
+                    transaction.set_rollback(True)
+            queries = len(context.captured_queries)
+            size = len(response.content)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+        timings.sort()
+        return {
+            'method': method.upper(),
+            'url': url,
+            'status': statuses,
+            'queries': queries,
+            'response_bytes': size,
+            'mean_ms': round(statistics.mean(timings), 3),
+            'p50_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(timings[max(int(len(timings) * 0.95) - 1, 0)], 3),
+        }
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def compare(self, path, scenarios, threshold):
+        with open(path) as handle:
+            baseline = json.load(handle)['scenarios']
+        regressions = 0
+        self.stdout.write(f"{'scenario':<32}{'base p50':>10}{'p50':>10}{'delta':>9}{'queries':>12}")
+        for name, current in scenarios.items():
+            previous = baseline.get(name)
+            if previous is None:
+                continue
+            delta = (current['p50_ms'] - previous['p50_ms']) / previous['p50_ms'] * 100 if previous['p50_ms'] else 0
+            flag = ''
+            if delta > threshold or current['queries'] > previous['queries']:
+                flag = '  REGRESSION'
+                regressions += 1
+            self.stdout.write(
+                f"{name:<32}{previous['p50_ms']:>10.2f}{current['p50_ms']:>10.2f}{delta:>8.1f}%"
+                f"{previous['queries']:>6}->{current['queries']:<5}{flag}"
+            )
+        self.stdout.write(f"{regressions} regression(s) above {threshold}% or with more queries.")
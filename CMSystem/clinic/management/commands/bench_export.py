@@ -0,0 +1,106 @@
+import json
+import time
+import tracemalloc
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from clinic.models import (
+    Appointment, Consultation, Doctor, Gender, MedicalRecord, Medicine, MedicineType,
+    Patient, Prescription, Specialization, Token
+)
+from clinic.views import ConsultationViewSet, MedicalRecordViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed N consultations and medical records inside a transaction, stream the export endpoints "
+        "and report time and peak Python memory. All seeded rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--batch', type=int, default=10000, help="bulk_create batch size while seeding")
+        parser.add_argument('--output', choices=['csv', 'ndjson'], default='csv')
+        parser.add_argument('--no-tracemalloc', action='store_true',
+                            help="Skip memory tracing, which slows the export several times over")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = self.seed(options['rows'], options['batch'])
+            results = [
+                self.measure(ConsultationViewSet, 'consultations', user, options),
+                self.measure(MedicalRecordViewSet, 'medical-records', user, options),
+            ]
+            transaction.set_rollback(True)
+        self.stdout.write(json.dumps({'rows': options['rows'], 'results': results}, indent=2))
+
+    def seed(self, rows, batch):
+        gender = Gender.objects.create(name='bench')
+        staff = get_user_model().objects.create_user(username='export-bench', password=None)
+        doctor = Doctor.objects.create(
+            staff=staff, specialization=Specialization.objects.create(specialization_name='export-bench'),
+            consultation_fee=0, year_of_experience=0
+        )
+        patient = Patient.objects.create(
+            full_name='Bench Patient', dob=date(2000, 1, 1), gender=gender, mobile_number='0000000000', address='-'
+        )
+        appointment = Appointment.objects.create(patient=patient, doctor=doctor, appointment_date=date(2000, 1, 1))
+        token = Token.objects.create(appointment=appointment, token_number=1)
+        prescription = Prescription.objects.create(dosage='1', frequency='1', duration='1', patient=patient)
+        prescription.medicines.add(Medicine.objects.create(
+            name='Bench', dose='1', type=MedicineType.objects.create(type_name='bench')
+        ))
+
+        now = timezone.now()
+        doctors_through = MedicalRecord.doctors.through
+        for start in range(0, rows, batch):
+            size = min(batch, rows - start)
+            consultations = Consultation.objects.bulk_create([
+                Consultation(
+                    token=token, patient=patient, prescription=prescription, symptoms='Cough and fever',
+                    diagnosis='Flu', notes='Rest', additional_notes='Fluids', created_at=now
+                )
+                for _ in range(size)
+            ])
+            records = MedicalRecord.objects.bulk_create([
+                MedicalRecord(patient=patient, consultation=consultation, record_date=date(2000, 1, 1))
+                for consultation in consultations
+            ])
+            doctors_through.objects.bulk_create([
+                doctors_through(medicalrecord_id=record.pk, doctor_id=doctor.pk) for record in records
+            ])
+        return staff
+
+    def measure(self, viewset, name, user, options):
+        view = viewset.as_view({'get': 'export'})
+        request = APIRequestFactory().get(f'/api/api/{name}/export/', {'output': options['output']})
+        force_authenticate(request, user=user)
+
+        trace = not options['no_tracemalloc']
+        if trace:
+            tracemalloc.start()
+        started = time.perf_counter()
+        response = view(request)
+        size = 0
+        lines = 0
+        for chunk in response.streaming_content:
+            size += len(chunk)
+            lines += 1
+        elapsed = time.perf_counter() - started
+        peak = None
+        if trace:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        return {
+            'endpoint': name,
+            'lines': lines,
+            'bytes': size,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(lines / elapsed) if elapsed else None,
+            'peak_memory_mb': round(peak / 1024 / 1024, 2) if peak is not None else None,
+        }
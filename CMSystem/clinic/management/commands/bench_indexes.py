@@ -0,0 +1,167 @@
+import json
+import random
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from clinic.models import (
+    Appointment, Consultation, Doctor, Gender, Patient, Prescription, Schedule, Specialization, Token
+)
+
+# Indexes for the hot lookup paths; they are dropped for the "before" run.
+HOT_PATH_INDEXES = [
+    (Appointment, 'appointment_doctor_date_idx'),
+    (Appointment, 'appointment_active_idx'),
+    (Schedule, 'schedule_doctor_date_idx'),
+    (Token, 'token_appointment_status_idx'),
+    (Patient, 'patient_mobile_idx'),
+    (Consultation, 'consultation_patient_time_idx'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a clinic-sized dataset, then time the hot lookup queries and print their plans without "
+        "and with the hot-path indexes. Seeded rows are deleted afterwards; run it on a staging database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=50)
+        parser.add_argument('--patients', type=int, default=20000)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--appointments', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=200, help="Executions per query")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        try:
+            with transaction.atomic():
+                self.seed(options)
+            queries = self.build_queries(options)
+            self.set_indexes(enabled=False)
+            before = self.measure(queries, options['repeat'])
+            self.set_indexes(enabled=True)
+            after = self.measure(queries, options['repeat'])
+        finally:
+            self.set_indexes(enabled=True)
+            self.cleanup()
+
+        report = {
+            'vendor': connection.vendor,
+            'scale': {key: options[key] for key in ('doctors', 'patients', 'days', 'appointments')},
+            'queries': [
+                {'name': name, 'before': before[name], 'after': after[name]} for name in queries
+            ],
+        }
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def set_indexes(self, enabled):
+        table_indexes = {}
+        with connection.cursor() as cursor:
+            for model, _ in HOT_PATH_INDEXES:
+                table = model._meta.db_table
+                if table not in table_indexes:
+                    table_indexes[table] = connection.introspection.get_constraints(cursor, table)
+        with connection.schema_editor() as editor:
+            for model, name in HOT_PATH_INDEXES:
+                exists = name in table_indexes[model._meta.db_table]
+                if exists == enabled:
+                    continue
+                index = next(index for index in model._meta.indexes if index.name == name)
+                if enabled:
+                    editor.add_index(model, index)
+                else:
+                    editor.remove_index(model, index)
+        # Drop cached statements and plans that were prepared against the old schema.
+        connection.close()
+
+    def cleanup(self):
+        # Doctors' staff and the bench gender cascade to every seeded row.
+        get_user_model().objects.filter(username__startswith='index-bench-').delete()
+        Gender.objects.filter(name='bench').delete()
+        Specialization.objects.filter(specialization_name='index-bench').delete()
+
+    def seed(self, options):
+        rnd = self.random
+        if Gender.objects.filter(name='bench').exists():
+            raise CommandError("A 'bench' gender already exists; remove leftovers from an earlier run first.")
+        gender = Gender.objects.create(name='bench')
+        specialization = Specialization.objects.create(specialization_name='index-bench')
+        User = get_user_model()
+        staff = User.objects.bulk_create([
+            User(username=f'index-bench-{n}') for n in range(options['doctors'])
+        ])
+        self.doctors = Doctor.objects.bulk_create([
+            Doctor(staff=member, specialization=specialization, consultation_fee=100, year_of_experience=1)
+            for member in staff
+        ])
+        self.patients = Patient.objects.bulk_create([
+            Patient(full_name=f'Patient {n}', dob=date(1980, 1, 1), gender=gender,
+                    mobile_number=f'9{n:09d}', address='-')
+            for n in range(options['patients'])
+        ], batch_size=5000)
+        self.start = date(2024, 1, 1)
+        Schedule.objects.bulk_create([
+            Schedule(doctor=doctor, schedule_date=self.start + timedelta(days=day), token=30)
+            for doctor in self.doctors for day in range(options['days'])
+        ], batch_size=5000)
+
+        appointments = Appointment.objects.bulk_create([
+            Appointment(
+                patient=rnd.choice(self.patients), doctor=rnd.choice(self.doctors),
+                appointment_date=self.start + timedelta(days=rnd.randrange(options['days'])),
+                is_active=rnd.random() > 0.1,
+            )
+            for _ in range(options['appointments'])
+        ], batch_size=5000)
+        self.appointments = appointments
+        tokens = Token.objects.bulk_create([
+            Token(appointment=appointment, token_number=n % 30 + 1, status=rnd.random() > 0.5)
+            for n, appointment in enumerate(appointments)
+        ], batch_size=5000)
+        prescription = Prescription.objects.create(dosage='1', frequency='1', duration='1', patient=self.patients[0])
+        now = timezone.now()
+        Consultation.objects.bulk_create([
+            Consultation(
+                token=token, patient_id=token.appointment.patient_id, prescription=prescription,
+                symptoms='-', diagnosis='-', notes='-', additional_notes='-',
+                created_at=now - timedelta(minutes=n),
+            )
+            for n, token in enumerate(tokens)
+        ], batch_size=5000)
+
+    def build_queries(self, options):
+        rnd = self.random
+        doctor = rnd.choice(self.doctors)
+        day = self.start + timedelta(days=rnd.randrange(options['days']))
+        appointment = rnd.choice(self.appointments)
+        patient = appointment.patient
+        return {
+            'appointments_for_doctor_day': Appointment.objects.filter(
+                doctor=doctor, appointment_date=day, is_active=True
+            ),
+            'schedule_for_doctor_day': Schedule.objects.filter(doctor=doctor, schedule_date=day),
+            'active_tokens_for_appointment': Token.objects.filter(appointment=appointment, status=True),
+            'patient_by_mobile': Patient.objects.filter(mobile_number=patient.mobile_number),
+            'recent_consultations_for_patient': Consultation.objects.filter(
+                patient=patient
+            ).order_by('-created_at')[:20],
+        }
+
+    def measure(self, queries, repeat):
+        results = {}
+        for name, queryset in queries.items():
+            started = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset.all())
+            elapsed = time.perf_counter() - started
+            results[name] = {
+                'avg_ms': round(elapsed / repeat * 1000, 3),
+                'plan': queryset.explain(),
+            }
+        return results
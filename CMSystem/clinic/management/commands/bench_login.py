@@ -0,0 +1,99 @@
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, get_hasher, make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from clinic.authentication import CachedJWTAuthentication, get_auth_cache, last_login_buffer
+from clinic.views import LoginView
+
+PASSWORD = 'bench-password'
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure logins/second with last_login written per login and batched, and the per-request "
+        "overhead of JWT authentication with and without the user cache. Runs in a transaction that "
+        "is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help="Staff members logging in once each")
+        parser.add_argument('--requests', type=int, default=2000, help="Authenticated requests per variant")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            report = {
+                'vendor': connection.vendor,
+                'hasher': self.hasher_report(),
+                'login': {
+                    'per_login_write': self.measure_logins(users, batch=1),
+                    'batched_write': self.measure_logins(users, batch=len(users) + 1),
+                },
+                'authentication': {
+                    'jwt': self.measure_auth(JWTAuthentication(), users[0], options['requests']),
+                    'cached_jwt': self.measure_auth(CachedJWTAuthentication(), users[0], options['requests']),
+                },
+            }
+            transaction.set_rollback(True)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def create_users(self, count):
+        # One hash shared by every bench user keeps seeding fast.
+        password = make_password(PASSWORD)
+        User = get_user_model()
+        return User.objects.bulk_create([
+            User(username=f'login-bench-{n}', password=password, mobile_number=f'login-bench-{n}')
+            for n in range(count)
+        ])
+
+    def hasher_report(self):
+        hasher = get_hasher()
+        encoded = make_password(PASSWORD)
+        started = time.perf_counter()
+        check_password(PASSWORD, encoded)
+        return {
+            'algorithm': hasher.algorithm,
+            'iterations': getattr(hasher, 'iterations', None),
+            'verify_ms': round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def measure_logins(self, users, batch):
+        view = LoginView.as_view()
+        factory = APIRequestFactory()
+        statuses = {}
+        with override_settings(CLINIC_LAST_LOGIN_BATCH=batch), CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            for user in users:
+                request = factory.post('/api/login/', {'username': user.username, 'password': PASSWORD}, format='json')
+                status = str(view(request).status_code)
+                statuses[status] = statuses.get(status, 0) + 1
+            last_login_buffer.flush()
+            elapsed = time.perf_counter() - started
+        return {
+            'status': statuses,
+            'logins_per_second': round(len(users) / elapsed, 1),
+            'queries_per_login': round(len(context.captured_queries) / len(users), 3),
+        }
+
+    def measure_auth(self, authenticator, user, count):
+        get_auth_cache().clear()
+        request = APIRequestFactory().get('/api/api/doctors/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            for _ in range(count):
+                authenticated, _ = authenticator.authenticate(Request(request))
+            elapsed = time.perf_counter() - started
+        assert authenticated.pk == user.pk
+        return {
+            'microseconds_per_request': round(elapsed / count * 1_000_000, 1),
+            'queries_per_request': round(len(context.captured_queries) / count, 3),
+        }
@@ -0,0 +1,78 @@
+import json
+import random
+import statistics
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from clinic.models import Gender, Patient
+from clinic.search import search_patients
+
+FIRST_NAMES = ['Anil', 'Asha', 'Bindu', 'Deepa', 'George', 'Jane', 'John', 'Joseph', 'Lakshmi', 'Mary',
+               'Midhun', 'Nisha', 'Priya', 'Rahul', 'Rajesh', 'Sanjay', 'Sneha', 'Thomas', 'Vijay', 'Zara']
+LAST_NAMES = ['Abraham', 'Doe', 'George', 'Iyer', 'Jacob', 'Kumar', 'Menon', 'Nair', 'Pillai', 'Rao',
+              'Reddy', 'Sharma', 'Smith', 'Thomas', 'Varghese', 'Verma', 'Watson', 'Williams', 'Yadav', 'Zachariah']
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed N patients, run random mobile-prefix and name searches and report latency percentiles. "
+        "Seeded rows are deleted afterwards; run it on a staging database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=200000)
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        if Gender.objects.filter(name='bench').exists():
+            raise CommandError("A 'bench' gender already exists; remove leftovers from an earlier run first.")
+        try:
+            with transaction.atomic():
+                gender = Gender.objects.create(name='bench')
+                mobiles = []
+                batch = []
+                for n in range(options['patients']):
+                    mobile = f"{rnd.randrange(6, 10)}{rnd.randrange(10 ** 9):09d}"
+                    mobiles.append(mobile)
+                    batch.append(Patient(
+                        full_name=f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}",
+                        dob=date(1980, 1, 1), gender=gender, mobile_number=mobile, address='-',
+                    ))
+                    if len(batch) == 5000:
+                        Patient.objects.bulk_create(batch)
+                        batch = []
+                Patient.objects.bulk_create(batch)
+
+            queryset = Patient.objects.select_related('gender')
+            scenarios = {
+                'mobile_prefix': [rnd.choice(mobiles)[:rnd.randrange(4, 8)] for _ in range(options['queries'])],
+                'name': [
+                    f"{rnd.choice(FIRST_NAMES)[:rnd.randrange(3, 6)]} {rnd.choice(LAST_NAMES)[:3]}"
+                    for _ in range(options['queries'])
+                ],
+            }
+            results = {}
+            for name, terms in scenarios.items():
+                timings = []
+                for term in terms:
+                    started = time.perf_counter()
+                    list(search_patients(queryset, term))
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                results[name] = {
+                    'p50_ms': round(statistics.median(timings), 3),
+                    'p95_ms': round(timings[int(len(timings) * 0.95) - 1], 3),
+                    'p99_ms': round(timings[int(len(timings) * 0.99) - 1], 3),
+                    'max_ms': round(timings[-1], 3),
+                }
+        finally:
+            Gender.objects.filter(name='bench').delete()
+
+        self.stdout.write(json.dumps({
+            'vendor': connection.vendor, 'patients': options['patients'], 'results': results,
+        }, indent=2))
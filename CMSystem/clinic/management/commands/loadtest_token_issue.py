@@ -0,0 +1,88 @@
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from clinic.models import Appointment, Doctor, Gender, Patient, Specialization, Token
+
+
+class Command(BaseCommand):
+    help = (
+        "Issue tokens for one doctor/day from concurrent threads and report throughput and duplicates. "
+        "Creates its own doctor, patient and appointment and removes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--issuers', type=int, nargs='+', default=[1, 10, 25, 50],
+                            help="Concurrency levels to run, e.g. --issuers 1 10 50")
+        parser.add_argument('--tokens', type=int, default=20, help="Tokens issued by each issuer")
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            self.stderr.write("SQLite serialises writers; run this against the production database engine.")
+
+        gender, gender_created = Gender.objects.get_or_create(name='loadtest')
+        # A run killed before its cleanup leaves its user behind; a fresh name keeps later runs working.
+        staff = get_user_model().objects.create_user(username=f'token-loadtest-{uuid.uuid4().hex[:8]}', password=None)
+        specialization, specialization_created = Specialization.objects.get_or_create(specialization_name='loadtest')
+        try:
+            doctor = Doctor.objects.create(
+                staff=staff, specialization=specialization, consultation_fee=0, year_of_experience=0
+            )
+            patient = Patient.objects.create(
+                full_name='Load Test', dob=date(2000, 1, 1), gender=gender, mobile_number='0000000000', address='-'
+            )
+            results = []
+            for day, issuers in enumerate(options['issuers'], start=1):
+                appointment = Appointment.objects.create(
+                    patient=patient, doctor=doctor, appointment_date=date(2000, 1, day)
+                )
+                results.append(self.run_level(appointment, issuers, options['tokens']))
+            self.stdout.write(json.dumps(results, indent=2))
+        finally:
+            staff.delete()
+            Patient.objects.filter(full_name='Load Test', gender=gender).delete()
+            if specialization_created:
+                specialization.delete()
+            if gender_created:
+                gender.delete()
+
+    def run_level(self, appointment, issuers, tokens):
+        barrier = threading.Barrier(issuers)
+        errors = []
+
+        def issue():
+            try:
+                barrier.wait()
+                for _ in range(tokens):
+                    Token.issue(appointment)
+            except Exception as exc:
+                errors.append(repr(exc))
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [threading.Thread(target=issue) for _ in range(issuers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        numbers = list(Token.objects.filter(appointment=appointment).values_list('token_number', flat=True))
+        duplicates = sum(count - 1 for count in Counter(numbers).values() if count > 1)
+        return {
+            'issuers': issuers,
+            'issued': len(numbers),
+            'duplicates': duplicates,
+            'errors': len(errors),
+            'seconds': round(elapsed, 4),
+            'tokens_per_second': round(len(numbers) / elapsed, 1) if elapsed else None,
+        }
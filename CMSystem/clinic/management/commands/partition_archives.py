@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from clinic.history import partition_archives
+
+
+class Command(BaseCommand):
+    help = (
+        "PostgreSQL only: rebuild the empty token and consultation archive tables as tables partitioned by "
+        "month. Run once after migrate and before the first archive_history run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        for table, outcome in partition_archives(options['database']).items():
+            self.stdout.write(f"{table}: {outcome}")
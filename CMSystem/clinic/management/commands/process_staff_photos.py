@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+
+from clinic.authentication import forget_users
+from clinic.models import Staff
+from clinic.photos import content_hash, process_photo, stored_name
+
+
+class Command(BaseCommand):
+    help = (
+        "Move staff photos stored before the photo pipeline to content-hash names, linking duplicates "
+        "to one file, then render the missing thumbnail and web variants."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delete-duplicates', action='store_true',
+            help="Delete the old files once no staff member refers to them",
+        )
+
+    def handle(self, *args, **options):
+        replaced = set()
+        linked = 0
+        for staff in list(Staff.all_objects.exclude(photo='').filter(photo_hash='').only('id', 'photo')):
+            storage = staff.photo.storage
+            old_name = staff.photo.name
+            if not storage.exists(old_name):
+                continue
+            with staff.photo.open('rb') as file:
+                digest = content_hash(file)
+                name = stored_name(digest, old_name)
+                if not storage.exists(name):
+                    name = storage.save(name, file)
+            Staff.all_objects.filter(pk=staff.pk).update(photo=name, photo_hash=digest)
+            forget_users([staff.pk])
+            if name != old_name:
+                replaced.add(old_name)
+            linked += 1
+
+        rendered = failed = 0
+        for digest in Staff.all_objects.exclude(photo_hash='').filter(photo_thumbnail='').values_list(
+            'photo_hash', flat=True
+        ).distinct():
+            try:
+                rendered += process_photo(digest)
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f"Could not render {digest}: {exc}")
+
+        deleted = 0
+        if options['delete_duplicates']:
+            still_used = set(Staff.all_objects.filter(photo__in=replaced).values_list('photo', flat=True))
+            for name in replaced - still_used:
+                Staff._meta.get_field('photo').storage.delete(name)
+                deleted += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Hashed {linked} photos, rendered {rendered} variant sets ({failed} failed), deleted {deleted} files."
+        ))
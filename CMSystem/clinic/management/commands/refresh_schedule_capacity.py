@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from clinic.models import Appointment, Schedule
+
+
+class Command(BaseCommand):
+    help = "Recompute Schedule.remaining_tokens from the active appointments of each schedule."
+
+    def handle(self, *args, **options):
+        booked = (
+            Appointment.objects.filter(schedule=OuterRef('pk'), is_active=True)
+            .order_by()
+            .values('schedule')
+            .annotate(total=Count('id'))
+            .values('total')
+        )
+        updated = Schedule.all_objects.update(
+            remaining_tokens=F('token') - Coalesce(Subquery(booked), Value(0))
+        )
+        self.stdout.write(self.style.SUCCESS(f"Refreshed capacity for {updated} schedules."))
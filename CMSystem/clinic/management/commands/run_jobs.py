@@ -0,0 +1,70 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from clinic.jobs import Worker, purge_finished
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background jobs. Start as many worker processes as needed; "
+        "--concurrency adds threads within one process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help="Worker threads in this process")
+        parser.add_argument('--batch', type=int, default=10, help="Jobs run per thread between idle checks")
+        parser.add_argument('--sleep', type=float, default=1.0, help="Seconds to wait when the queue is empty")
+        parser.add_argument('--once', action='store_true', help="Exit once no job is due instead of polling")
+        parser.add_argument('--purge-after', type=int, help="First delete jobs finished more than this many days ago")
+
+    def handle(self, *args, **options):
+        if options['purge_after'] is not None:
+            self.stdout.write(f"Purged {purge_finished(options['purge_after'])} finished jobs.")
+        worker = Worker()
+        stop = threading.Event()
+        totals = []
+
+        def loop(index):
+            thread_worker = Worker(f"{worker.worker_id}:{index}")
+            done = 0
+            while not stop.is_set():
+                claimed = thread_worker.run_pending(options['batch'])
+                done += claimed
+                if claimed:
+                    continue
+                if options['once']:
+                    break
+                # Idle: pick up jobs whose worker died, then poll again.
+                thread_worker.requeue_stale()
+                stop.wait(options['sleep'])
+            totals.append(done)
+
+        def threaded_loop(index):
+            try:
+                loop(index)
+            finally:
+                connection.close()
+
+        worker.requeue_stale()
+        threads = []
+        try:
+            if options['concurrency'] <= 1:
+                loop(0)
+            else:
+                threads = [
+                    threading.Thread(target=threaded_loop, args=(n,), daemon=True)
+                    for n in range(options['concurrency'])
+                ]
+                for thread in threads:
+                    thread.start()
+                while any(thread.is_alive() for thread in threads):
+                    time.sleep(0.2)
+        except KeyboardInterrupt:
+            # Let the running jobs finish.
+            stop.set()
+            for thread in threads:
+                thread.join()
+        self.stdout.write(self.style.SUCCESS(f"Ran {sum(totals)} jobs."))
@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from clinic.models import Gender
+from clinic.seeding import ClinicDataGenerator
+
+
+class Command(BaseCommand):
+    help = "Seed a tagged, realistic clinic dataset for manual performance work, or remove it with --cleanup."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0, help="Multiplier for the default row counts")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--tag', default='bench', help="Prefix marking seeded rows")
+        parser.add_argument('--patients', type=int)
+        parser.add_argument('--appointments', type=int)
+        parser.add_argument('--doctors', type=int)
+        parser.add_argument('--cleanup', action='store_true', help="Delete the rows seeded under --tag")
+
+    def handle(self, *args, **options):
+        generator = ClinicDataGenerator(
+            scale=options['scale'], seed=options['seed'], tag=options['tag'],
+            patients=options['patients'], appointments=options['appointments'], doctors=options['doctors'],
+        )
+        if options['cleanup']:
+            generator.cleanup()
+            self.stdout.write(self.style.SUCCESS(f"Removed data tagged '{options['tag']}'."))
+            return
+        if Gender.objects.filter(name__startswith=f"{options['tag']}-").exists():
+            raise CommandError(f"Data tagged '{options['tag']}' already exists; run with --cleanup first.")
+        self.stdout.write(json.dumps(generator.generate(), indent=2))
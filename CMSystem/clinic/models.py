@@ -1,5 +1,13 @@
-from django.db import models
-from django.contrib.auth.models import AbstractUser
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import F, Max, Q
+from django.db.models.fields.related_descriptors import ForwardManyToOneDescriptor
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.contrib.auth.models import AbstractUser, UserManager
 
 class Department(models.Model):
     department_name = models.CharField(max_length=50)
@@ -15,6 +23,86 @@ class Gender(models.Model):
     def __str__(self):
         return self.name
 
+# Soft-deleted rows
+# Staff, appointments and consultations are switched off with is_active,
+# schedules with status, and tokens with status once completed. ``objects``
+# returns only the active rows and is what the viewsets list; ``all_objects``
+# returns every row and is the default manager (Meta.default_manager_name),
+# so unique checks (model and serializer validation), reverse relations,
+# prefetches, the admin and bookkeeping (capacity, rollups, photo dedup, the
+# waiting-room queue) see inactive rows too. Forward foreign keys and
+# refresh_from_db reach them as well. Partial indexes cover only the active
+# rows, and the archive_inactive command moves old inactive rows to archive
+# tables (see archive.py).
+
+class ActiveManager(models.Manager):
+    """Rows matching the model's ``active_condition``."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(self.model.active_condition)
+
+
+class StaffManager(ActiveManager, UserManager):
+    pass
+
+
+# Archived references
+# Rows moved to an archive table (see "Archive tables" below) keep their ids,
+# and rows that pointed at them may stay behind: medical records outlive
+# their consultations, and an archived consultation still names its token.
+# An ArchiveForeignKey whose target row is gone reads it from the target's
+# archive table instead, as a read-only instance of the live model, so
+# ``record.consultation.token.appointment`` works whichever table each row
+# is in. Select-related joins find nothing for archived targets and fall
+# back the same way, one query per row.
+
+ARCHIVE_MODELS = {}
+
+
+class ArchiveFallbackDescriptor(ForwardManyToOneDescriptor):
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        try:
+            related = super().__get__(instance, cls)
+        except self.field.related_model.DoesNotExist:
+            related = None
+        value = getattr(instance, self.field.attname)
+        if related is None and value is not None:
+            related = self.get_archived(instance, value)
+            if related is None and not self.field.null:
+                raise self.RelatedObjectDoesNotExist(
+                    f"{self.field.model.__name__} has no {self.field.name}."
+                )
+            self.field.set_cached_value(instance, related)
+        return related
+
+    def get_archived(self, instance, value):
+        archive = ARCHIVE_MODELS.get(self.field.related_model)
+        if archive is None:
+            return None
+        archived = archive._base_manager.db_manager(hints={'instance': instance}).filter(pk=value).first()
+        return archived.as_source() if archived is not None else None
+
+
+class ArchiveForeignKey(models.ForeignKey):
+    forward_related_accessor_class = ArchiveFallbackDescriptor
+
+
+def CASCADE_UNLESS_ARCHIVED(collector, field, sub_objs, using):
+    """Cascade, except to rows whose target was just copied to its archive table."""
+    archive = ARCHIVE_MODELS[field.related_model]
+    sub_objs = list(sub_objs)
+    archived = set(
+        archive._base_manager.using(using)
+        .filter(pk__in={getattr(obj, field.attname) for obj in sub_objs})
+        .values_list('pk', flat=True)
+    )
+    sub_objs = [obj for obj in sub_objs if getattr(obj, field.attname) not in archived]
+    if sub_objs:
+        models.CASCADE(collector, field, sub_objs, using)
+
+
 # Staff Model
 class Staff(AbstractUser):
     gender = models.ForeignKey(Gender, on_delete=models.SET_NULL, null=True, blank=True, related_name='staff_gender')
@@ -23,11 +111,25 @@ class Staff(AbstractUser):
     joining_date = models.DateTimeField(null=True, blank=True)
     qualification = models.CharField(max_length=100, null=True, blank=True)
     photo = models.ImageField(upload_to='staff_photos/', null=True, blank=True) 
+    # Set by the photo pipeline (see photos.py): content hash of the photo and its generated variants
+    photo_hash = models.CharField(max_length=64, blank=True, default='', db_index=True, editable=False)
+    photo_thumbnail = models.ImageField(upload_to='staff_photos/thumbnails/', blank=True, default='', editable=False)
+    photo_web = models.ImageField(upload_to='staff_photos/web/', blank=True, default='', editable=False)
     department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='staff_department', null=True, blank=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    active_condition = Q(is_active=True)
+    objects = StaffManager()
+    all_objects = UserManager()
+
+    class Meta(AbstractUser.Meta):
+        default_manager_name = 'all_objects'
+        indexes = [
+            models.Index(fields=['id'], condition=Q(is_active=True), name='staff_active_idx'),
+        ]
+
 class Salary(models.Model):
     staff = models.ForeignKey(
         Staff, on_delete=models.CASCADE, related_name='staff_salary', null=True, blank=True
@@ -46,13 +148,25 @@ class Salary(models.Model):
     )
     payment_status = models.BooleanField(default=False)
     salary_payment_date = models.DateField()
+    # First day of the payroll month; set by payroll runs
+    period = models.DateField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['staff', 'period'], name='unique_salary_period'),
+        ]
+
+    def compute_total(self):
+        if self.base_salary is None:
+            return None
+        amounts = [Decimal(str(value or 0)) for value in (self.base_salary, self.increment, self.deductions)]
+        return amounts[0] + amounts[1] - amounts[2]
+
     def save(self, *args, **kwargs):
-        if self.base_salary is not None:
-            self.total_salary = self.base_salary + self.increment - self.deductions
-        else:
-            self.total_salary = None
+        if self.base_salary is None and self.staff and self.staff.department:
+            self.base_salary = self.staff.department.base_salary
+        self.total_salary = self.compute_total()
         super(Salary, self).save(*args, **kwargs)
 
     def __str__(self):
@@ -116,13 +230,109 @@ class TimeSlot(models.Model):
         return f"{self.type}"
 
 
+class ScheduleFull(ValidationError):
+    """Bookings would take more tokens than the schedules ``schedule_ids`` have left."""
+
+    def __init__(self, schedule_ids):
+        self.schedule_ids = sorted(schedule_ids)
+        super().__init__({'schedule': [f"Schedule {pk} has no tokens left." for pk in self.schedule_ids]})
+
+
+def adjust_remaining_tokens(deltas, allow_negative=False):
+    """Apply ``{schedule_id: change}`` to Schedule.remaining_tokens with F() updates.
+
+    A booking (negative change) only applies while the schedule has enough
+    tokens left, otherwise ScheduleFull is raised and the caller's
+    transaction must roll back. Capacity edits pass ``allow_negative``: a
+    token count lowered below the bookings leaves the counter negative, and
+    the schedule takes no bookings until it is positive again.
+    """
+    full = []
+    for schedule_id, change in sorted(deltas.items(), key=lambda item: -item[1]):
+        if not schedule_id or not change:
+            continue
+        schedules = Schedule.all_objects.filter(pk=schedule_id)
+        if change > 0 or allow_negative:
+            schedules.update(remaining_tokens=F('remaining_tokens') + change)
+            continue
+        # An unknown count (see refresh_schedule_capacity) does not block bookings.
+        enough = Q(remaining_tokens__gte=-change) | Q(remaining_tokens__isnull=True)
+        if not schedules.filter(enough).update(remaining_tokens=F('remaining_tokens') + change) and schedules.exists():
+            full.append(schedule_id)
+    if full:
+        raise ScheduleFull(full)
+
+
+def capacity_key(schedule_id, is_active):
+    # Only active appointments hold a token on their schedule
+    return schedule_id if is_active else None
+
+
+class ScheduleQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        for obj in objs:
+            if obj.remaining_tokens is None:
+                obj.remaining_tokens = obj.token
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        fields = [field for field in fields if field != 'remaining_tokens']
+        if 'token' not in fields:
+            return super().bulk_update(objs, fields, *args, **kwargs)
+        with transaction.atomic():
+            old_tokens = dict(
+                self.model.all_objects.select_for_update()
+                .filter(pk__in=[obj.pk for obj in objs]).values_list('pk', 'token')
+            )
+            result = super().bulk_update(objs, fields, *args, **kwargs)
+            adjust_remaining_tokens({
+                obj.pk: obj.token - old_tokens[obj.pk] for obj in objs if obj.pk in old_tokens
+            }, allow_negative=True)
+        return result
+
+
 # Schedule Table
 class Schedule(models.Model):
     doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='schedules')
     schedule_date = models.DateField()
     time_slot = models.ManyToManyField(TimeSlot, related_name="schedules")
     token = models.IntegerField()
+    # Free token capacity, kept in step with active appointments by Appointment.save/delete, which
+    # reject bookings once it reaches 0 (see adjust_remaining_tokens)
+    remaining_tokens = models.IntegerField(null=True, blank=True, editable=False)
     status = models.BooleanField(default=True)
+
+    active_condition = Q(status=True)
+    objects = ActiveManager.from_queryset(ScheduleQuerySet)()
+    all_objects = ScheduleQuerySet.as_manager()
+
+    class Meta:
+        default_manager_name = 'all_objects'
+        indexes = [
+            models.Index(fields=['schedule_date', 'remaining_tokens'], name='schedule_availability_idx'),
+            models.Index(fields=['doctor', 'schedule_date'], name='schedule_doctor_date_idx'),
+            models.Index(fields=['doctor', 'schedule_date'], condition=Q(status=True), name='schedule_active_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            if self.remaining_tokens is None:
+                self.remaining_tokens = self.token
+            return super().save(*args, **kwargs)
+
+        # The counter is only ever moved with F() updates, so never write back a stale copy.
+        with transaction.atomic():
+            old_token = Schedule.all_objects.select_for_update().filter(pk=self.pk).values_list('token', flat=True).first()
+            if kwargs.get('update_fields') is None and old_token is not None:
+                kwargs['update_fields'] = [
+                    field.attname for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name != 'remaining_tokens'
+                ]
+            super().save(*args, **kwargs)
+            if old_token is not None and old_token != self.token:
+                adjust_remaining_tokens({self.pk: self.token - old_token}, allow_negative=True)
+                self.refresh_from_db(fields=['remaining_tokens'])
+
     def __str__(self):
         return f"{self.doctor.staff.first_name}-{self.time_slot}"
 
@@ -135,31 +345,457 @@ class Patient(models.Model):
     mobile_number = models.CharField(max_length=15)
     address = models.CharField(max_length=255)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['mobile_number'], name='patient_mobile_idx'),
+        ]
+
     def __str__(self):
         return self.full_name
 
+# Daily rollups
+# Appointments, consultations and bills feed per-day counters for each doctor
+# and, through the doctor, for its department and specialization, plus
+# consultations per diagnosis. Model saves and deletes (and Appointment bulk
+# writes) apply their change with F() updates in the same transaction, so
+# reports read a few rows per day instead of the source tables. Bills and
+# consultations are reported under their own day but their appointment's
+# doctor, so an appointment saved with another doctor moves their rollups
+# along (move_dependent_rollups). Queryset
+# update()/delete() and cascades bypass this; the backfill_rollups command
+# rebuilds any range from the source tables (see reporting.py).
+
+ROLLUP_METRICS = ('appointments', 'consultations', 'bills', 'billed_amount', 'unpaid_amount')
+
+
+def rollup_day(value):
+    """The local calendar day a timestamp is reported under."""
+    if value is None:
+        return None
+    if timezone.is_aware(value):
+        return timezone.localdate(value)
+    return value.date()
+
+
+def expand_doctor_rollups(doctor_changes):
+    """Spread ``{(day, doctor_id): changes}`` onto doctor, department and specialization rows."""
+    groups = {
+        pk: (department_id or 0, specialization_id)
+        for pk, department_id, specialization_id in Doctor.objects.filter(
+            pk__in={doctor_id for _, doctor_id in doctor_changes}
+        ).values_list('pk', 'staff__department_id', 'specialization_id')
+    }
+    rows = defaultdict(Counter)
+    for (day, doctor_id), changes in doctor_changes.items():
+        department_id, specialization_id = groups.get(doctor_id, (0, 0))
+        rows[DailyRollup.DOCTOR, doctor_id, day].update(changes)
+        rows[DailyRollup.DEPARTMENT, department_id, day].update(changes)
+        rows[DailyRollup.SPECIALIZATION, specialization_id, day].update(changes)
+    return rows
+
+
+def bump_rollup(model, lookup, changes):
+    """Add ``changes`` to the row matching ``lookup``, creating it when missing."""
+    updates = {metric: F(metric) + change for metric, change in changes.items()}
+    if model.objects.filter(**lookup).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **changes)
+    except IntegrityError:
+        # Created by a concurrent writer since the update above
+        model.objects.filter(**lookup).update(**updates)
+
+
+class RollupDeltas:
+    """Rollup changes collected per doctor and day, then applied together."""
+
+    def __init__(self):
+        self.doctors = defaultdict(Counter)
+        self.diagnoses = Counter()
+
+    def add(self, day, doctor_id, sign, **metrics):
+        if day is None or doctor_id is None:
+            return
+        for metric, value in metrics.items():
+            self.doctors[day, doctor_id][metric] += sign * value
+
+    def add_diagnosis(self, day, diagnosis, sign):
+        if day is not None:
+            self.diagnoses[day, diagnosis] += sign
+
+    def apply(self):
+        doctors = {
+            key: changes for key, changes in self.doctors.items()
+            if any(changes.values())
+        }
+        if doctors:
+            for (dimension, key, day), changes in expand_doctor_rollups(doctors).items():
+                bump_rollup(
+                    DailyRollup, {'dimension': dimension, 'key': key, 'date': day},
+                    {metric: change for metric, change in changes.items() if change},
+                )
+        for (day, diagnosis), change in self.diagnoses.items():
+            if change:
+                bump_rollup(DailyDiagnosisRollup, {'date': day, 'diagnosis': diagnosis}, {'consultations': change})
+
+
+def move_dependent_rollups(deltas, old_doctors):
+    """Move the bills and consultations of ``{appointment_id: old doctor_id}`` to the appointments' current doctor."""
+    if not old_doctors:
+        return
+    for model, appointment in ((Bill, 'appointment_id'), (Consultation, 'token__appointment_id')):
+        rows = model.rollup_queryset(
+            model._base_manager.filter(**{f'{appointment}__in': old_doctors})
+        ).annotate(rollup_appointment=F(appointment))
+        for values in rows:
+            model.rollup(deltas, {**values, 'rollup_doctor': old_doctors[values['rollup_appointment']]}, -1)
+            model.rollup(deltas, values, 1)
+
+
+class ReportedModel(models.Model):
+    """A model whose rows feed the daily rollups.
+
+    Subclasses list the fields ``rollup`` reads in ``rollup_fields`` (including
+    the foreign key that leads to the doctor) and the lookup from a row to its
+    doctor's id in ``rollup_doctor``; ``rollup`` receives those values, with
+    the doctor id under ``'rollup_doctor'``.
+    """
+    rollup_fields = ()
+    rollup_doctor = 'doctor_id'
+
+    class Meta:
+        abstract = True
+
+    @staticmethod
+    def rollup(deltas, values, sign):
+        """Add the row's ``values`` (None when there is no row) to ``deltas``, ``sign`` times.
+
+        Does nothing here: a subclass that reports nothing feeds no rollups.
+        """
+
+    @classmethod
+    def rollup_queryset(cls, queryset):
+        return queryset.values('pk', *cls.rollup_fields, rollup_doctor=F(cls.rollup_doctor))
+
+    def rollup_values(self, previous=None):
+        values = {field: getattr(self, field) for field in self.rollup_fields}
+        values['rollup_doctor'] = self.rollup_doctor_id(previous)
+        return values
+
+    def rollup_doctor_id(self, previous=None):
+        if '__' not in self.rollup_doctor:
+            return getattr(self, self.rollup_doctor)
+        parent, path = self.rollup_doctor.split('__', 1)
+        field = self._meta.get_field(parent)
+        parent_id = getattr(self, field.attname)
+        if previous and previous[field.attname] == parent_id:
+            return previous['rollup_doctor']
+        return field.related_model._base_manager.filter(pk=parent_id).values_list(path, flat=True).first()
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = None
+            if self.pk is not None:
+                previous = self.rollup_queryset(type(self)._base_manager.select_for_update().filter(pk=self.pk)).first()
+            super().save(*args, **kwargs)
+            self.saved(previous)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = self.rollup_queryset(type(self)._base_manager.select_for_update().filter(pk=self.pk)).first()
+            result = super().delete(*args, **kwargs)
+            self.deleted(previous)
+        return result
+
+    def saved(self, previous):
+        deltas = RollupDeltas()
+        self.rollup(deltas, previous, -1)
+        self.rollup(deltas, self.rollup_values(previous), 1)
+        deltas.apply()
+
+    def deleted(self, previous):
+        deltas = RollupDeltas()
+        self.rollup(deltas, previous, -1)
+        deltas.apply()
+
+
+class AppointmentQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic():
+            result = super().bulk_create(objs, *args, **kwargs)
+            booked = Counter(capacity_key(obj.schedule_id, obj.is_active) for obj in objs)
+            adjust_remaining_tokens({schedule_id: -count for schedule_id, count in booked.items()})
+            deltas = RollupDeltas()
+            for obj in objs:
+                Appointment.rollup(deltas, obj.rollup_values(), 1)
+            deltas.apply()
+        return result
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if {'schedule', 'is_active', 'doctor', 'appointment_date'}.isdisjoint(fields):
+            return super().bulk_update(objs, fields, *args, **kwargs)
+        with transaction.atomic():
+            previous = {
+                row['pk']: row for row in Appointment.rollup_queryset(
+                    self.model.all_objects.select_for_update().filter(pk__in=[obj.pk for obj in objs])
+                )
+            }
+            result = super().bulk_update(objs, fields, *args, **kwargs)
+            capacity = Counter()
+            deltas = RollupDeltas()
+            old_doctors = {}
+            for obj in objs:
+                old = previous.get(obj.pk)
+                capacity[capacity_key(old['schedule_id'], old['is_active']) if old else None] += 1
+                capacity[capacity_key(obj.schedule_id, obj.is_active)] -= 1
+                Appointment.rollup(deltas, old, -1)
+                Appointment.rollup(deltas, obj.rollup_values(old), 1)
+                if old and old['rollup_doctor'] != obj.doctor_id:
+                    old_doctors[obj.pk] = old['rollup_doctor']
+            move_dependent_rollups(deltas, old_doctors)
+            adjust_remaining_tokens(capacity)
+            deltas.apply()
+        return result
+
+
+# Booking conflicts
+# A timed appointment (one with start_time/end_time, filled from its
+# time_slot when not given) must not overlap another active timed
+# appointment of the same doctor or patient on the same day. Appointment.save
+# checks with an indexed range query after locking the doctor and patient
+# rows; on PostgreSQL exclusion constraints installed by conflicts.py also
+# enforce it in the database. Untimed appointments, i.e. the token queue,
+# are not checked. Batch imports use conflicts.check_batch instead.
+
+TIMED_APPOINTMENT = Q(is_active=True, start_time__isnull=False, end_time__isnull=False)
+OVERLAP_CONSTRAINTS = ('appointment_doctor_no_overlap', 'appointment_patient_no_overlap')
+
+
+class AppointmentConflict(ValidationError):
+    """An appointment overlaps others; ``conflicts`` maps 'doctor'/'patient' to what it overlaps."""
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__({
+            role: [f"{role.capitalize()} is already booked in an overlapping slot ({', '.join(labels)})."]
+            for role, labels in conflicts.items() if labels
+        })
+
+
+def lock_bookings(doctor_ids, patient_ids):
+    """Serialize bookings of these doctors and patients until the transaction ends."""
+    if connection.vendor == 'postgresql':
+        # The exclusion constraints reject overlapping rows on their own.
+        return
+    list(Doctor.objects.select_for_update().filter(pk__in=sorted(doctor_ids)).values_list('pk'))
+    list(Patient.objects.select_for_update().filter(pk__in=sorted(patient_ids)).values_list('pk'))
+
+
 # Appointment Table
-class Appointment(models.Model):
+class Appointment(ReportedModel):
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='appointments_patient')
     doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='appointments')
-    schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE, related_name='schedules', null=True, blank=True)
+    schedule = ArchiveForeignKey(Schedule, on_delete=models.CASCADE, related_name='schedules', null=True, blank=True)
     appointment_date = models.DateField()
     is_pre_booked = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
+    time_slot = models.ForeignKey(TimeSlot, on_delete=models.SET_NULL, related_name='appointments', null=True, blank=True)
+    # Booked interval, [start_time, end_time); empty for untimed (token queue) appointments
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+
+    active_condition = Q(is_active=True)
+    objects = ActiveManager.from_queryset(AppointmentQuerySet)()
+    all_objects = AppointmentQuerySet.as_manager()
+
+    rollup_fields = ('schedule_id', 'is_active', 'appointment_date')
+    rollup_doctor = 'doctor_id'
+
+    class Meta:
+        default_manager_name = 'all_objects'
+        constraints = [
+            models.CheckConstraint(
+                condition=Q(start_time__isnull=True) | Q(end_time__isnull=True) | Q(start_time__lt=F('end_time')),
+                name='appointment_interval_valid',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['doctor', 'appointment_date'], name='appointment_doctor_date_idx'),
+            models.Index(
+                fields=['doctor', 'appointment_date'], condition=Q(is_active=True),
+                name='appointment_active_idx',
+            ),
+            models.Index(fields=['id'], condition=Q(is_active=True), name='appointment_active_id_idx'),
+            models.Index(
+                fields=['doctor', 'appointment_date', 'start_time'], condition=TIMED_APPOINTMENT,
+                name='appointment_doctor_slot_idx',
+            ),
+            models.Index(
+                fields=['patient', 'appointment_date', 'start_time'], condition=TIMED_APPOINTMENT,
+                name='appointment_patient_slot_idx',
+            ),
+        ]
+
+    @property
+    def is_timed(self):
+        return self.is_active and self.start_time is not None and self.end_time is not None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_interval = instance.interval_state()
+        return instance
+
+    def interval_state(self):
+        # Deferred fields are not in __dict__ and count as unknown.
+        return tuple(self.__dict__.get(name) for name in ('time_slot_id', 'start_time', 'end_time'))
+
+    def fill_interval(self):
+        """Take the interval from the time slot if no times are set, or the slot changed but the times did not."""
+        if not self.time_slot_id:
+            return
+        loaded = getattr(self, '_loaded_interval', None)
+        moved = (
+            loaded is not None and loaded[0] != self.time_slot_id
+            and loaded[1:] == (self.start_time, self.end_time)
+        )
+        if moved or (self.start_time is None and self.end_time is None):
+            self.start_time, self.end_time = self.time_slot.start_time, self.time_slot.end_time
+
+    def find_conflicts(self):
+        """Labels of the active timed appointments this one overlaps, by 'doctor' and 'patient'."""
+        conflicts = {'doctor': [], 'patient': []}
+        if not self.is_timed:
+            return conflicts
+        overlapping = Appointment.objects.filter(
+            TIMED_APPOINTMENT, Q(doctor_id=self.doctor_id) | Q(patient_id=self.patient_id),
+            appointment_date=self.appointment_date, start_time__lt=self.end_time, end_time__gt=self.start_time,
+        ).exclude(pk=self.pk)
+        for pk, doctor_id, patient_id in overlapping.order_by('pk').values_list('pk', 'doctor_id', 'patient_id'):
+            if doctor_id == self.doctor_id:
+                conflicts['doctor'].append(f"appointment {pk}")
+            if patient_id == self.patient_id:
+                conflicts['patient'].append(f"appointment {pk}")
+        return conflicts
+
+    def save(self, *args, **kwargs):
+        self.fill_interval()
+        with transaction.atomic():
+            if self.is_timed:
+                lock_bookings([self.doctor_id], [self.patient_id])
+                conflicts = self.find_conflicts()
+                if conflicts['doctor'] or conflicts['patient']:
+                    raise AppointmentConflict(conflicts)
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+            except IntegrityError as exc:
+                # A concurrent booking won the race for the slot.
+                if not any(name in str(exc) for name in OVERLAP_CONSTRAINTS):
+                    raise
+                raise AppointmentConflict(self.find_conflicts()) from exc
+        self._loaded_interval = self.interval_state()
+
+    @staticmethod
+    def rollup(deltas, values, sign):
+        if values and values['is_active']:
+            deltas.add(values['appointment_date'], values['rollup_doctor'], sign, appointments=1)
+
+    def saved(self, previous):
+        old_schedule = capacity_key(previous['schedule_id'], previous['is_active']) if previous else None
+        new_schedule = capacity_key(self.schedule_id, self.is_active)
+        if old_schedule != new_schedule:
+            adjust_remaining_tokens({old_schedule: 1, new_schedule: -1})
+        super().saved(previous)
+        if previous and previous['rollup_doctor'] != self.doctor_id:
+            deltas = RollupDeltas()
+            move_dependent_rollups(deltas, {self.pk: previous['rollup_doctor']})
+            deltas.apply()
+
+    def deleted(self, previous):
+        if previous:
+            adjust_remaining_tokens({capacity_key(previous['schedule_id'], previous['is_active']): 1})
+        super().deleted(previous)
 
     def __str__(self):
         return f"{self.patient.full_name}"
 
 # Token Table
 class Token(models.Model):
-    appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='tokens')
+    appointment = ArchiveForeignKey(Appointment, on_delete=models.CASCADE, related_name='tokens')
     token_number = models.IntegerField()
     issued_at = models.DateTimeField(auto_now_add=True)
+    called_at = models.DateTimeField(null=True, blank=True)
     status = models.BooleanField(default=True)
 
+    active_condition = Q(status=True)
+    objects = ActiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        default_manager_name = 'all_objects'
+        constraints = [
+            # Token.issue numbers tokens from TokenCounter; this catches any path that double-issues.
+            models.UniqueConstraint(fields=['appointment', 'token_number'], name='unique_appointment_token'),
+        ]
+        indexes = [
+            models.Index(fields=['appointment', 'status'], name='token_appointment_status_idx'),
+            models.Index(fields=['appointment'], condition=Q(status=True), name='token_open_idx'),
+            models.Index(fields=['issued_at'], name='token_issued_idx'),
+        ]
+
     def __str__(self):
         return f"{self.appointment.patient.full_name}"
 
+    @classmethod
+    def issue(cls, appointment):
+        """Create the next numbered token for the appointment's doctor and day."""
+        with transaction.atomic():
+            number = TokenCounter.next_number(appointment.doctor_id, appointment.appointment_date)
+            return cls.objects.create(appointment=appointment, token_number=number)
+
+    @property
+    def queue_state(self):
+        if not self.status:
+            return 'completed'
+        return 'called' if self.called_at else 'waiting'
+
+    def call(self):
+        self.called_at = timezone.now()
+        self.save(update_fields=['called_at'])
+
+    def complete(self):
+        self.status = False
+        self.save(update_fields=['status'])
+
+
+# Token Counter: one row per doctor and day, locked while a token number is taken
+class TokenCounter(models.Model):
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='token_counters')
+    date = models.DateField()
+    last_number = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'date'], name='unique_token_counter'),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor_id}-{self.date}"
+
+    @classmethod
+    def next_number(cls, doctor_id, date):
+        with transaction.atomic():
+            # A new counter continues after tokens numbered without one (seeded or imported rows).
+            issued = Token.all_objects.filter(appointment__doctor_id=doctor_id, appointment__appointment_date=date)
+            counter, _ = cls.objects.select_for_update().get_or_create(
+                doctor_id=doctor_id, date=date,
+                defaults={'last_number': lambda: issued.aggregate(last=Coalesce(Max('token_number'), 0))['last']},
+            )
+            cls.objects.filter(pk=counter.pk).update(last_number=F('last_number') + 1)
+            return cls.objects.filter(pk=counter.pk).values_list('last_number', flat=True).get()
+
 
 # Medicine Type
 class MedicineType(models.Model):
@@ -189,8 +825,8 @@ class Prescription(models.Model):
         return f"{self.patient.full_name}"
 
 # Consultation Table
-class Consultation(models.Model):
-    token = models.ForeignKey(Token, on_delete=models.CASCADE, related_name='consultations')
+class Consultation(ReportedModel):
+    token = ArchiveForeignKey(Token, on_delete=models.CASCADE, related_name='consultations')
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='consultations')
     symptoms = models.TextField()
     diagnosis = models.CharField(max_length=50)
@@ -200,6 +836,30 @@ class Consultation(models.Model):
     prescription = models.ForeignKey(Prescription, on_delete=models.CASCADE, related_name='consultations')
     is_active = models.BooleanField(default=True)
 
+    active_condition = Q(is_active=True)
+    objects = ActiveManager()
+    all_objects = models.Manager()
+
+    rollup_fields = ('token_id', 'is_active', 'created_at', 'diagnosis')
+    rollup_doctor = 'token__appointment__doctor_id'
+
+    class Meta:
+        default_manager_name = 'all_objects'
+        indexes = [
+            models.Index(fields=['patient', 'created_at'], name='consultation_patient_time_idx'),
+            models.Index(fields=['created_at'], name='consultation_created_idx'),
+            models.Index(
+                fields=['patient', 'created_at'], condition=Q(is_active=True), name='consultation_active_idx',
+            ),
+        ]
+
+    @staticmethod
+    def rollup(deltas, values, sign):
+        if values and values['is_active']:
+            day = rollup_day(values['created_at'])
+            deltas.add(day, values['rollup_doctor'], sign, consultations=1)
+            deltas.add_diagnosis(day, values['diagnosis'], sign)
+
     def __str__(self):
         return f"{self.patient.full_name}"
 
@@ -208,15 +868,158 @@ class MedicalRecord(models.Model):
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='medical_records')
     doctors = models.ManyToManyField(Doctor, related_name='medical_records')
     record_date = models.DateField()
-    consultation = models.ForeignKey(Consultation, on_delete=models.CASCADE, related_name='medical_records')
+    # Records stay when their consultation is archived (see archive.py); null only for that reason.
+    consultation = ArchiveForeignKey(
+        Consultation, on_delete=CASCADE_UNLESS_ARCHIVED, related_name='medical_records',
+        null=True, db_constraint=False,
+    )
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.patient.full_name}"
 
 # Bill Table
-class Bill(models.Model):
+class Bill(ReportedModel):
     appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='bills')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     payment_status = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    rollup_fields = ('appointment_id', 'total_amount', 'payment_status', 'created_at')
+    rollup_doctor = 'appointment__doctor_id'
+
+    @staticmethod
+    def rollup(deltas, values, sign):
+        if values:
+            amount = Decimal(str(values['total_amount']))
+            deltas.add(
+                rollup_day(values['created_at']), values['rollup_doctor'], sign,
+                bills=1, billed_amount=amount, unpaid_amount=Decimal(0) if values['payment_status'] else amount,
+            )
+
+
+# Daily rollup of one doctor, department or specialization; key 0 stands for no department
+class DailyRollup(models.Model):
+    DOCTOR = 'doctor'
+    DEPARTMENT = 'department'
+    SPECIALIZATION = 'specialization'
+    DIMENSIONS = [(DOCTOR, 'Doctor'), (DEPARTMENT, 'Department'), (SPECIALIZATION, 'Specialization')]
+
+    dimension = models.CharField(max_length=20, choices=DIMENSIONS)
+    key = models.IntegerField()
+    date = models.DateField()
+    appointments = models.IntegerField(default=0)
+    consultations = models.IntegerField(default=0)
+    bills = models.IntegerField(default=0)
+    billed_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    unpaid_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'key', 'date'], name='unique_daily_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['dimension', 'date'], name='daily_rollup_dimension_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.dimension}-{self.key}-{self.date}"
+
+
+# Daily count of active consultations per diagnosis
+class DailyDiagnosisRollup(models.Model):
+    date = models.DateField()
+    diagnosis = models.CharField(max_length=50)
+    consultations = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'diagnosis'], name='unique_daily_diagnosis_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.diagnosis}-{self.date}"
+
+
+# Background job, run by the run_jobs worker (see jobs.py)
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name}-{self.status}"
+
+
+# Archive tables
+# Old rows moved out of the hot tables by archive_inactive and
+# archive_history (see archive.py). Each mirrors its source table's columns
+# under the same ids; foreign keys are kept as plain ids and many-to-many
+# links as a list of ids, so archived rows neither block nor follow changes
+# to live rows. Token and consultation archives are kept by month of
+# ``period_field``: an index on it here, and monthly range partitions on
+# PostgreSQL (see history.py).
+
+class ArchivedRow(models.Model):
+    class Meta:
+        abstract = True
+
+    def as_source(self):
+        """This row as a read-only instance of the live model."""
+        names = [field.attname for field in self.source_model._meta.concrete_fields]
+        instance = self.source_model.from_db(self._state.db, names, [getattr(self, name) for name in names])
+        instance.archived = True
+        return instance
+
+
+def archive_model(model, period_field=None):
+    meta = {'db_table': f'{model._meta.db_table}_archive'}
+    if period_field:
+        meta['indexes'] = [models.Index(fields=[period_field], name=f'{model._meta.model_name}_arch_month_idx')]
+    attrs = {
+        '__module__': __name__,
+        'source_model': model,
+        'period_field': period_field,
+        'archived_at': models.DateTimeField(auto_now_add=True),
+        'Meta': type('Meta', (), meta),
+    }
+    for field in model._meta.concrete_fields:
+        if field.primary_key:
+            attrs[field.attname] = models.BigIntegerField(primary_key=True)
+        elif field.is_relation:
+            attrs[field.attname] = models.BigIntegerField(null=field.null, db_index=True)
+        else:
+            _, _, args, kwargs = field.deconstruct()
+            for option in ('auto_now', 'auto_now_add', 'unique', 'db_index'):
+                kwargs.pop(option, None)
+            attrs[field.name] = type(field)(*args, **kwargs)
+    for field in model._meta.many_to_many:
+        attrs[field.name] = models.JSONField(default=list)
+    archive = type(f'Archived{model.__name__}', (ArchivedRow,), attrs)
+    ARCHIVE_MODELS[model] = archive
+    return archive
+
+
+ArchivedSchedule = archive_model(Schedule)
+ArchivedAppointment = archive_model(Appointment)
+ArchivedToken = archive_model(Token, 'issued_at')
+ArchivedConsultation = archive_model(Consultation, 'created_at')
@@ -0,0 +1,28 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ClinicCursorPagination(CursorPagination):
+    """Keyset pagination over an indexed column.
+
+    Opt-in per request: the plain list is returned unless the client sends
+    ``?cursor=`` or ``?page_size=``. Viewsets (or single actions) may set
+    ``cursor_ordering`` to page on other columns. The cursor keys on the first
+    ordering column only and falls back to OFFSET within its repeated values,
+    so that column should be unique or repeat only a few times.
+    """
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', self.ordering)
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
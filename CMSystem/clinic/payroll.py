@@ -0,0 +1,78 @@
+import calendar
+from decimal import Decimal
+
+from django.db import transaction
+
+from .models import Salary, Staff
+
+
+# Payroll run
+# One pass per period: read every active staff member with their department's
+# base salary, read the period's existing Salary rows, compute totals in
+# memory and write with bulk_create/bulk_update. Re-running a period updates
+# the unpaid rows in place, so runs are idempotent. The period's rows are
+# locked while read, but rows that do not exist yet cannot be: when two first
+# runs of a period overlap, the later insert hits the (staff, period)
+# constraint and updates the row the other run created instead.
+
+BATCH_SIZE = 500
+UPDATE_FIELDS = ['base_salary', 'increment', 'deductions', 'total_salary', 'salary_payment_date']
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def month_end(day):
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def run_payroll(period, payment_date=None, adjustments=None):
+    """Create or refresh the Salary rows of every active staff member for ``period``.
+
+    ``adjustments`` maps staff id to ``{'increment': ..., 'deductions': ...}``;
+    rows without an adjustment keep their existing amounts (zero for new rows).
+    Rows already marked paid are left untouched.
+    """
+    period = month_start(period)
+    payment_date = payment_date or month_end(period)
+    adjustments = adjustments or {}
+
+    staff_rows = Staff.objects.filter(is_active=True).values_list('id', 'department__base_salary')
+    with transaction.atomic():
+        existing = {
+            salary.staff_id: salary
+            for salary in Salary.objects.select_for_update().filter(period=period)
+        }
+        to_create = []
+        to_update = []
+        skipped = 0
+        for staff_id, base_salary in staff_rows:
+            salary = existing.get(staff_id)
+            if salary is None:
+                salary = Salary(staff_id=staff_id, period=period, increment=Decimal('0'), deductions=Decimal('0'))
+                to_create.append(salary)
+            elif salary.payment_status:
+                skipped += 1
+                continue
+            else:
+                to_update.append(salary)
+
+            salary.base_salary = base_salary
+            salary.salary_payment_date = payment_date
+            for field, value in adjustments.get(staff_id, {}).items():
+                setattr(salary, field, value)
+            salary.total_salary = salary.compute_total()
+
+        Salary.objects.bulk_create(
+            to_create, batch_size=BATCH_SIZE,
+            update_conflicts=True, unique_fields=['staff', 'period'], update_fields=UPDATE_FIELDS,
+        )
+        Salary.objects.bulk_update(to_update, UPDATE_FIELDS, batch_size=BATCH_SIZE)
+
+    return {
+        'period': period,
+        'created': len(to_create),
+        'updated': len(to_update),
+        'skipped_paid': skipped,
+    }
@@ -0,0 +1,113 @@
+import hashlib
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .authentication import forget_users
+from .jobs import job
+from .models import Staff
+
+
+# Staff photo pipeline
+# Uploads are stored under the SHA-256 of their content, so a photo that is
+# already stored is linked instead of written again. Saving a new photo
+# enqueues a render_staff_photo job (see jobs.py), which renders a fixed-size
+# thumbnail (CLINIC_PHOTO_THUMBNAIL_SIZE) and a web variant no larger than
+# CLINIC_PHOTO_WEB_SIZE on a worker, and records both on every Staff row
+# sharing the hash. Until then readers fall back to the original. The
+# process_staff_photos command does the same for photos stored before this
+# pipeline and retries failed renders.
+
+CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(file):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def stored_name(digest, filename):
+    extension = os.path.splitext(filename)[1].lower() or '.jpg'
+    return f"staff_photos/{digest}{extension}"
+
+
+def prepare_staff_photo(staff):
+    """Hash a newly uploaded photo and point ``staff`` at the stored copy, if any.
+
+    Returns True when the photo still needs its variants rendered.
+    """
+    photo = staff.photo
+    if not photo:
+        staff.photo_hash = ''
+        staff.photo_thumbnail = staff.photo_web = ''
+        return False
+    if photo._committed:
+        return False
+
+    digest = content_hash(photo)
+    name = stored_name(digest, photo.name)
+    staff.photo_hash = digest
+    if photo.storage.exists(name):
+        # The same content is already stored: link it instead of writing a copy.
+        photo.name = name
+        photo._committed = True
+    else:
+        # The field's upload_to supplies the directory.
+        photo.name = os.path.basename(name)
+
+    variants = (
+        Staff.all_objects.filter(photo_hash=digest).exclude(photo_thumbnail='')
+        .values_list('photo_thumbnail', 'photo_web').first()
+    )
+    staff.photo_thumbnail, staff.photo_web = variants or ('', '')
+    return variants is None
+
+
+def _render_jpeg(image, quality):
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return ContentFile(buffer.getvalue())
+
+
+def render_variants(file):
+    """Return ``{'thumbnail': ContentFile, 'web': ContentFile}`` for an image file."""
+    with Image.open(file) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    thumbnail_size = tuple(getattr(settings, 'CLINIC_PHOTO_THUMBNAIL_SIZE', (128, 128)))
+    web_size = tuple(getattr(settings, 'CLINIC_PHOTO_WEB_SIZE', (1024, 1024)))
+    web = image.copy()
+    web.thumbnail(web_size, Image.LANCZOS)
+    return {
+        'thumbnail': _render_jpeg(ImageOps.fit(image, thumbnail_size, Image.LANCZOS), quality=75),
+        'web': _render_jpeg(web, quality=82),
+    }
+
+
+def process_photo(digest):
+    """Render the variants of the photo with ``digest`` and record them on its Staff rows."""
+    staff = Staff.all_objects.filter(photo_hash=digest).exclude(photo='').only('id', 'photo').first()
+    if staff is None:
+        return False
+    storage = staff.photo.storage
+    with staff.photo.open('rb') as file:
+        variants = render_variants(file)
+    names = {}
+    for variant, content in variants.items():
+        name = f"staff_photos/{'thumbnails' if variant == 'thumbnail' else variant}/{digest}.jpg"
+        names[f'photo_{variant}'] = name if storage.exists(name) else storage.save(name, content)
+    sharing = Staff.all_objects.filter(photo_hash=digest)
+    sharing.update(**names)
+    forget_users(sharing.values_list('pk', flat=True))
+    return True
+
+
+@job('render_staff_photo')
+def render_staff_photo(digest):
+    process_photo(digest)
@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+from collections import Counter
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.core.checks import Warning, register
+from django.db import connections
+
+
+# Database connections
+# With Django's defaults every request opens a database connection and
+# closes it when the response is done. connection_settings() turns a
+# DATABASES entry into one suited to long-running workers: on PostgreSQL with
+# psycopg 3 and psycopg_pool installed, a bounded pool per worker process
+# (Django's OPTIONS["pool"]); elsewhere, persistent connections kept for
+# CONN_MAX_AGE seconds and health-checked before reuse. connection_stats
+# counts, per worker process, requests served and connections set up (pool
+# checkouts in pool mode); connection_report adds the pool's own counters
+# and is served to admins at /api/db-connections/.
+
+def pool_available(database):
+    return database.get('ENGINE') == 'django.db.backends.postgresql' and find_spec('psycopg_pool') is not None
+
+
+def connection_settings(database, pool=None, max_age=600, pool_min=2, pool_max=10, pool_timeout=10):
+    """Return a copy of the DATABASES entry ``database`` using a pool or persistent connections.
+
+    ``pool=None`` pools whenever the backend supports it. Call it from the
+    settings module, e.g. ``DATABASES = {'default': connection_settings({...})}``.
+    """
+    database = {**database, 'OPTIONS': dict(database.get('OPTIONS', {}))}
+    if pool is None:
+        pool = pool_available(database)
+    if pool:
+        # Pooled connections go back to the pool at the end of each request.
+        database['CONN_MAX_AGE'] = 0
+        options = {'min_size': pool_min, 'max_size': pool_max, 'timeout': pool_timeout}
+        if isinstance(database['OPTIONS'].get('pool'), dict):
+            options.update(database['OPTIONS']['pool'])
+        database['OPTIONS']['pool'] = options
+    else:
+        database['OPTIONS'].pop('pool', None)
+        database['CONN_MAX_AGE'] = max_age
+        database['CONN_HEALTH_CHECKS'] = True
+    return database
+
+
+def connection_mode(database):
+    if database.get('OPTIONS', {}).get('pool'):
+        return 'pool'
+    if database.get('CONN_MAX_AGE'):
+        return 'persistent'
+    return 'per_request'
+
+
+class ConnectionStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.requests = 0
+            self.connects = Counter()
+
+    def request_started(self):
+        with self.lock:
+            self.requests += 1
+
+    def connection_created(self, alias):
+        with self.lock:
+            self.connects[alias] += 1
+
+
+connection_stats = ConnectionStats()
+
+
+def _pool_stats(alias):
+    pool = getattr(connections[alias], 'pool', None)
+    if pool is None:
+        return None
+    stats = pool.get_stats()
+    return {key: stats.get(key, 0) for key in (
+        'pool_min', 'pool_max', 'pool_size', 'pool_available', 'requests_waiting',
+        'requests_num', 'requests_queued', 'requests_wait_ms', 'requests_errors', 'connections_num',
+        'connections_ms', 'connections_errors', 'connections_lost',
+    )}
+
+
+def connection_report():
+    """Connection counters of this worker process, per database alias."""
+    with connection_stats.lock:
+        requests = connection_stats.requests
+        connects = dict(connection_stats.connects)
+        started = connection_stats.started
+    databases = {}
+    for alias, database in connections.settings.items():
+        mode = connection_mode(database)
+        databases[alias] = {
+            'vendor': connections[alias].vendor,
+            'mode': mode,
+            'conn_max_age': database.get('CONN_MAX_AGE'),
+            'health_checks': database.get('CONN_HEALTH_CHECKS', False),
+            'connects': connects.get(alias, 0),
+            'connects_per_request': round(connects.get(alias, 0) / requests, 3) if requests else None,
+            'pool': _pool_stats(alias) if mode == 'pool' else None,
+        }
+    return {
+        'pid': os.getpid(),
+        'uptime_seconds': round(time.time() - started, 1),
+        'requests': requests,
+        'databases': databases,
+    }
+
+
+@register(deploy=True)
+def check_connection_reuse(app_configs, **kwargs):
+    warnings = []
+    for alias, database in settings.DATABASES.items():
+        if database.get('ENGINE') == 'django.db.backends.sqlite3':
+            continue
+        if connection_mode(database) == 'per_request':
+            warnings.append(Warning(
+                f"Database '{alias}' opens a new connection for every request.",
+                hint="Build the entry with clinic.pooling.connection_settings() or set CONN_MAX_AGE.",
+                id='clinic.W001',
+            ))
+    return warnings
@@ -0,0 +1,216 @@
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections, transaction
+from rest_framework import serializers
+
+
+# Request profiling
+# Opt-in: add "clinic.profiling.QueryProfilingMiddleware" to MIDDLEWARE,
+# after the other middleware with a process_view hook. For every request
+# routed to a view it records the SQL query count, total DB time, time spent
+# producing serializer output and response size, keyed by
+# "<ViewClass>.<action>". Queries repeated with the same SQL template are
+# reported as duplicate patterns together with the serializer field that
+# issued them, which is what an N+1 looks like. Only the serializers of
+# DRF generic views are timed and attributed: the middleware calls those
+# views itself, through a subclass whose get_serializer wraps the
+# to_representation and get_attribute of each returned serializer's fields.
+# For those views the process_view hooks of middleware listed after it and
+# all process_exception hooks do not run.
+
+_active_profile = ContextVar('clinic_active_profile', default=None)
+_current_field = ContextVar('clinic_profiled_field', default=None)
+_profiled_views = {}
+_profiled_views_lock = threading.Lock()
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = []  # (sql, seconds, serializer field or None)
+        self.serializer_seconds = 0.0
+
+
+def _record_query(execute, sql, params, many, context):
+    profile = _active_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.queries.append((sql, time.perf_counter() - started, _current_field.get()))
+
+
+def _in_field(method, label):
+    def wrapper(*args, **kwargs):
+        token = _current_field.set(label)
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _current_field.reset(token)
+    return wrapper
+
+
+def _attribute_fields(serializer):
+    """Label queries issued while each field of ``serializer`` reads or renders its value."""
+    if isinstance(serializer, serializers.ListSerializer):
+        _attribute_fields(serializer.child)
+        return
+    for name, field in serializer.fields.items():
+        label = f"{type(serializer).__name__}.{name}"
+        field.get_attribute = _in_field(field.get_attribute, label)
+        field.to_representation = _in_field(field.to_representation, label)
+        if isinstance(field, serializers.BaseSerializer):
+            _attribute_fields(field)
+
+
+def _timed(method, profile):
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            profile.serializer_seconds += time.perf_counter() - started
+    return wrapper
+
+
+class ProfiledSerializerMixin:
+    """Instrument the serializers a view hands out while its request is profiled."""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        profile = _active_profile.get()
+        if profile is not None:
+            _attribute_fields(serializer)
+            serializer.to_representation = _timed(serializer.to_representation, profile)
+        return serializer
+
+
+def _profiled_view(view_func):
+    """``view_func`` served by its DRF view class with ProfiledSerializerMixin, or None for other views."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None or not hasattr(cls, 'get_serializer'):
+        return None
+    with _profiled_views_lock:
+        profiled = _profiled_views.get(view_func)
+        if profiled is None:
+            subclass = type(cls.__name__, (ProfiledSerializerMixin, cls), {})
+            actions = getattr(view_func, 'actions', None)
+            if actions:
+                profiled = subclass.as_view(actions, **view_func.initkwargs)
+            else:
+                profiled = subclass.as_view(**view_func.initkwargs)
+            # As Django's handler does for the view it calls itself.
+            skipped = getattr(view_func, '_non_atomic_requests', set())
+            for alias, settings_dict in connections.settings.items():
+                if settings_dict['ATOMIC_REQUESTS'] and alias not in skipped:
+                    profiled = transaction.atomic(using=alias)(profiled)
+            _profiled_views[view_func] = profiled
+    return profiled
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    index = max(int(round(fraction * len(ordered))) - 1, 0)
+    return ordered[index]
+
+
+class ProfileStore:
+    """Per-endpoint samples kept in process memory, bounded per endpoint."""
+
+    def __init__(self, max_samples=1000):
+        self.max_samples = max_samples
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.samples = defaultdict(lambda: deque(maxlen=self.max_samples))
+            self.duplicates = defaultdict(Counter)
+
+    def add(self, endpoint, sample, duplicates):
+        with self.lock:
+            self.samples[endpoint].append(sample)
+            self.duplicates[endpoint].update(duplicates)
+
+    def report(self):
+        metrics = ('queries', 'db_ms', 'serializer_ms', 'total_ms', 'response_bytes')
+        with self.lock:
+            endpoints = {}
+            for endpoint, samples in self.samples.items():
+                summary = {'requests': len(samples)}
+                for metric in metrics:
+                    values = [sample[metric] for sample in samples]
+                    summary[metric] = {
+                        'p50': _percentile(values, 0.50),
+                        'p95': _percentile(values, 0.95),
+                        'p99': _percentile(values, 0.99),
+                        'max': max(values),
+                    }
+                summary['duplicate_queries'] = [
+                    {'field': field, 'sql': sql, 'count': count}
+                    for (field, sql), count in self.duplicates[endpoint].most_common(10)
+                ]
+                endpoints[endpoint] = summary
+        return endpoints
+
+
+profile_store = ProfileStore(getattr(settings, 'CLINIC_PROFILING_SAMPLES', 1000))
+
+
+def _endpoint_name(request, view_func):
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__name__', 'view')
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f"{cls.__name__}.{action}"
+
+
+class QueryProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.duplicate_threshold = getattr(settings, 'CLINIC_PROFILING_DUPLICATE_THRESHOLD', 3)
+
+    def __call__(self, request):
+        request._clinic_endpoint = None
+        profile = RequestProfile()
+        token = _active_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_record_query))
+                response = self.get_response(request)
+        finally:
+            _active_profile.reset(token)
+        total = time.perf_counter() - started
+
+        endpoint = request._clinic_endpoint
+        if endpoint is not None:
+            profile_store.add(endpoint, self.sample(profile, response, total), self.duplicates(profile))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._clinic_endpoint = _endpoint_name(request, view_func)
+        profiled = _profiled_view(view_func)
+        if profiled is not None:
+            return profiled(request, *view_args, **view_kwargs)
+
+    def sample(self, profile, response, total):
+        return {
+            'queries': len(profile.queries),
+            'db_ms': round(sum(seconds for _, seconds, _ in profile.queries) * 1000, 3),
+            'serializer_ms': round(profile.serializer_seconds * 1000, 3),
+            'total_ms': round(total * 1000, 3),
+            'response_bytes': 0 if response.streaming else len(response.content),
+        }
+
+    def duplicates(self, profile):
+        counts = Counter((field, sql) for sql, _, field in profile.queries)
+        return {key: count for key, count in counts.items() if count >= self.duplicate_threshold}
@@ -0,0 +1,199 @@
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+from .field_selection import FieldSelectionMixin, selection_from_request
+
+
+# Query plans
+# A plan is the (select_related, prefetch_related) pair needed to render a
+# serializer without issuing a query per row. It is derived by walking the
+# serializer's fields: single-valued relations are joined, multi-valued ones
+# are prefetched with their own nested plan. For a field selection (see
+# field_selection.py) the plan also lists the columns to load with only().
+
+def _relation_fields(serializer):
+    for field in serializer.fields.values():
+        if getattr(field, 'write_only', False) or field.source == '*':
+            continue
+        if isinstance(field, serializers.ListSerializer):
+            yield field.source_attrs, field.child
+        elif isinstance(field, serializers.BaseSerializer):
+            yield field.source_attrs, field
+        elif isinstance(field, serializers.ManyRelatedField):
+            yield field.source_attrs, None
+
+
+def _resolve_path(model, attrs):
+    """Follow ``attrs`` through model relations.
+
+    Returns ``(path, related_model, many)`` where ``many`` is True when any hop
+    is multi-valued, or ``None`` if the source is not a model relation.
+    """
+    path = []
+    many = False
+    for attr in attrs:
+        try:
+            model_field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.is_relation:
+            return None
+        many = many or model_field.one_to_many or model_field.many_to_many
+        path.append(attr)
+        model = model_field.related_model
+    return '__'.join(path), model, many
+
+
+def _merge_columns(target, source):
+    if target is None or source is None:
+        return None
+    return target | source
+
+
+def _add(target, path, plan):
+    related_model, child_select, child_prefetch, columns = plan
+    existing = target.get(path)
+    if existing is None:
+        target[path] = plan
+        return
+    _merge(existing[1], child_select)
+    _merge(existing[2], child_prefetch)
+    target[path] = existing[:3] + (_merge_columns(existing[3], columns),)
+
+
+def _merge(target, source):
+    for path, plan in source.items():
+        _add(target, path, plan)
+
+
+def _column(model, attr):
+    """Name of the column ``attr`` reads on ``model``, ``''`` if none, ``None`` if not a model field."""
+    try:
+        model_field = model._meta.get_field(attr)
+    except FieldDoesNotExist:
+        return None
+    if model_field.concrete and not model_field.many_to_many:
+        return model_field.name
+    return ''
+
+
+def _collect(serializer, model):
+    select = {}
+    prefetch = {}
+    # Columns read at this level; None when a field reads something that is not a model field.
+    columns = {model._meta.pk.name}
+    for field in serializer.fields.values():
+        if getattr(field, 'write_only', False):
+            continue
+        column = None if field.source == '*' else _column(model, field.source_attrs[0])
+        if column is None:
+            columns = None
+        elif columns is not None:
+            if column:
+                columns.add(column)
+            # Fields that read further columns of the row list them in plan_columns.
+            columns.update(getattr(field, 'plan_columns', ()))
+
+    for attrs, child in _relation_fields(serializer):
+        resolved = _resolve_path(model, attrs)
+        if resolved is None:
+            continue
+        path, related_model, many = resolved
+        if child is not None:
+            child_select, child_prefetch, child_columns = _collect(child, related_model)
+        else:
+            child_select, child_prefetch, child_columns = {}, {}, {related_model._meta.pk.name}
+        if len(attrs) > 1:
+            child_columns = None
+        elif child_columns is not None and model._meta.get_field(attrs[0]).one_to_many:
+            child_columns.add(model._meta.get_field(attrs[0]).field.name)
+        _add(prefetch if many else select, path, (related_model, child_select, child_prefetch, child_columns))
+    return select, prefetch, columns
+
+
+def _only(columns, select, prefix=''):
+    # A relation without known columns is loaded in full, and so is everything below it.
+    only = [prefix + column for column in sorted(columns)]
+    for path, (related_model, child_select, child_prefetch, child_columns) in select.items():
+        if child_columns is not None:
+            only.extend(_only(child_columns, child_select, prefix + path + '__'))
+    return only
+
+
+def _flatten(select, prefetch, prefix='', trim=False):
+    select_related = []
+    prefetch_related = []
+    for path, (related_model, child_select, child_prefetch, child_columns) in select.items():
+        full_path = prefix + path
+        select_related.append(full_path)
+        nested_select, nested_prefetch = _flatten(child_select, child_prefetch, full_path + '__', trim)
+        select_related.extend(nested_select)
+        prefetch_related.extend(nested_prefetch)
+    for path, (related_model, child_select, child_prefetch, child_columns) in prefetch.items():
+        nested_select, nested_prefetch = _flatten(child_select, child_prefetch, trim=trim)
+        queryset = related_model._default_manager.all()
+        if nested_select:
+            queryset = queryset.select_related(*nested_select)
+        if nested_prefetch:
+            queryset = queryset.prefetch_related(*nested_prefetch)
+        if trim and child_columns is not None:
+            queryset = queryset.only(*_only(child_columns, child_select))
+        prefetch_related.append(Prefetch(prefix + path, queryset=queryset))
+    return select_related, prefetch_related
+
+
+@lru_cache(maxsize=1024)
+def _plan_tree(serializer_class, selection=None):
+    serializer = serializer_class() if selection is None else serializer_class(selection=selection)
+    return _collect(serializer, serializer_class.Meta.model)
+
+
+def build_query_plan(serializer_class, selection=None):
+    """Return the ``(select_related, prefetch_related, only)`` plan for a serializer class.
+
+    ``only`` is empty unless a field ``selection`` is given, since a full
+    representation reads every column anyway.
+    """
+    select, prefetch, columns = _plan_tree(serializer_class, selection)
+    trim = selection is not None
+    # Prefetch objects carry querysets, so they are rebuilt per call rather than cached.
+    select_related, prefetch_related = _flatten(select, prefetch, trim=trim)
+    # Paths covered by a longer select_related path are redundant.
+    select_related = [
+        path for path in select_related
+        if not any(other.startswith(path + '__') for other in select_related)
+    ]
+    only = _only(columns, select) if trim and columns is not None else []
+    return tuple(select_related), tuple(prefetch_related), tuple(only)
+
+
+def apply_query_plan(queryset, serializer_class, selection=None, extra_columns=()):
+    select_related, prefetch_related, only = build_query_plan(serializer_class, selection)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    if only:
+        queryset = queryset.only(*only, *extra_columns)
+    return queryset
+
+
+class QueryPlanMixin:
+    """Viewset mixin that applies the serializer's query plan to ``get_queryset``.
+
+    When the request carries a ``?fields=``/``?expand=`` selection the plan
+    follows it, and only the columns the selected fields read are loaded.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        selection = None
+        if issubclass(serializer_class, FieldSelectionMixin):
+            selection = selection_from_request(getattr(self, 'request', None))
+        # Cursor pagination reads the ordering columns of the last row.
+        ordering = [field.lstrip('-') for field in getattr(self, 'cursor_ordering', None) or ()]
+        return apply_query_plan(queryset, serializer_class, selection, ordering)
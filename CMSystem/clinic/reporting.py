@@ -0,0 +1,117 @@
+import datetime
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+from .jobs import job
+from .models import (
+    ROLLUP_METRICS, Appointment, Bill, Consultation, DailyDiagnosisRollup, DailyRollup, Department, Doctor,
+    Specialization, expand_doctor_rollups,
+)
+
+
+# Dashboard reports
+# Summaries read the daily rollup tables kept by model saves (see
+# "Daily rollups" in models.py): a month of one dimension is at most one row
+# per key and day, whatever the volume of appointments behind it.
+# rebuild_rollups recomputes a date range from the source tables, for the
+# initial backfill and to repair drift from writes that bypass model saves.
+
+BATCH_SIZE = 1000
+
+
+def _in_range(queryset, field, date_from, date_to):
+    if date_from is not None:
+        queryset = queryset.filter(**{f'{field}__gte': date_from})
+    if date_to is not None:
+        queryset = queryset.filter(**{f'{field}__lte': date_to})
+    return queryset
+
+
+def rebuild_rollups(date_from=None, date_to=None):
+    """Replace the rollups between ``date_from`` and ``date_to`` (open ends allowed)."""
+    doctors = defaultdict(Counter)
+    appointments = _in_range(Appointment.objects.filter(is_active=True), 'appointment_date', date_from, date_to)
+    for row in appointments.order_by().values('appointment_date', 'doctor_id').annotate(total=Count('id')):
+        doctors[row['appointment_date'], row['doctor_id']]['appointments'] += row['total']
+
+    consultations = _in_range(
+        Consultation.objects.filter(is_active=True).annotate(day=TruncDate('created_at')), 'day', date_from, date_to
+    ).order_by()
+    for row in consultations.values('day', 'token__appointment__doctor_id').annotate(total=Count('id')):
+        doctors[row['day'], row['token__appointment__doctor_id']]['consultations'] += row['total']
+    diagnoses = {
+        (row['day'], row['diagnosis']): row['total']
+        for row in consultations.values('day', 'diagnosis').annotate(total=Count('id'))
+    }
+
+    bills = _in_range(Bill.objects.annotate(day=TruncDate('created_at')), 'day', date_from, date_to).order_by()
+    for row in bills.values('day', 'appointment__doctor_id').annotate(
+        total=Count('id'), billed=Sum('total_amount'), unpaid=Sum('total_amount', filter=Q(payment_status=False)),
+    ):
+        changes = doctors[row['day'], row['appointment__doctor_id']]
+        changes['bills'] += row['total']
+        changes['billed_amount'] += row['billed']
+        changes['unpaid_amount'] += row['unpaid'] or 0
+
+    rollups = [
+        DailyRollup(dimension=dimension, key=key, date=day, **changes)
+        for (dimension, key, day), changes in expand_doctor_rollups(doctors).items()
+    ]
+    diagnosis_rollups = [
+        DailyDiagnosisRollup(date=day, diagnosis=diagnosis, consultations=total)
+        for (day, diagnosis), total in diagnoses.items()
+    ]
+    with transaction.atomic():
+        _in_range(DailyRollup.objects.all(), 'date', date_from, date_to).delete()
+        _in_range(DailyDiagnosisRollup.objects.all(), 'date', date_from, date_to).delete()
+        DailyRollup.objects.bulk_create(rollups, batch_size=BATCH_SIZE)
+        DailyDiagnosisRollup.objects.bulk_create(diagnosis_rollups, batch_size=BATCH_SIZE)
+    return {'rollups': len(rollups), 'diagnosis_rollups': len(diagnosis_rollups)}
+
+
+@job('rebuild_rollups')
+def rebuild_rollups_job(date_from=None, date_to=None):
+    rebuild_rollups(*(datetime.date.fromisoformat(value) if value else None for value in (date_from, date_to)))
+
+
+def _names(dimension, keys):
+    if dimension == DailyRollup.DOCTOR:
+        return {
+            pk: f"Dr. {first_name} {last_name}"
+            for pk, first_name, last_name in Doctor.objects.filter(pk__in=keys)
+            .values_list('pk', 'staff__first_name', 'staff__last_name')
+        }
+    if dimension == DailyRollup.DEPARTMENT:
+        return dict(Department.objects.filter(pk__in=keys).values_list('pk', 'department_name'))
+    return dict(Specialization.objects.filter(pk__in=keys).values_list('pk', 'specialization_name'))
+
+
+def rollup_summary(dimension, date_from, date_to):
+    """Totals per doctor, department or specialization over the range."""
+    rows = list(
+        DailyRollup.objects.filter(dimension=dimension, date__range=(date_from, date_to))
+        .values('key').annotate(**{metric: Sum(metric) for metric in ROLLUP_METRICS}).order_by('key')
+    )
+    names = _names(dimension, [row['key'] for row in rows])
+    for row in rows:
+        row['name'] = names.get(row['key'])
+    return rows
+
+
+def rollup_daily(dimension, date_from, date_to, key=None):
+    """Totals per day over the range, for one key or the whole dimension."""
+    rollups = DailyRollup.objects.filter(dimension=dimension, date__range=(date_from, date_to))
+    if key is not None:
+        rollups = rollups.filter(key=key)
+    return list(rollups.values('date').annotate(**{metric: Sum(metric) for metric in ROLLUP_METRICS}).order_by('date'))
+
+
+def diagnosis_summary(date_from, date_to):
+    """Active consultations per diagnosis over the range, most frequent first."""
+    return list(
+        DailyDiagnosisRollup.objects.filter(date__range=(date_from, date_to))
+        .values('diagnosis').annotate(consultations=Sum('consultations')).order_by('-consultations', 'diagnosis')
+    )
@@ -0,0 +1,115 @@
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+
+# Read replicas
+# Opt-in: list the replica aliases in CLINIC_READ_REPLICAS, add
+# "clinic.routing.ReplicaRouter" to DATABASE_ROUTERS and
+# "clinic.routing.PrimaryPinningMiddleware" to MIDDLEWARE. Views that mix in
+# ReplicaReadMixin answer GET/HEAD/OPTIONS from a randomly chosen replica;
+# every other request, and code running outside a request, uses the primary
+# ("default"). Once a request writes, its remaining reads go to the primary,
+# and the middleware sets a cookie that keeps the client's requests on the
+# primary for CLINIC_PRIMARY_PIN_SECONDS, so it reads its own writes despite
+# replication lag. To try it locally, add a second alias pointing at a copy
+# of the SQLite file or at a PostgreSQL standby.
+
+PIN_COOKIE = 'clinic_primary_until'
+
+_routing = ContextVar('clinic_db_routing', default=None)
+
+
+def replica_aliases():
+    return list(getattr(settings, 'CLINIC_READ_REPLICAS', []))
+
+
+class RoutingState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.replica = None
+        self.wrote = False
+
+    def read_alias(self):
+        if self.replica and not self.wrote:
+            return self.replica
+        return DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            return state.read_alias()
+        # Outside a request, e.g. while a streamed export is consumed, follow
+        # the rows already read from a replica.
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in replica_aliases():
+            return instance._state.db
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+def _pinned(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class PrimaryPinningMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RoutingState(pinned=_pinned(request))
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if state.wrote:
+            seconds = getattr(settings, 'CLINIC_PRIMARY_PIN_SECONDS', 5)
+            response.set_cookie(
+                PIN_COOKIE, f"{time.time() + seconds:.3f}", max_age=seconds, httponly=True, samesite='Lax'
+            )
+        return response
+
+
+class ReplicaReadMixin:
+    """Serve safe-method requests of an APIView or viewset from a read replica."""
+
+    def initial(self, request, *args, **kwargs):
+        state = _routing.get()
+        replicas = replica_aliases()
+        if state is not None and replicas and request.method in SAFE_METHODS and not state.pinned:
+            state.replica = random.choice(replicas)
+        super().initial(request, *args, **kwargs)
+
+    def bind_read_alias(self, queryset):
+        state = _routing.get()
+        if state is not None and state.replica:
+            # Bound now: streamed responses are consumed after the view returns.
+            queryset = queryset.using(state.read_alias())
+        return queryset
+
+    def get_queryset(self):
+        return self.bind_read_alias(super().get_queryset())
+
+    def get_export_queryset(self):
+        return self.bind_read_alias(super().get_export_queryset())
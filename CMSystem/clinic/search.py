@@ -0,0 +1,111 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, Func, Value
+
+from .models import Patient
+
+
+# Patient search
+# Mobile numbers are matched by prefix with a range scan on patient_mobile_idx.
+# Names are matched through a backend-specific index that lives outside the
+# model definitions, so it is (re)created from the post_migrate signal:
+#   - PostgreSQL: a pg_trgm GIN index, queried with the "%" similarity operator
+#   - SQLite: an FTS5 shadow table kept in sync by triggers, queried by token prefix
+# Other backends fall back to icontains.
+
+FTS_TABLE = 'clinic_patient_fts'
+TRIGRAM_INDEX = 'patient_name_trgm_idx'
+
+
+def install_patient_search_index(using='default'):
+    connection = connections[using]
+    table = Patient._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} ON {table} USING gin (full_name gin_trgm_ops)"
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                f"USING fts5(full_name, content='{table}', content_rowid='id')"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {FTS_TABLE}(rowid, full_name) VALUES (new.id, new.full_name); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, full_name) VALUES ('delete', old.id, old.full_name); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF full_name ON {table} BEGIN "
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, full_name) VALUES ('delete', old.id, old.full_name); "
+                f"INSERT INTO {FTS_TABLE}(rowid, full_name) VALUES (new.id, new.full_name); END"
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+class TrigramMatch(Func):
+    """``lhs % rhs`` — true when pg_trgm similarity is above the configured threshold."""
+    arg_joiner = ' %% '
+    template = '(%(expressions)s)'
+    output_field = BooleanField()
+
+
+def _mobile_prefix_range(prefix):
+    # Upper bound of the prefix range: "98" -> "99", "199" -> "2", "99" -> open-ended.
+    stripped = prefix.rstrip('9')
+    if not stripped:
+        return prefix, None
+    return prefix, stripped[:-1] + str(int(stripped[-1]) + 1)
+
+
+def search_by_mobile(queryset, prefix):
+    lower, upper = _mobile_prefix_range(prefix)
+    queryset = queryset.filter(mobile_number__gte=lower)
+    if upper is not None:
+        queryset = queryset.filter(mobile_number__lt=upper)
+    return queryset.order_by('mobile_number')
+
+
+def search_by_name(queryset, term, limit):
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        return (
+            queryset.filter(TrigramMatch('full_name', Value(term)))
+            .annotate(similarity=TrigramSimilarity('full_name', term))
+            .order_by('-similarity', 'id')[:limit]
+        )
+    if connection.vendor == 'sqlite':
+        tokens = re.findall(r'\w+', term)
+        if not tokens:
+            return queryset.none()
+        expression = ' '.join(f'"{token}"*' for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY rank LIMIT %s",
+                [expression, limit],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        patients = {patient.pk: patient for patient in queryset.filter(pk__in=ids)}
+        return [patients[pk] for pk in ids if pk in patients]
+    return queryset.filter(full_name__icontains=term).order_by('full_name', 'id')[:limit]
+
+
+def mobile_prefix(term):
+    """Return ``term`` as a digits-only mobile prefix, or ``None`` if it is a name."""
+    digits = re.sub(r'[\s+-]', '', term)
+    return digits if digits.isdigit() else None
+
+
+def search_patients(queryset, term, limit=20):
+    term = term.strip()
+    digits = mobile_prefix(term)
+    if digits is not None:
+        return search_by_mobile(queryset, digits)[:limit]
+    return search_by_name(queryset, term, limit)
@@ -0,0 +1,198 @@
+import random
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    Appointment, Bill, Consultation, Department, Doctor, Gender, MedicalRecord, Medicine, MedicineType,
+    Patient, Prescription, Salary, Schedule, Specialization, TimeSlot, Token
+)
+
+
+# Clinic data generator
+# Seeds a self-consistent clinic (staff, doctors, patients, schedules,
+# appointments, tokens, consultations, prescriptions, medical records and
+# bills) at a configurable scale using bulk inserts. Every root row carries
+# the generator's tag so cleanup() can remove the whole dataset through
+# cascades without touching real data.
+
+FIRST_NAMES = ['Anil', 'Asha', 'Bindu', 'Deepa', 'George', 'Jane', 'John', 'Joseph', 'Lakshmi', 'Mary',
+               'Nisha', 'Priya', 'Rahul', 'Rajesh', 'Sanjay', 'Sneha', 'Thomas', 'Vijay', 'Zara', 'Omar']
+LAST_NAMES = ['Abraham', 'Doe', 'George', 'Iyer', 'Jacob', 'Kumar', 'Menon', 'Nair', 'Pillai', 'Rao',
+              'Reddy', 'Sharma', 'Smith', 'Thomas', 'Varghese', 'Verma', 'Watson', 'Williams', 'Yadav', 'Khan']
+DIAGNOSES = ['Flu', 'Migraine', 'Hypertension', 'Diabetes', 'Gastritis', 'Sprain', 'Allergy', 'Asthma']
+
+
+class ClinicDataGenerator:
+    base_counts = {
+        'departments': 5,
+        'specializations': 8,
+        'doctors': 20,
+        'other_staff': 10,
+        'patients': 1000,
+        'days': 30,
+        'appointments': 3000,
+        'medicines': 50,
+    }
+
+    def __init__(self, scale=1, seed=1, tag='bench', batch_size=5000, **counts):
+        self.counts = {key: max(1, int(value * scale)) for key, value in self.base_counts.items()}
+        self.counts['days'] = self.base_counts['days']
+        self.counts.update({key: value for key, value in counts.items() if value is not None})
+        self.random = random.Random(seed)
+        self.tag = tag
+        self.batch_size = batch_size
+        self.start = date(2024, 1, 1)
+
+    def name(self):
+        return f"{self.random.choice(FIRST_NAMES)} {self.random.choice(LAST_NAMES)}"
+
+    def generate(self):
+        rnd = self.random
+        counts = self.counts
+        batch = self.batch_size
+        User = get_user_model()
+
+        with transaction.atomic():
+            genders = [Gender.objects.create(name=f"{self.tag}-{suffix}"[:10]) for suffix in ('f', 'm')]
+            departments = Department.objects.bulk_create([
+                Department(department_name=f"{self.tag} dept {n}", base_salary=Decimal(20000 + 5000 * n))
+                for n in range(counts['departments'])
+            ])
+            specializations = Specialization.objects.bulk_create([
+                Specialization(specialization_name=f"{self.tag} spec {n}") for n in range(counts['specializations'])
+            ])
+            slots = TimeSlot.objects.bulk_create([
+                TimeSlot(type=f"{self.tag}-am", start_time=time(9, 0), end_time=time(13, 0)),
+                TimeSlot(type=f"{self.tag}-pm", start_time=time(16, 0), end_time=time(20, 0)),
+            ])
+            medicine_type = MedicineType.objects.create(type_name=f"{self.tag}-tab"[:15])
+            medicines = Medicine.objects.bulk_create([
+                Medicine(name=f"Medicine {n}", dose=f"{rnd.choice([5, 10, 250, 500])}mg", type=medicine_type)
+                for n in range(counts['medicines'])
+            ])
+
+            staff_total = counts['doctors'] + counts['other_staff']
+            staff = User.objects.bulk_create([
+                User(
+                    username=f"{self.tag}-staff-{n}", first_name=rnd.choice(FIRST_NAMES),
+                    last_name=rnd.choice(LAST_NAMES), email=f"{self.tag}{n}@example.com",
+                    gender=rnd.choice(genders), department=rnd.choice(departments),
+                    mobile_number=f"{self.tag[:1]}{n:09d}"[-15:], qualification='MBBS',
+                    joining_date=timezone.now(),
+                )
+                for n in range(staff_total)
+            ], batch_size=batch)
+            doctors = Doctor.objects.bulk_create([
+                Doctor(staff=member, specialization=rnd.choice(specializations),
+                       consultation_fee=Decimal(rnd.choice([200, 300, 500])), year_of_experience=rnd.randrange(1, 30))
+                for member in staff[:counts['doctors']]
+            ])
+            Salary.objects.bulk_create([
+                Salary(staff=member, base_salary=member.department.base_salary, total_salary=member.department.base_salary,
+                       salary_payment_date=self.start)
+                for member in staff
+            ], batch_size=batch)
+
+            patients = Patient.objects.bulk_create([
+                Patient(full_name=self.name(), dob=date(1950, 1, 1) + timedelta(days=rnd.randrange(25000)),
+                        gender=rnd.choice(genders), mobile_number=f"9{rnd.randrange(10 ** 9):09d}", address='Kochi')
+                for _ in range(counts['patients'])
+            ], batch_size=batch)
+
+            # Enough tokens per schedule for every appointment to find a place.
+            capacity = max(30, -(-counts['appointments'] // (len(doctors) * counts['days'])))
+            schedules = Schedule.objects.bulk_create([
+                Schedule(doctor=doctor, schedule_date=self.start + timedelta(days=day), token=capacity)
+                for doctor in doctors for day in range(counts['days'])
+            ], batch_size=batch)
+            through = Schedule.time_slot.through
+            through.objects.bulk_create([
+                through(schedule_id=schedule.pk, timeslot_id=rnd.choice(slots).pk) for schedule in schedules
+            ], batch_size=batch)
+
+            appointments = Appointment.objects.bulk_create([
+                self.appointment(rnd.choice(patients), schedule)
+                for schedule in self.booked_schedules(schedules, counts['appointments'])
+            ], batch_size=batch)
+            tokens = Token.objects.bulk_create([
+                Token(appointment=appointment, token_number=n % 30 + 1, status=rnd.random() > 0.3)
+                for n, appointment in enumerate(appointments)
+            ], batch_size=batch)
+            Bill.objects.bulk_create([
+                Bill(appointment=appointment, total_amount=Decimal(rnd.choice([200, 300, 500, 1200])),
+                     payment_status=rnd.random() > 0.2)
+                for appointment in appointments
+            ], batch_size=batch)
+
+            seen = [token for token in tokens if rnd.random() < 0.8]
+            prescriptions = Prescription.objects.bulk_create([
+                Prescription(dosage='1 tablet', frequency='twice daily', duration='5 days',
+                             patient_id=token.appointment.patient_id)
+                for token in seen
+            ], batch_size=batch)
+            prescribed = Prescription.medicines.through
+            prescribed.objects.bulk_create([
+                prescribed(prescription_id=prescription.pk, medicine_id=medicine.pk)
+                for prescription in prescriptions for medicine in rnd.sample(medicines, min(2, len(medicines)))
+            ], batch_size=batch)
+            consultations = Consultation.objects.bulk_create([
+                Consultation(
+                    token=token, patient_id=token.appointment.patient_id, prescription=prescription,
+                    symptoms='Fever and cough', diagnosis=rnd.choice(DIAGNOSES), notes='Review in a week',
+                    additional_notes='', created_at=timezone.make_aware(
+                        datetime.combine(token.appointment.appointment_date, time(10, 0))
+                    ),
+                )
+                for token, prescription in zip(seen, prescriptions)
+            ], batch_size=batch)
+            records = MedicalRecord.objects.bulk_create([
+                MedicalRecord(patient_id=consultation.patient_id, consultation=consultation,
+                              record_date=consultation.created_at.date())
+                for consultation in consultations
+            ], batch_size=batch)
+            doctors_through = MedicalRecord.doctors.through
+            doctors_through.objects.bulk_create([
+                doctors_through(medicalrecord_id=record.pk, doctor_id=consultation.token.appointment.doctor_id)
+                for record, consultation in zip(records, consultations)
+            ], batch_size=batch)
+
+        return {
+            'staff': len(staff), 'doctors': len(doctors), 'patients': len(patients),
+            'schedules': len(schedules), 'appointments': len(appointments), 'tokens': len(tokens),
+            'consultations': len(consultations), 'medical_records': len(records), 'bills': len(appointments),
+        }
+
+    def booked_schedules(self, schedules, count):
+        """``count`` randomly picked schedules, none picked more often than it has tokens."""
+        left = {schedule.pk: schedule.token for schedule in schedules}
+        open_schedules = list(schedules)
+        picked = []
+        for _ in range(count):
+            position = self.random.randrange(len(open_schedules))
+            schedule = open_schedules[position]
+            picked.append(schedule)
+            left[schedule.pk] -= 1
+            if not left[schedule.pk]:
+                open_schedules[position] = open_schedules[-1]
+                open_schedules.pop()
+        return picked
+
+    def appointment(self, patient, schedule):
+        return Appointment(
+            patient=patient, doctor_id=schedule.doctor_id, schedule=schedule,
+            appointment_date=schedule.schedule_date, is_pre_booked=self.random.random() > 0.5,
+        )
+
+    def cleanup(self):
+        # Staff, patients (via gender) and reference rows cascade to everything seeded.
+        with transaction.atomic():
+            get_user_model().all_objects.filter(username__startswith=f"{self.tag}-").delete()
+            Gender.objects.filter(name__startswith=f"{self.tag}-").delete()
+            Department.objects.filter(department_name__startswith=f"{self.tag} ").delete()
+            Specialization.objects.filter(specialization_name__startswith=f"{self.tag} ").delete()
+            TimeSlot.objects.filter(type__startswith=f"{self.tag}-").delete()
+            MedicineType.objects.filter(type_name__startswith=f"{self.tag}-").delete()
@@ -1,14 +1,20 @@
+import secrets
+import string
+
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
 from django.contrib.auth import authenticate
-from django.contrib.auth.models import update_last_login, Group
+from django.contrib.auth.models import Group
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.tokens import RefreshToken
 from .models import (
     Department, Gender, Medicine, MedicineType, Receptionist, Staff, Prescription,
     Salary, Patient, Appointment, Specialization, Doctor,
-    Schedule, TimeSlot, Token, Consultation, MedicalRecord, Bill
+    Schedule, TimeSlot, Token, Consultation, MedicalRecord, Bill, DailyRollup
 )
 from .validators import validate_mobile_number
+from .field_selection import FieldSelectionMixin
+from .authentication import last_login_buffer
 
 
 # Login Serializer
@@ -30,7 +36,7 @@ class LoginSerializer(serializers.Serializer):
     def save(self):
         user = self.validated_data
         refresh = RefreshToken.for_user(user)
-        update_last_login(None, user)
+        last_login_buffer.record(user)
         return {
             "refresh": str(refresh),
             "access": str(refresh.access_token),
@@ -64,7 +70,7 @@ class SignupSerializer(serializers.ModelSerializer):
         }
 
     def validate_email(self, value):
-        if Staff.objects.filter(email=value).exists():
+        if Staff.all_objects.filter(email=value).exists():
             raise serializers.ValidationError("User with this email already exists.")
         return value
 
@@ -86,7 +92,7 @@ class SignupSerializer(serializers.ModelSerializer):
 
     def generate_password(self):
         characters = string.ascii_letters + string.digits + string.punctuation
-        return ''.join(random.choices(characters, k=8))
+        return ''.join(secrets.choice(characters) for _ in range(8))
 
     def create(self, validated_data):
         group = validated_data.pop('group')
@@ -96,7 +102,8 @@ class SignupSerializer(serializers.ModelSerializer):
         username = self.generate_username(email, mobile_number)
         password = self.generate_password()
 
-        staff = Staff.objects.create(username=username, **validated_data)
+        # One INSERT with the hashed password; the photo's variants are rendered by a queued job (see photos.py).
+        staff = Staff(username=username, **validated_data)
         staff.set_password(password)
         staff.save()
 
@@ -115,43 +122,137 @@ class SignupSerializer(serializers.ModelSerializer):
 
 
 
+# Bulk serializers
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key field that resolves against ``context['related_cache']`` when present.
+
+    Bulk endpoints preload every referenced id with one query per model, so
+    validating a batch does not query once per item.
+    """
+
+    def to_internal_value(self, data):
+        cache = self.context.get('related_cache', {}).get(self.queryset.model)
+        if cache is None:
+            return super().to_internal_value(data)
+        try:
+            pk = self.queryset.model._meta.pk.to_python(data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in cache:
+            self.fail('does_not_exist', pk_value=data)
+        return cache[pk]
+
+
+class PatientBulkSerializer(serializers.ModelSerializer):
+    gender = BulkPrimaryKeyRelatedField(queryset=Gender.objects.all())
+
+    class Meta:
+        model = Patient
+        fields = ['id', 'full_name', 'dob', 'gender', 'mobile_number', 'address']
+
+
+class AppointmentBulkSerializer(serializers.ModelSerializer):
+    patient = BulkPrimaryKeyRelatedField(queryset=Patient.objects.all())
+    doctor = BulkPrimaryKeyRelatedField(queryset=Doctor.objects.all())
+    schedule = BulkPrimaryKeyRelatedField(queryset=Schedule.objects.all(), required=False, allow_null=True)
+    time_slot = BulkPrimaryKeyRelatedField(queryset=TimeSlot.objects.all(), required=False, allow_null=True)
+
+    class Meta:
+        model = Appointment
+        fields = [
+            'id', 'patient', 'doctor', 'schedule', 'time_slot', 'appointment_date', 'start_time', 'end_time',
+            'is_pre_booked', 'is_active',
+        ]
+
+    def validate(self, data):
+        # A slot supplies the interval unless explicit times are given.
+        if data.get('time_slot') and 'start_time' not in data and 'end_time' not in data:
+            data['start_time'], data['end_time'] = data['time_slot'].start_time, data['time_slot'].end_time
+        start = data.get('start_time', getattr(self.instance, 'start_time', None))
+        end = data.get('end_time', getattr(self.instance, 'end_time', None))
+        if (start is None) != (end is None):
+            raise serializers.ValidationError("start_time and end_time must be given together.")
+        if start is not None and start >= end:
+            raise serializers.ValidationError("start_time must be before end_time.")
+        return data
+
+
+class ScheduleBulkSerializer(serializers.ModelSerializer):
+    doctor = BulkPrimaryKeyRelatedField(queryset=Doctor.objects.all())
+    time_slot = BulkPrimaryKeyRelatedField(queryset=TimeSlot.objects.all(), many=True)
+
+    class Meta:
+        model = Schedule
+        fields = ['id', 'doctor', 'schedule_date', 'time_slot', 'token', 'status']
+
+
 # Other serializers (unchanged except for imports)
-class GenderSerializer(serializers.ModelSerializer):
+class GenderSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     class Meta:
         model = Gender
         fields = ['id', 'name']
 
 
-class DepartmentSerializer(serializers.ModelSerializer):
+class DepartmentSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     class Meta:
         model = Department
         fields = ['id', 'department_name', 'base_salary']
 
 
-class StaffSerializer(serializers.ModelSerializer):
+class StaffPhotoField(serializers.ImageField):
+    """Accepts the original upload; renders the thumbnail unless ``?photo=web`` or ``?photo=original``.
+
+    Falls back to the original while the variants are being generated.
+    """
+    VARIANTS = {'thumbnail': 'photo_thumbnail', 'web': 'photo_web', 'original': None}
+    plan_columns = ('photo_thumbnail', 'photo_web')
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        variant = request.query_params.get('photo') if request is not None and hasattr(request, 'query_params') else None
+        attname = self.VARIANTS.get(variant, 'photo_thumbnail')
+        if value and attname:
+            value = getattr(value.instance, attname) or value
+        return super().to_representation(value)
+
+
+class StaffSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     gender = GenderSerializer(read_only=True)
     department = DepartmentSerializer(read_only=True)
+    photo = StaffPhotoField(required=False, allow_null=True)
 
     class Meta:
         model = Staff
         fields = ['id', 'username', 'first_name', 'last_name', 'email', 'gender', 'qualification', 'photo', 'department']
 
 
-class SalarySerializer(serializers.ModelSerializer):
+class SalarySerializer(FieldSelectionMixin, serializers.ModelSerializer):
     staff = StaffSerializer(read_only=True)
 
     class Meta:
         model = Salary
-        fields = ['id', 'staff', 'base_salary', 'increment', 'deduction', 'net_salary', 'payment_status']
+        fields = ['id', 'staff', 'base_salary', 'increment', 'deductions', 'total_salary', 'payment_status', 'period']
+
+
+class PayrollAdjustmentSerializer(serializers.Serializer):
+    staff = serializers.PrimaryKeyRelatedField(queryset=Staff.objects.all())
+    increment = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    deductions = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+
+
+class PayrollRunSerializer(serializers.Serializer):
+    period = serializers.DateField(input_formats=['%Y-%m', '%Y-%m-%d'])
+    payment_date = serializers.DateField(required=False)
+    adjustments = PayrollAdjustmentSerializer(many=True, required=False)
 
 
-class SpecializationSerializer(serializers.ModelSerializer):
+class SpecializationSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     class Meta:
         model = Specialization
         fields = ['id', 'specialization_name']
 
 
-class DoctorSerializer(serializers.ModelSerializer):
+class DoctorSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     # For GET: Include full details of related fields
     staff_details = StaffSerializer(source='staff', read_only=True)
     specialization_details = SpecializationSerializer(source='specialization', read_only=True)
@@ -169,13 +270,13 @@ class DoctorSerializer(serializers.ModelSerializer):
 
 
 
-class MedicineTypeSerializer(serializers.ModelSerializer):
+class MedicineTypeSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     class Meta:
         model = MedicineType
         fields = ['id', 'type_name']
 
 
-class MedicineSerializer(serializers.ModelSerializer):
+class MedicineSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     type = MedicineTypeSerializer(read_only=True)
 
     class Meta:
@@ -183,7 +284,7 @@ class MedicineSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'dose', 'type']
 
 
-class PatientSerializer(serializers.ModelSerializer):
+class PatientSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     gender = GenderSerializer(read_only=True)
 
     class Meta:
@@ -191,39 +292,86 @@ class PatientSerializer(serializers.ModelSerializer):
         fields = ['id', 'full_name', 'dob', 'gender', 'mobile_number', 'address']
 
 
-class TimeSlotSerializer(serializers.ModelSerializer):
+class TimeSlotSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     class Meta:
         model = TimeSlot
         fields = ['id', 'type', 'start_time', 'end_time']
 
 
-class ScheduleSerializer(serializers.ModelSerializer):
+class ScheduleSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     doctor = DoctorSerializer(read_only=True)
     time_slot = TimeSlotSerializer(read_only=True, many=True)
 
     class Meta:
         model = Schedule
-        fields = ['id', 'doctor', 'schedule_date', 'time_slot', 'token', 'status']
+        fields = ['id', 'doctor', 'schedule_date', 'time_slot', 'token', 'remaining_tokens', 'status']
+
 
+class AvailabilityQuerySerializer(serializers.Serializer):
+    specialization = serializers.PrimaryKeyRelatedField(queryset=Specialization.objects.all(), required=False)
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
 
-class AppointmentSerializer(serializers.ModelSerializer):
+    def validate(self, data):
+        if data['date_from'] > data['date_to']:
+            raise serializers.ValidationError("date_from must be on or before date_to.")
+        return data
+
+
+class AppointmentSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     patient = PatientSerializer(read_only=True)
     schedule = ScheduleSerializer(read_only=True)
 
     class Meta:
         model = Appointment
-        fields = ['id', 'patient', 'schedule', 'appointment_date']
+        fields = ['id', 'patient', 'schedule', 'time_slot', 'appointment_date', 'start_time', 'end_time']
 
 
-class TokenSerializer(serializers.ModelSerializer):
+class TokenSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     appointment = AppointmentSerializer(read_only=True)
 
     class Meta:
         model = Token
-        fields = ['id', 'appointment', 'token_number', 'issued_at', 'status']
+        fields = ['id', 'appointment', 'token_number', 'issued_at', 'called_at', 'status']
+        read_only_fields = ['called_at']
+
+
+class PatientSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(min_length=2, max_length=100)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
+class TimelineQuerySerializer(serializers.Serializer):
+    before = serializers.DateField(required=False)
+    days = serializers.IntegerField(min_value=1, max_value=365, default=30)
+
+
+class HistoryWindowQuerySerializer(serializers.Serializer):
+    since = serializers.DateField(required=False)
+
+
+class DoctorDayQuerySerializer(serializers.Serializer):
+    doctor = serializers.IntegerField(min_value=1)
+    date = serializers.DateField()
+
+
+class ReportQuerySerializer(serializers.Serializer):
+    dimension = serializers.ChoiceField(choices=DailyRollup.DIMENSIONS, default=DailyRollup.DOCTOR)
+    key = serializers.IntegerField(min_value=0, required=False)
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+
+    def validate(self, data):
+        if data['date_from'] > data['date_to']:
+            raise serializers.ValidationError("date_from must be on or before date_to.")
+        return data
+
+
+class TokenIssueSerializer(serializers.Serializer):
+    appointment = serializers.PrimaryKeyRelatedField(queryset=Appointment.objects.filter(is_active=True))
 
 
-class PrescriptionSerializer(serializers.ModelSerializer):
+class PrescriptionSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     # For GET: Include full details of related fields
     patient_details = PatientSerializer(source='patient', read_only=True)
     medicines_details = MedicineSerializer(source='medicines', many=True, read_only=True)
@@ -240,13 +388,13 @@ class PrescriptionSerializer(serializers.ModelSerializer):
         ]
 
 
-class ConsultationSerializer(serializers.ModelSerializer):
+class ConsultationSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     # For GET: Include full details of related fields
     tokens = TokenSerializer(source='token',read_only=True)
     prescriptions = PrescriptionSerializer(source='prescription',read_only=True)
     
     # For POST: Accept token and prescription IDs
-    token = serializers.PrimaryKeyRelatedField(queryset=Token.objects.all())
+    token = serializers.PrimaryKeyRelatedField(queryset=Token.all_objects.all())
     prescription = serializers.PrimaryKeyRelatedField(queryset=Prescription.objects.all())
     
     # For GET: Show full patient details
@@ -261,7 +409,7 @@ class ConsultationSerializer(serializers.ModelSerializer):
         ]
 
 
-class MedicalRecordSerializer(serializers.ModelSerializer):
+class MedicalRecordSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     # For GET: Include full details of related fields
     patient_details = PatientSerializer(source='patient', read_only=True)
     doctors_details = DoctorSerializer(source='doctors', many=True, read_only=True)
@@ -281,7 +429,7 @@ class MedicalRecordSerializer(serializers.ModelSerializer):
 
 
 
-class BillSerializer(serializers.ModelSerializer):
+class BillSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     appointment = AppointmentSerializer(read_only=True)
 
     class Meta:
@@ -289,7 +437,7 @@ class BillSerializer(serializers.ModelSerializer):
         fields = ['id', 'appointment', 'total_amount', 'payment_status', 'created_at']
 
 
-class ReceptionistSerializer(serializers.ModelSerializer):
+class ReceptionistSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     staff = StaffSerializer()
 
     class Meta:
@@ -0,0 +1,110 @@
+from django.contrib.auth.models import Group
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from .authentication import forget_all_users, forget_users
+from .caching import bump_model_version
+from .conflicts import install_appointment_exclusion_constraints
+from .models import Appointment, Department, Gender, Medicine, MedicineType, Specialization, Staff, TimeSlot, Token
+from .jobs import enqueue
+from .photos import prepare_staff_photo, render_staff_photo
+from .pooling import connection_stats
+from .search import install_patient_search_index
+from .token_events import publish_token_event, remember_deleted_appointment, token_event_type
+
+REFERENCE_MODELS = (Gender, Department, Specialization, MedicineType, TimeSlot, Medicine)
+
+
+# Reference data cache invalidation, once the write is visible to readers
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_reference_cache(sender, using=None, **kwargs):
+    if sender in REFERENCE_MODELS:
+        transaction.on_commit(lambda: bump_model_version(sender), using=using)
+
+
+# Backend-specific patient search index (see search.py) and booking constraints (see conflicts.py)
+@receiver(post_migrate)
+def install_search_index(sender, using='default', **kwargs):
+    if sender.name == 'clinic':
+        install_patient_search_index(using)
+        install_appointment_exclusion_constraints(using)
+
+
+# Rows read from an archive table (see models.py) are not written back to the live tables
+@receiver(pre_save)
+def refuse_archived_save(sender, instance, **kwargs):
+    if getattr(instance, 'archived', False):
+        raise ValueError(f"{sender.__name__} {instance.pk} is archived and read-only.")
+
+
+# Per-worker connection counters (see pooling.py)
+@receiver(request_started)
+def count_request(sender, **kwargs):
+    connection_stats.request_started()
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    connection_stats.connection_created(connection.alias)
+
+
+# Token queue deltas for the waiting-room stream (see token_events.py)
+@receiver(post_save, sender=Token)
+def publish_token_saved(sender, instance, created, **kwargs):
+    publish_token_event(instance, token_event_type(instance, created))
+
+
+@receiver(post_delete, sender=Token)
+def publish_token_deleted(sender, instance, **kwargs):
+    publish_token_event(instance, 'removed')
+
+
+@receiver(post_delete, sender=Appointment)
+def keep_deleted_appointment_channel(sender, instance, **kwargs):
+    remember_deleted_appointment(instance)
+
+
+# Cached JWT users (see authentication.py), once the change is visible to the
+# requests that would cache it again
+@receiver(post_save, sender=Staff)
+@receiver(post_delete, sender=Staff)
+def forget_cached_user(sender, instance, using=None, **kwargs):
+    user_ids = [instance.pk]
+    transaction.on_commit(lambda: forget_users(user_ids), using=using)
+
+
+@receiver(m2m_changed, sender=Staff.groups.through)
+def forget_cached_group_members(sender, instance, action, reverse, pk_set, using=None, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        user_ids = [instance.pk]
+        transaction.on_commit(lambda: forget_users(user_ids), using=using)
+    elif pk_set:
+        user_ids = list(pk_set)
+        transaction.on_commit(lambda: forget_users(user_ids), using=using)
+    else:
+        transaction.on_commit(forget_all_users, using=using)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def forget_cached_users_for_group(sender, using=None, **kwargs):
+    transaction.on_commit(forget_all_users, using=using)
+
+
+# Staff photo dedup and variants (see photos.py)
+@receiver(pre_save, sender=Staff)
+def prepare_photo(sender, instance, **kwargs):
+    instance._photo_pending = prepare_staff_photo(instance)
+
+
+@receiver(post_save, sender=Staff)
+def render_photo_variants(sender, instance, **kwargs):
+    if getattr(instance, '_photo_pending', False):
+        instance._photo_pending = False
+        enqueue(render_staff_photo.job_name, {'digest': instance.photo_hash})
@@ -1,10 +1,46 @@
-from django.test import TestCase
-from datetime import date, datetime, time
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+from PIL import Image
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, modify_settings, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from datetime import date, datetime, time, timedelta
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from .authentication import CachedJWTAuthentication, get_auth_cache, last_login_buffer
+from .caching import get_reference_cache
+from .conflicts import IntervalIndex
+from .jobs import Worker, enqueue, job
+from .pooling import connection_mode, connection_settings, connection_stats
+from .profiling import profile_store
+from .routing import PIN_COOKIE, PrimaryPinningMiddleware, ReplicaRouter, _routing
+from .seeding import ClinicDataGenerator
+from .timeline import KINDS
+from .token_events import TokenEventBroker, channel_name, token_broker
 from .models import (
     Department, Salary, Gender, Staff, Specialization, Doctor, Receptionist,
-    TimeSlot, Schedule, Patient, Appointment, Token, MedicineType, Medicine,
-    Prescription, Consultation, MedicalRecord, Bill
+    TimeSlot, Schedule, Patient, Appointment, Token, TokenCounter, MedicineType, Medicine,
+    Prescription, Consultation, MedicalRecord, Bill, DailyRollup, DailyDiagnosisRollup, Job,
+    AppointmentConflict, ScheduleFull, ArchivedAppointment, ArchivedConsultation, ArchivedToken,
 )
 
 class ModelsTestCase(TestCase):
@@ -153,6 +189,11 @@ class ModelsTestCase(TestCase):
         
     def test_token_creation(self):
         self.assertEqual(self.token.token_number, 1)
+
+    def test_token_numbers_are_unique_per_appointment(self):
+        # The database, not only TokenCounter, rules out a number issued twice.
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Token.objects.create(appointment=self.appointment, token_number=self.token.token_number)
         
     def test_appointment_association(self):
         self.assertEqual(self.appointment.patient, self.patient)
@@ -174,3 +215,1441 @@ class ModelsTestCase(TestCase):
     def test_bill_creation(self):
         self.assertEqual(self.bill.total_amount, 1000.00)
         self.assertTrue(self.bill.payment_status)
+
+
+class ClinicDataTestCase(TestCase):
+    """Builds complete patient visits (appointment through bill) for API tests."""
+
+    def setUp(self):
+        self.gender = Gender.objects.create(name="Female")
+        self.department = Department.objects.create(department_name="General", base_salary=20000)
+        self.specialization = Specialization.objects.create(specialization_name="Physician")
+        self.medicine_type = MedicineType.objects.create(type_name="Syrup")
+        self.time_slot = TimeSlot.objects.create(type="Morning", start_time=time(9, 0), end_time=time(12, 0))
+        self.user = get_user_model().objects.create_user(username="admin", password="test123")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.visits = 0
+
+    def create_visit(self):
+        self.visits += 1
+        n = self.visits
+        staff = get_user_model().objects.create_user(
+            username=f"doc{n}", password="test123", gender=self.gender,
+            mobile_number=f"90000000{n:02d}", department=self.department
+        )
+        doctor = Doctor.objects.create(
+            staff=staff, specialization=self.specialization, consultation_fee=300, year_of_experience=n
+        )
+        Salary.objects.create(staff=staff, base_salary=20000, salary_payment_date=date(2024, 1, 31))
+        schedule = Schedule.objects.create(doctor=doctor, schedule_date=date(2024, 2, 1), token=20)
+        schedule.time_slot.add(self.time_slot)
+        patient = Patient.objects.create(
+            full_name=f"Patient {n}", dob=date(1990, 1, 1), gender=self.gender,
+            mobile_number=f"80000000{n:02d}", address="Street"
+        )
+        appointment = Appointment.objects.create(
+            patient=patient, doctor=doctor, schedule=schedule, appointment_date=date(2024, 2, 1)
+        )
+        token = Token.objects.create(appointment=appointment, token_number=n)
+        medicine = Medicine.objects.create(name=f"Medicine {n}", dose="5ml", type=self.medicine_type)
+        prescription = Prescription.objects.create(
+            dosage="5ml", frequency="2", duration="3", patient=patient
+        )
+        prescription.medicines.add(medicine)
+        consultation = Consultation.objects.create(
+            token=token, patient=patient, symptoms="Cough", diagnosis="Cold", notes="",
+            additional_notes="", created_at=timezone.now(), prescription=prescription
+        )
+        record = MedicalRecord.objects.create(
+            patient=patient, record_date=date(2024, 2, 1), consultation=consultation
+        )
+        record.doctors.add(doctor)
+        Bill.objects.create(appointment=appointment, total_amount=300)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(context.captured_queries)
+
+
+class QueryPlanTestCase(ClinicDataTestCase):
+    endpoints = [
+        '/api/api/appointments/', '/api/api/doctors/', '/api/api/schedules/',
+        '/api/api/tokens/', '/api/api/consultations/', '/api/api/medical-records/',
+        '/api/api/bills/', '/api/api/prescriptions/', '/api/api/salary/',
+    ]
+
+    def test_list_query_count_independent_of_rows(self):
+        self.create_visit()
+        baseline = {url: self.count_queries(url) for url in self.endpoints}
+        for _ in range(5):
+            self.create_visit()
+        for url in self.endpoints:
+            self.assertEqual(self.count_queries(url), baseline[url], url)
+
+
+class FieldSelectionTestCase(ClinicDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_visit()
+        self.consultation = Consultation.objects.get()
+
+    def test_full_representation_by_default(self):
+        response = self.client.get(f'/api/api/consultations/{self.consultation.pk}/')
+        self.assertIn('patient_details', response.data)
+        self.assertEqual(response.data['tokens']['appointment']['patient']['full_name'], "Patient 1")
+
+    def test_fields_trim_columns_and_joins(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/api/consultations/?fields=id,token,diagnosis')
+        self.assertEqual(response.data, [{'id': self.consultation.pk, 'token': self.consultation.token_id,
+                                          'diagnosis': "Cold"}])
+        self.assertEqual(len(context.captured_queries), 1)
+        sql = context.captured_queries[0]['sql']
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('symptoms', sql)
+
+    def test_unexpanded_relations_collapse_to_primary_keys(self):
+        response = self.client.get('/api/api/tokens/?expand=appointment')
+        appointment = response.data[0]['appointment']
+        self.assertEqual(appointment['patient'], self.consultation.patient_id)
+        self.assertIsInstance(appointment['schedule'], int)
+
+    def test_dotted_fields_expand_nested_serializers(self):
+        url = '/api/api/consultations/?fields=id,tokens.token_number,prescriptions.medicines_details'
+        row = self.client.get(url).data[0]
+        self.assertEqual(set(row), {'id', 'tokens', 'prescriptions'})
+        self.assertEqual(row['tokens'], {'token_number': 1})
+        self.assertIsInstance(row['prescriptions']['medicines_details'][0], int)
+
+        row = self.client.get(url + '&expand=prescriptions.medicines_details').data[0]
+        self.assertEqual(row['prescriptions']['medicines_details'][0]['name'], "Medicine 1")
+
+    def test_query_count_independent_of_rows(self):
+        url = '/api/api/medical-records/?expand=doctors_details,consultation_details.tokens'
+        baseline = self.count_queries(url)
+        for _ in range(3):
+            self.create_visit()
+        self.assertEqual(self.count_queries(url), baseline)
+
+    def test_unknown_fields_are_rejected(self):
+        self.assertEqual(self.client.get('/api/api/consultations/?fields=secret').status_code, 400)
+        self.assertEqual(self.client.get('/api/api/consultations/?expand=diagnosis').status_code, 400)
+
+
+class PatientTimelineTestCase(ClinicDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_visit()
+        self.patient = Patient.objects.get()
+        self.appointment = Appointment.objects.get()
+        # A second, earlier visit for the same patient.
+        appointment = Appointment.objects.create(
+            patient=self.patient, doctor=self.appointment.doctor, appointment_date=date(2024, 1, 20)
+        )
+        token = Token.objects.create(appointment=appointment, token_number=2)
+        prescription = Prescription.objects.create(dosage="1", frequency="1", duration="1", patient=self.patient)
+        Consultation.objects.create(
+            token=token, patient=self.patient, symptoms="Fever", diagnosis="Flu", notes="", additional_notes="",
+            created_at=timezone.make_aware(datetime(2024, 1, 20, 10, 0)), prescription=prescription,
+        )
+
+    def test_merged_history_with_patient_header_once(self):
+        response = self.client.get(f'/api/api/patients/{self.patient.pk}/timeline/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['patient']['full_name'], "Patient 1")
+        self.assertIsNone(response.data['next'])
+        entries = response.data['results']
+        self.assertEqual(
+            [entry['type'] for entry in entries[-3:]], ['prescription', 'consultation', 'appointment']
+        )
+        self.assertEqual({entry['type'] for entry in entries}, set(KINDS))
+        self.assertFalse(any('patient' in entry['data'] or 'patient_details' in entry['data'] for entry in entries))
+        dates = [entry['date'] for entry in entries]
+        self.assertEqual(dates, sorted(dates, reverse=True))
+
+    def test_pages_by_whole_days(self):
+        url = f'/api/api/patients/{self.patient.pk}/timeline/'
+        page = self.client.get(url, {'days': 2}).data
+        self.assertIsNotNone(page['next'])
+        seen = {entry['date'] for entry in page['results']}
+        self.assertEqual(len(seen), 2)
+        rest = self.client.get(page['next']).data
+        self.assertIsNone(rest['next'])
+        self.assertTrue(all(entry['date'] < min(seen) for entry in rest['results']))
+        self.assertEqual([entry['type'] for entry in rest['results']], ['prescription', 'consultation', 'appointment'])
+
+    def test_query_count_independent_of_history(self):
+        url = f'/api/api/patients/{self.patient.pk}/timeline/'
+        baseline = self.count_queries(url)
+        for day in (3, 4, 5):
+            appointment = Appointment.objects.create(
+                patient=self.patient, doctor=self.appointment.doctor, appointment_date=date(2024, 2, day)
+            )
+            Bill.objects.create(appointment=appointment, total_amount=100)
+        self.assertEqual(self.count_queries(url), baseline)
+
+
+class CursorPaginationTestCase(TestCase):
+    def setUp(self):
+        self.gender = Gender.objects.create(name="Other")
+        for n in range(7):
+            Patient.objects.create(
+                full_name=f"Patient {n}", dob=date(1990, 1, 1), gender=self.gender,
+                mobile_number=f"70000000{n:02d}", address="Street"
+            )
+        self.client = APIClient()
+
+    def test_unpaginated_by_default(self):
+        response = self.client.get('/api/api/patients/')
+        self.assertEqual(len(response.data), 7)
+
+    def test_pages_are_stable_under_inserts(self):
+        seen = []
+        url = '/api/api/patients/?page_size=3'
+        while url:
+            response = self.client.get(url)
+            self.assertLessEqual(len(response.data['results']), 3)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+            if len(seen) == 3:
+                Patient.objects.create(
+                    full_name="Walk-in", dob=date(1990, 1, 1), gender=self.gender,
+                    mobile_number="7000000099", address="Street"
+                )
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+
+    def test_appointments_on_one_date_page_by_key(self):
+        staff = get_user_model().objects.create_user(username="pager", password="x")
+        doctor = Doctor.objects.create(
+            staff=staff, specialization=Specialization.objects.create(specialization_name="GP"),
+            consultation_fee=100, year_of_experience=1,
+        )
+        patient = Patient.objects.first()
+        day = date(2024, 3, 1)
+        for _ in range(12):
+            Appointment.objects.create(patient=patient, doctor=doctor, appointment_date=day)
+        expected = list(Appointment.objects.order_by('-pk').values_list('pk', flat=True))
+
+        seen = []
+        url = '/api/api/appointments/?page_size=5'
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            # Keyset filter on the primary key, no OFFSET within the shared date.
+            self.assertNotIn('OFFSET', context.captured_queries[0]['sql'].upper())
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+            Appointment.objects.create(patient=patient, doctor=doctor, appointment_date=day)
+        self.assertEqual(seen, expected)
+
+
+class ScheduleAvailabilityTestCase(TestCase):
+    def setUp(self):
+        self.gender = Gender.objects.create(name="Male")
+        self.specialization = Specialization.objects.create(specialization_name="ENT")
+        staff = get_user_model().objects.create_user(username="ent1", password="test123")
+        self.doctor = Doctor.objects.create(
+            staff=staff, specialization=self.specialization, consultation_fee=200, year_of_experience=3
+        )
+        self.schedule = Schedule.objects.create(doctor=self.doctor, schedule_date=date(2024, 3, 1), token=2)
+        self.patient = Patient.objects.create(
+            full_name="Sam", dob=date(1990, 1, 1), gender=self.gender,
+            mobile_number="6000000000", address="Street"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=staff)
+
+    def book(self):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, schedule=self.schedule, appointment_date=date(2024, 3, 1)
+        )
+
+    def remaining(self):
+        self.schedule.refresh_from_db()
+        return self.schedule.remaining_tokens
+
+    def test_counter_follows_bookings(self):
+        self.assertEqual(self.remaining(), 2)
+        first = self.book()
+        self.book()
+        self.assertEqual(self.remaining(), 0)
+        first.is_active = False
+        first.save()
+        self.assertEqual(self.remaining(), 1)
+        first.delete()
+        self.assertEqual(self.remaining(), 1)
+        self.schedule.token = 5
+        self.schedule.save()
+        self.assertEqual(self.remaining(), 4)
+
+    def test_full_schedule_rejects_bookings(self):
+        self.book()
+        self.book()
+        with self.assertRaises(ScheduleFull):
+            self.book()
+        self.assertEqual((self.remaining(), Appointment.objects.count()), (0, 2))
+
+        # A lowered capacity shows the overbooking; cancelling frees tokens again.
+        self.schedule.token = 1
+        self.schedule.save()
+        self.assertEqual(self.remaining(), -1)
+        Appointment.objects.first().delete()
+        with self.assertRaises(ScheduleFull):
+            self.book()
+
+    def test_bulk_booking_leaves_out_what_does_not_fit(self):
+        response = self.client.post('/api/api/appointments/bulk/', [
+            {'patient': self.patient.id, 'doctor': self.doctor.id, 'schedule': self.schedule.id,
+             'appointment_date': '2024-03-01'}
+            for _ in range(3)
+        ], format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(len(response.data['created']), 2)
+        self.assertEqual(response.data['errors'][0]['index'], 2)
+        self.assertIn('schedule', response.data['errors'][0]['errors'])
+        self.assertEqual(self.remaining(), 0)
+
+    def test_available_endpoint(self):
+        url = f'/api/api/schedules/available/?specialization={self.specialization.id}&date_from=2024-03-01&date_to=2024-03-31'
+        self.assertEqual(len(self.client.get(url).data), 1)
+        self.book()
+        self.book()
+        self.assertEqual(len(self.client.get(url).data), 0)
+        response = self.client.get('/api/api/schedules/available/?date_from=2024-03-31&date_to=2024-03-01')
+        self.assertEqual(response.status_code, 400)
+
+    def test_available_pages_follow_schedule_date(self):
+        for day in (3, 2, 2):
+            Schedule.objects.create(doctor=self.doctor, schedule_date=date(2024, 3, day), token=2)
+        url = '/api/api/schedules/available/?date_from=2024-03-01&date_to=2024-03-31&page_size=2'
+        dates = []
+        while url:
+            response = self.client.get(url)
+            dates += [row['schedule_date'] for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(dates, ['2024-03-01', '2024-03-02', '2024-03-02', '2024-03-03'])
+
+    def test_refresh_command(self):
+        self.book()
+        Schedule.objects.update(remaining_tokens=None)
+        call_command('refresh_schedule_capacity', stdout=StringIO())
+        self.assertEqual(self.remaining(), 1)
+
+
+class TokenIssueTestCase(TestCase):
+    def setUp(self):
+        gender = Gender.objects.create(name="Male")
+        specialization = Specialization.objects.create(specialization_name="Ortho")
+        staff = get_user_model().objects.create_user(username="ortho1", password="test123")
+        self.doctor = Doctor.objects.create(
+            staff=staff, specialization=specialization, consultation_fee=200, year_of_experience=3
+        )
+        patient = Patient.objects.create(
+            full_name="Ann", dob=date(1990, 1, 1), gender=gender, mobile_number="5000000000", address="Street"
+        )
+        self.appointment = Appointment.objects.create(
+            patient=patient, doctor=self.doctor, appointment_date=date(2024, 4, 1)
+        )
+        self.next_day = Appointment.objects.create(
+            patient=patient, doctor=self.doctor, appointment_date=date(2024, 4, 2)
+        )
+
+    def test_numbers_are_sequential_per_doctor_and_day(self):
+        numbers = [Token.issue(self.appointment).token_number for _ in range(3)]
+        self.assertEqual(numbers, [1, 2, 3])
+        self.assertEqual(Token.issue(self.next_day).token_number, 1)
+        self.assertEqual(TokenCounter.objects.get(doctor=self.doctor, date=date(2024, 4, 1)).last_number, 3)
+
+    def test_issue_endpoint(self):
+        client = APIClient()
+        response = client.post('/api/api/tokens/issue/', {'appointment': self.appointment.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['token_number'], 1)
+        self.assertEqual(response.data['appointment']['id'], self.appointment.id)
+        response = client.post('/api/api/tokens/issue/', {'appointment': 0})
+        self.assertEqual(response.status_code, 400)
+
+
+class TokenEventTestCase(ClinicDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_visit()
+        self.create_visit()
+        self.appointment, self.other_appointment = Appointment.objects.order_by('id')
+        self.channel = channel_name(self.appointment.doctor_id, date(2024, 2, 1))
+
+    def test_token_changes_publish_deltas(self):
+        events = []
+        token_broker.subscribe(self.channel, events.append)
+        self.addCleanup(token_broker.unsubscribe, self.channel, events.append)
+        with self.captureOnCommitCallbacks(execute=True):
+            token = Token.issue(self.appointment)
+            Token.issue(self.other_appointment)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(f'/api/api/tokens/{token.pk}/call/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(f'/api/api/tokens/{token.pk}/complete/').status_code, 200)
+        self.assertEqual([event['type'] for event in events], ['issued', 'called', 'completed'])
+        self.assertEqual(events[1]['token']['state'], 'called')
+        self.assertEqual(self.client.post(f'/api/api/tokens/{token.pk}/call/').status_code, 400)
+
+    def test_channels_are_looked_up_once_per_transaction(self):
+        events = []
+        token_broker.subscribe(self.channel, events.append)
+        self.addCleanup(token_broker.unsubscribe, self.channel, events.append)
+        for _ in range(3):
+            Token.issue(self.appointment)
+        tokens = Token.objects.filter(appointment=self.appointment)
+        count = tokens.count()
+        with CaptureQueriesContext(connection) as context, self.captureOnCommitCallbacks(execute=True):
+            for token in tokens:
+                token.call()
+        lookups = [query for query in context.captured_queries if 'FROM "clinic_appointment"' in query['sql']]
+        self.assertEqual(len(lookups), 1)
+        # Tokens removed along with their appointment still reach its channel.
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.filter(pk=self.appointment.pk).delete()
+        self.assertEqual([event['type'] for event in events], ['called'] * count + ['removed'] * count)
+
+    def test_reconnect_replays_missed_events(self):
+        broker = TokenEventBroker(history=2)
+        for number in range(3):
+            broker.publish('1:2024-04-01', 'issued', {'token_number': number})
+        self.assertEqual([e['id'] for e in broker.subscribe('1:2024-04-01', print, last_event_id=1)], [2, 3])
+        self.assertIsNone(broker.subscribe('1:2024-04-01', print, last_event_id=0))
+        self.assertIsNone(broker.subscribe('1:2024-04-01', print))
+
+    async def test_stream_sends_snapshot_then_deltas(self):
+        await sync_to_async(Token.issue)(self.appointment)
+        response = await self.async_client.get(
+            '/api/async/tokens/stream/', {'doctor': self.appointment.doctor_id, 'date': '2024-02-01'}
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        snapshot = (await anext(stream)).decode()
+        self.assertIn('event: snapshot', snapshot)
+        self.assertIn('"state": "waiting"', snapshot)
+
+        event = token_broker.publish(self.channel, 'called', {'id': 1, 'state': 'called'})
+        delta = (await anext(stream)).decode()
+        self.assertTrue(delta.startswith(f"id: {event['id']}\nevent: called\n"))
+        await stream.aclose()
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentTokenIssueTestCase(TransactionTestCase):
+    def test_concurrent_issuers_get_unique_numbers(self):
+        out = StringIO()
+        call_command('loadtest_token_issue', issuers=[50], tokens=5, stdout=out)
+        result = json.loads(out.getvalue())[0]
+        self.assertEqual(result['issued'], 250)
+        self.assertEqual(result['duplicates'], 0)
+
+
+class BulkEndpointTestCase(TestCase):
+    def setUp(self):
+        self.gender = Gender.objects.create(name="Female")
+        specialization = Specialization.objects.create(specialization_name="Derma")
+        staff = get_user_model().objects.create_user(username="derma1", password="test123")
+        self.doctor = Doctor.objects.create(
+            staff=staff, specialization=specialization, consultation_fee=200, year_of_experience=3
+        )
+        self.morning = TimeSlot.objects.create(type="Morning", start_time=time(9, 0), end_time=time(12, 0))
+        self.evening = TimeSlot.objects.create(type="Evening", start_time=time(17, 0), end_time=time(20, 0))
+        self.client = APIClient()
+        self.client.force_authenticate(user=staff)
+
+    def test_bulk_create_patients_reports_item_errors(self):
+        payload = [
+            {'full_name': f"Bulk {n}", 'dob': '1990-01-01', 'gender': self.gender.id,
+             'mobile_number': f"40000000{n:02d}", 'address': "Street"}
+            for n in range(20)
+        ]
+        payload.append({'full_name': "Broken", 'dob': 'not-a-date', 'gender': 999, 'address': "Street"})
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post('/api/api/patients/bulk/', payload, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(len(response.data['created']), 20)
+        self.assertEqual(response.data['errors'][0]['index'], 20)
+        self.assertIn('gender', response.data['errors'][0]['errors'])
+        self.assertLess(len(context.captured_queries), 10)
+        self.assertEqual(Patient.objects.count(), 20)
+
+    def test_bulk_schedules_and_appointments(self):
+        response = self.client.post('/api/api/schedules/bulk/', [
+            {'doctor': self.doctor.id, 'schedule_date': f'2024-05-0{day}', 'token': 3,
+             'time_slot': [self.morning.id, self.evening.id]}
+            for day in range(1, 4)
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        schedule = Schedule.objects.get(pk=response.data['created'][0])
+        self.assertEqual(schedule.remaining_tokens, 3)
+        self.assertEqual(schedule.time_slot.count(), 2)
+
+        response = self.client.patch('/api/api/schedules/bulk/', [
+            {'id': schedule.id, 'token': 5, 'time_slot': [self.morning.id]},
+            {'id': 0, 'token': 1},
+        ], format='json')
+        self.assertEqual(response.status_code, 207)
+        schedule.refresh_from_db()
+        self.assertEqual((schedule.token, schedule.remaining_tokens), (5, 5))
+        self.assertEqual(list(schedule.time_slot.all()), [self.morning])
+
+        patient = Patient.objects.create(
+            full_name="Lee", dob=date(1990, 1, 1), gender=self.gender, mobile_number="4100000000", address="Street"
+        )
+        response = self.client.post('/api/api/appointments/bulk/', [
+            {'patient': patient.id, 'doctor': self.doctor.id, 'schedule': schedule.id, 'appointment_date': '2024-05-01'}
+            for _ in range(2)
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        schedule.refresh_from_db()
+        self.assertEqual(schedule.remaining_tokens, 3)
+
+        response = self.client.patch('/api/api/appointments/bulk/', [
+            {'id': pk, 'is_active': False} for pk in response.data['created']
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        schedule.refresh_from_db()
+        self.assertEqual(schedule.remaining_tokens, 5)
+
+
+class AppointmentConflictTestCase(TestCase):
+    def setUp(self):
+        gender = Gender.objects.create(name="Female")
+        specialization = Specialization.objects.create(specialization_name="Ortho")
+        self.doctors = [
+            Doctor.objects.create(
+                staff=get_user_model().objects.create_user(username=f"ortho{n}", password="test123"),
+                specialization=specialization, consultation_fee=200, year_of_experience=n,
+            )
+            for n in range(2)
+        ]
+        self.patients = [
+            Patient.objects.create(
+                full_name=f"Patient {n}", dob=date(1990, 1, 1), gender=gender,
+                mobile_number=f"42000000{n:02d}", address="Street"
+            )
+            for n in range(3)
+        ]
+        self.slot = TimeSlot.objects.create(type="Morning", start_time=time(9, 0), end_time=time(9, 30))
+        self.day = date(2024, 6, 3)
+        self.client = APIClient()
+
+    def book(self, doctor, patient, **times):
+        return Appointment.objects.create(doctor=doctor, patient=patient, appointment_date=self.day, **times)
+
+    def test_moving_to_another_slot_moves_the_interval(self):
+        evening = TimeSlot.objects.create(type="Evening", start_time=time(17, 0), end_time=time(19, 0))
+        appointment = self.book(self.doctors[0], self.patients[0], time_slot=self.slot)
+        response = self.client.patch(
+            f'/api/api/appointments/{appointment.pk}/', {'time_slot': evening.pk}, format='json'
+        )
+        self.assertEqual((response.data['start_time'], response.data['end_time']), ('17:00:00', '19:00:00'))
+
+        # The new interval is what conflicts are checked against.
+        appointment = Appointment.objects.get(pk=appointment.pk)
+        self.book(self.doctors[0], self.patients[1], time_slot=self.slot)
+        appointment.time_slot = self.slot
+        with self.assertRaises(AppointmentConflict):
+            appointment.save()
+
+        # Explicit times sent along with the slot win.
+        appointment = Appointment.objects.get(pk=appointment.pk)
+        appointment.time_slot, appointment.start_time, appointment.end_time = self.slot, time(10, 0), time(10, 15)
+        appointment.save()
+        self.assertEqual(Appointment.objects.values_list('start_time', 'end_time').get(pk=appointment.pk),
+                         (time(10, 0), time(10, 15)))
+
+    def test_overlapping_save_is_rejected_for_doctor_and_patient(self):
+        first = self.book(self.doctors[0], self.patients[0], time_slot=self.slot)
+        self.assertEqual((first.start_time, first.end_time), (time(9, 0), time(9, 30)))
+
+        with self.assertRaises(AppointmentConflict) as caught:
+            self.book(self.doctors[0], self.patients[1], start_time=time(9, 15), end_time=time(9, 45))
+        self.assertEqual(caught.exception.conflicts, {'doctor': [f"appointment {first.pk}"], 'patient': []})
+        with self.assertRaises(AppointmentConflict) as caught:
+            self.book(self.doctors[1], self.patients[0], start_time=time(9, 29), end_time=time(10, 0))
+        self.assertIn('patient', caught.exception.message_dict)
+
+        # Back-to-back, untimed and cancelled appointments do not conflict.
+        self.book(self.doctors[0], self.patients[1], start_time=time(9, 30), end_time=time(10, 0))
+        self.book(self.doctors[0], self.patients[2])
+        first.is_active = False
+        first.save()
+        self.book(self.doctors[1], self.patients[0], time_slot=self.slot)
+        self.assertEqual(Appointment.all_objects.count(), 4)
+
+    def test_api_reports_conflict_as_validation_error(self):
+        first = self.book(self.doctors[0], self.patients[0], time_slot=self.slot)
+        appointment = self.book(self.doctors[0], self.patients[1], start_time=time(10, 0), end_time=time(10, 30))
+        response = self.client.patch(
+            f'/api/api/appointments/{appointment.id}/', {'start_time': '09:00', 'end_time': '09:30'}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'doctor': [
+            f"Doctor is already booked in an overlapping slot (appointment {first.pk})."
+        ]})
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.start_time, time(10, 0))
+
+    def test_bulk_import_reports_conflicts_by_index(self):
+        existing = self.book(self.doctors[0], self.patients[0], time_slot=self.slot)
+        item = {'appointment_date': '2024-06-03'}
+        payload = [
+            {**item, 'doctor': self.doctors[0].id, 'patient': self.patients[1].id, 'time_slot': self.slot.id},
+            {**item, 'doctor': self.doctors[1].id, 'patient': self.patients[1].id,
+             'start_time': '10:00', 'end_time': '10:30'},
+            {**item, 'doctor': self.doctors[1].id, 'patient': self.patients[2].id,
+             'start_time': '10:15', 'end_time': '10:45'},
+            {**item, 'doctor': self.doctors[1].id, 'patient': self.patients[2].id, 'start_time': '11:00'},
+            {**item, 'doctor': self.doctors[1].id, 'patient': self.patients[2].id},
+        ]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post('/api/api/appointments/bulk/', payload, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(len(response.data['created']), 2)
+        self.assertEqual([error['index'] for error in response.data['errors']], [0, 2, 3])
+        self.assertEqual(response.data['errors'][0]['errors'], {'doctor': [
+            f"Doctor is already booked in an overlapping slot (appointment {existing.pk})."
+        ]})
+        self.assertEqual(response.data['errors'][1]['errors'], {'doctor': [
+            "Doctor is already booked in an overlapping slot (item 1)."
+        ]})
+        self.assertLess(len(context.captured_queries), 20)
+        self.assertEqual(Appointment.objects.count(), 3)
+
+    def test_interval_index(self):
+        index = IntervalIndex()
+        index.add('a', 1, 10, 'long')
+        index.add('a', 2, 3, 'short')
+        index.add('a', 12, 14, 'late')
+        index.add('b', 0, 100, 'other')
+        self.assertEqual(index.overlapping('a', 5, 6), ['long'])
+        self.assertEqual(index.overlapping('a', 0, 13), ['long', 'short', 'late'])
+        self.assertEqual(index.overlapping('a', 10, 12), [])
+        self.assertEqual(index.overlapping('c', 0, 1), [])
+
+
+class StreamingExportTestCase(ClinicDataTestCase):
+    def test_consultation_export_formats(self):
+        for _ in range(3):
+            self.create_visit()
+        response = self.client.get('/api/api/consultations/export/?output=csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().strip().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith('id,created_at,patient_id,patient_name'))
+
+        response = self.client.get('/api/api/medical-records/export/?output=ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['diagnosis'], 'Cold')
+        self.assertEqual(rows[0]['medicines'], 'Medicine 1 5ml')
+
+        self.assertEqual(self.client.get('/api/api/consultations/export/?output=xml').status_code, 400)
+
+    def test_export_query_count_independent_of_rows(self):
+        def count():
+            with CaptureQueriesContext(connection) as context:
+                b''.join(self.client.get('/api/api/medical-records/export/').streaming_content)
+            return len(context.captured_queries)
+
+        self.create_visit()
+        baseline = count()
+        for _ in range(4):
+            self.create_visit()
+        self.assertEqual(count(), baseline)
+
+
+class ReferenceCacheTestCase(TestCase):
+    def setUp(self):
+        get_reference_cache().clear()
+        self.medicine_type = MedicineType.objects.create(type_name="Tablet")
+        Medicine.objects.create(name="Paracetamol", dose="500mg", type=self.medicine_type)
+        self.client = APIClient()
+        self.client.force_authenticate(user=get_user_model().objects.create_user(username="nurse", password="x"))
+
+    def test_repeated_reads_hit_cache(self):
+        first = self.client.get('/api/api/medicines/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/api/medicines/')
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/api/medicines/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_invalidate(self):
+        etag = self.client.get('/api/api/medicines/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.medicine_type.type_name = "Capsule"
+            self.medicine_type.save()
+            # Not before the write commits: readers would cache the old rows under the new version.
+            self.assertEqual(self.client.get('/api/api/medicines/')['ETag'], etag)
+        self.assertEqual(len(callbacks), 1)
+        response = self.client.get('/api/api/medicines/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['type']['type_name'], "Capsule")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/api/genders/', {'name': "Male"})
+        self.assertEqual(len(self.client.get('/api/api/genders/').data), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Gender.objects.create(name="Female")
+        self.assertEqual(len(self.client.get('/api/api/genders/').data), 2)
+
+    def test_evicted_version_does_not_revive_old_entries(self):
+        self.client.get('/api/api/medicines/')
+        get_reference_cache().delete('clinic:ref:version:clinic.medicine')
+        Medicine.objects.update(name="Ibuprofen")
+        self.assertEqual(self.client.get('/api/api/medicines/').data[0]['name'], "Ibuprofen")
+
+
+class PatientSearchTestCase(TestCase):
+    def setUp(self):
+        gender = Gender.objects.create(name="Female")
+        for name, mobile in [("Jane Doe", "9876500001"), ("Janet Smith", "9876500002"),
+                             ("John Rivers", "9123400003"), ("Mary Jane Watson", "8000000004")]:
+            Patient.objects.create(full_name=name, dob=date(1990, 1, 1), gender=gender,
+                                   mobile_number=mobile, address="Street")
+        self.client = APIClient()
+
+    def names(self, q):
+        response = self.client.get('/api/api/patients/search/', {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return sorted(row['full_name'] for row in response.data)
+
+    def test_mobile_prefix(self):
+        self.assertEqual(self.names("98765"), ["Jane Doe", "Janet Smith"])
+        self.assertEqual(self.names("9123400003"), ["John Rivers"])
+        self.assertEqual(self.names("99"), [])
+
+    def test_name_tokens(self):
+        self.assertEqual(self.names("jan"), ["Jane Doe", "Janet Smith", "Mary Jane Watson"])
+        self.assertEqual(self.names("jane wat"), ["Mary Jane Watson"])
+
+    def test_index_follows_updates(self):
+        patient = Patient.objects.get(full_name="John Rivers")
+        patient.full_name = "Jonathan Rivers"
+        patient.save()
+        self.assertEqual(self.names("jonathan"), ["Jonathan Rivers"])
+        patient.delete()
+        self.assertEqual(self.names("rivers"), [])
+
+    def test_query_validation(self):
+        self.assertEqual(self.client.get('/api/api/patients/search/', {'q': 'j'}).status_code, 400)
+
+
+class AsyncReadEndpointTestCase(ClinicDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_visit()
+        self.create_visit()
+        self.appointment = Appointment.objects.order_by('id').first()
+
+    async def test_doctor_appointments(self):
+        response = await self.async_client.get('/api/async/appointments/', {
+            'doctor': self.appointment.doctor_id, 'date': '2024-02-01',
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([row['id'] for row in data], [self.appointment.pk])
+        self.assertEqual(data[0]['patient']['full_name'], "Patient 1")
+
+    def test_token_queue_matches_sync_representation(self):
+        token = Token.objects.get(appointment=self.appointment)
+        params = {'expand': 'appointment.patient', 'fields': 'id,token_number,appointment.patient'}
+        expected = self.client.get(f'/api/api/tokens/{token.pk}/', params).json()
+        response = self.client.get('/api/async/tokens/queue/', {
+            'doctor': self.appointment.doctor_id, 'date': '2024-02-01', **params,
+        })
+        self.assertEqual(response.json(), [expected])
+
+    def test_token_queue_leaves_out_completed_tokens(self):
+        token = Token.objects.get(appointment=self.appointment)
+        token.status = False
+        token.save()
+        params = {'doctor': self.appointment.doctor_id, 'date': '2024-02-01'}
+        self.assertEqual(self.client.get('/api/async/tokens/queue/', params).json(), [])
+        listed = [row['id'] for row in self.client.get('/api/api/tokens/').json()]
+        self.assertNotIn(token.pk, listed)
+        self.assertTrue(listed)
+
+    async def test_patient_lookup(self):
+        response = await self.async_client.get('/api/async/patients/lookup/', {'q': '8000000002'})
+        self.assertEqual([row['full_name'] for row in response.json()], ["Patient 2"])
+        response = await self.async_client.get('/api/async/patients/lookup/', {'q': 'Patient'})
+        self.assertEqual(len(response.json()), 2)
+
+    async def test_invalid_parameters(self):
+        response = await self.async_client.get('/api/async/appointments/', {'doctor': 'x'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date', response.json())
+        response = await self.async_client.post('/api/async/tokens/queue/')
+        self.assertEqual(response.status_code, 405)
+
+
+class LoginAndAuthenticationCacheTestCase(TestCase):
+    def setUp(self):
+        get_auth_cache().clear()
+        # Write out logins left pending by other tests before their ids can be reused.
+        last_login_buffer.flush()
+        self.user = get_user_model().objects.create_user(username="nurse1", password="test123")
+        self.group = Group.objects.create(name="Nurses")
+        self.client = APIClient()
+
+    def authenticate(self, token=None):
+        token = token or AccessToken.for_user(self.user)
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return CachedJWTAuthentication().authenticate(Request(request))[0]
+
+    @override_settings(CLINIC_LAST_LOGIN_BATCH=2)
+    def test_last_login_is_written_in_batches(self):
+        other = get_user_model().objects.create_user(username="nurse2", password="test123")
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post('/api/login/', {'username': "nurse1", 'password': "test123"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertIsNone(get_user_model().objects.get(pk=self.user.pk).last_login)
+
+        self.client.post('/api/login/', {'username': "nurse2", 'password': "test123"})
+        self.assertIsNotNone(get_user_model().objects.get(pk=self.user.pk).last_login)
+        self.assertIsNotNone(get_user_model().objects.get(pk=other.pk).last_login)
+
+    def test_cached_user_and_groups(self):
+        self.user.groups.add(self.group)
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+            self.assertEqual([group.name for group in user.groups.all()], ["Nurses"])
+
+    @mock.patch.object(jwt_settings, 'CHECK_REVOKE_TOKEN', True)
+    def test_cache_holds_no_password_hash(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+        self.assertIn('password', user.get_deferred_fields())
+        token = AccessToken.for_user(self.user)
+        token[jwt_settings.REVOKE_TOKEN_CLAIM] = "from an older password"
+        with self.assertRaises(AuthenticationFailed), self.assertNumQueries(0):
+            self.authenticate(token)
+
+    def test_changes_invalidate_cached_user(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.add(self.group)
+        self.assertEqual(len(self.authenticate().groups.all()), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.name = "Senior nurses"
+            self.group.save()
+        self.assertEqual(self.authenticate().groups.all()[0].name, "Senior nurses")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+            # Until the change commits, the cached user is left alone, so a
+            # concurrent request cannot cache the row as it was before.
+            with self.assertNumQueries(0):
+                self.authenticate()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+
+class StaffPhotoPipelineTestCase(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name, CLINIC_JOBS_EAGER=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+
+    def image(self, color='red', size=(600, 400)):
+        buffer = BytesIO()
+        Image.new('RGB', size, color).save(buffer, 'JPEG')
+        return buffer.getvalue()
+
+    def create_staff(self, username, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return get_user_model().objects.create_user(
+                username=username, password="x", mobile_number=username,
+                photo=SimpleUploadedFile("portrait.jpg", content, content_type='image/jpeg'),
+            )
+
+    def test_signup_inserts_staff_once_and_renders_photo(self):
+        group = Group.objects.create(name="Nurses")
+        department = Department.objects.create(department_name="General", base_salary=20000)
+        gender = Gender.objects.create(name="Female")
+        with CaptureQueriesContext(connection) as context, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/signup/', {
+                'first_name': "Asha", 'last_name': "Nair", 'email': "asha@example.com",
+                'mobile_number': "9000000001", 'gender': gender.id, 'dob': '1990-01-01',
+                'joining_date': '2024-01-01T09:00:00Z', 'qualification': "BSc", 'department': department.id,
+                'group': group.id, 'photo': SimpleUploadedFile("portrait.jpg", self.image(), content_type='image/jpeg'),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        inserts = [query for query in context.captured_queries if query['sql'].startswith('INSERT INTO "clinic_staff"')]
+        self.assertEqual(len(inserts), 1)
+        staff = Staff.objects.get(username=response.data['user']['username'])
+        self.assertEqual(list(staff.groups.all()), [group])
+        self.assertTrue(staff.check_password(response.data['user']['password']))
+        self.assertTrue(staff.photo_thumbnail.name.startswith('staff_photos/thumbnails/'))
+
+    def test_duplicate_uploads_share_one_file_and_variants(self):
+        first = self.create_staff("staff1", self.image())
+        second = self.create_staff("staff2", self.image())
+        first.refresh_from_db()
+        self.assertEqual(second.photo.name, first.photo.name)
+        self.assertEqual(first.photo.name, f"staff_photos/{first.photo_hash}.jpg")
+        self.assertEqual(len(os.listdir(os.path.dirname(first.photo.path))), 3)
+        with Image.open(first.photo_thumbnail.path) as thumbnail:
+            self.assertEqual(thumbnail.size, (128, 128))
+        second.refresh_from_db()
+        self.assertEqual(second.photo_thumbnail.name, first.photo_thumbnail.name)
+
+        photos = [row['photo'] for row in self.client.get('/api/api/staff/').data]
+        self.assertTrue(all('/thumbnails/' in url for url in photos))
+        original = self.client.get(f'/api/api/staff/{first.pk}/?photo=original').data['photo']
+        self.assertTrue(original.endswith(first.photo.name))
+
+    def test_selected_photo_field_loads_its_variants(self):
+        staff = self.create_staff("staff1", self.image())
+        Salary.objects.create(staff=staff, base_salary=1000, salary_payment_date=date(2024, 1, 31))
+        self.client.force_authenticate(user=staff)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/api/salary/?fields=id,staff.photo')
+        self.assertIn('/thumbnails/', response.data[0]['staff']['photo'])
+        self.assertEqual(len(context.captured_queries), 1)
+
+    @override_settings(CLINIC_JOBS_EAGER=False)
+    def test_variants_are_rendered_by_the_worker(self):
+        staff = self.create_staff("staff1", self.image())
+        self.assertEqual(staff.photo_thumbnail, '')
+        self.assertEqual(Job.objects.get().payload, {'digest': staff.photo_hash})
+        get_auth_cache().clear()
+        token = AccessToken.for_user(staff)
+        CachedJWTAuthentication().get_user(token)
+        call_command('run_jobs', '--once', stdout=StringIO())
+        staff.refresh_from_db()
+        self.assertTrue(staff.photo_thumbnail.name.startswith('staff_photos/thumbnails/'))
+        # Recording the variants dropped the cached user.
+        with self.assertNumQueries(2):
+            CachedJWTAuthentication().get_user(token)
+
+    def test_command_hashes_legacy_photos(self):
+        content = self.image('blue')
+        names = [default_storage.save('staff_photos/legacy.jpg', ContentFile(content)) for _ in range(2)]
+        User = get_user_model()
+        for n, name in enumerate(names):
+            User.objects.filter(pk=User.objects.create_user(username=f"old{n}", password="x", mobile_number=f"old{n}").pk).update(photo=name)
+
+        call_command('process_staff_photos', '--delete-duplicates', stdout=StringIO())
+        rows = set(User.objects.values_list('photo', 'photo_thumbnail').distinct())
+        self.assertEqual(len(rows), 1)
+        photo, thumbnail = rows.pop()
+        self.assertTrue(thumbnail.startswith('staff_photos/thumbnails/'))
+        self.assertFalse(any(default_storage.exists(name) for name in names))
+
+
+ran_jobs = []
+
+
+@job('tests.record')
+def record_job(value, fail=False):
+    ran_jobs.append(value)
+    if fail:
+        raise RuntimeError("failed on purpose")
+
+
+@job('tests.statuses')
+def record_statuses_job():
+    ran_jobs.append(sorted(Job.objects.values_list('status', flat=True)))
+
+
+@override_settings(CLINIC_JOB_RETRY_DELAY=0)
+class JobQueueTestCase(TestCase):
+    def setUp(self):
+        ran_jobs.clear()
+
+    def test_worker_runs_committed_jobs(self):
+        queued = enqueue('tests.record', {'value': 1})
+        later = enqueue('tests.record', {'value': 2}, delay=60)
+        out = StringIO()
+        call_command('run_jobs', '--once', stdout=out)
+        self.assertEqual(ran_jobs, [1])
+        self.assertIn("Ran 1 jobs", out.getvalue())
+        queued.refresh_from_db()
+        later.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.DONE, 1))
+        self.assertEqual(later.status, Job.QUEUED)
+        with self.assertRaises(ValueError):
+            enqueue('tests.missing')
+
+    def test_failed_jobs_retry_until_max_attempts(self):
+        queued = enqueue('tests.record', {'value': 1, 'fail': True}, max_attempts=2)
+        worker = Worker('test')
+        self.assertEqual(worker.run_pending(), 1)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.QUEUED, 1))
+        self.assertIn("failed on purpose", queued.last_error)
+        self.assertEqual(worker.run_pending(), 1)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.FAILED)
+        self.assertEqual(worker.run_pending(), 0)
+
+    def test_claims_are_exclusive_and_stale_jobs_are_requeued(self):
+        queued = enqueue('tests.record', {'value': 1})
+        self.assertEqual(len(Worker('a').claim()), 1)
+        self.assertEqual(Worker('b').claim(), [])
+        Job.objects.filter(pk=queued.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(Worker('b').requeue_stale(), 1)
+        self.assertEqual([claimed.pk for claimed in Worker('b').claim()], [queued.pk])
+
+    def test_jobs_are_claimed_as_they_start(self):
+        enqueue('tests.statuses')
+        enqueue('tests.statuses')
+        self.assertEqual(Worker('a').run_pending(), 2)
+        # While the first job ran, the second was still queued for any worker.
+        self.assertEqual(ran_jobs, [[Job.QUEUED, Job.RUNNING], [Job.DONE, Job.RUNNING]])
+
+    def test_stale_jobs_out_of_attempts_fail(self):
+        queued = enqueue('tests.record', {'value': 1}, max_attempts=1)
+        Worker('a').claim()
+        Job.objects.filter(pk=queued.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(Worker('b').requeue_stale(), 0)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.FAILED)
+        self.assertIn("Worker stopped", queued.last_error)
+
+    @override_settings(CLINIC_JOBS_EAGER=True)
+    def test_eager_jobs_run_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('tests.record', {'value': 3})
+            self.assertEqual(ran_jobs, [])
+        self.assertEqual(ran_jobs, [3])
+        self.assertFalse(Job.objects.exists())
+
+
+class PayrollRunTestCase(TestCase):
+    def setUp(self):
+        self.department = Department.objects.create(department_name="Nursing", base_salary=25000)
+        User = get_user_model()
+        self.staff = [
+            User.objects.create_user(username=f"nurse{n}", password="x", department=self.department)
+            for n in range(3)
+        ]
+        User.objects.create_user(username="retired", password="x", department=self.department, is_active=False)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.staff[0])
+
+    def run_payroll(self, payload):
+        response = self.client.post('/api/api/salary/payroll-run/', payload, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_run_is_idempotent_per_period(self):
+        result = self.run_payroll({
+            'period': '2024-02',
+            'adjustments': [{'staff': self.staff[1].id, 'increment': '1000.00', 'deductions': '250.00'}],
+        })
+        self.assertEqual((result['created'], result['updated']), (3, 0))
+        salary = Salary.objects.get(staff=self.staff[1], period=date(2024, 2, 1))
+        self.assertEqual(salary.total_salary, Decimal('25750.00'))
+        self.assertEqual(salary.salary_payment_date, date(2024, 2, 29))
+
+        Salary.objects.filter(staff=self.staff[0]).update(payment_status=True)
+        self.department.base_salary = 26000
+        self.department.save()
+        result = self.run_payroll({'period': '2024-02-15'})
+        self.assertEqual((result['created'], result['updated'], result['skipped_paid']), (0, 2, 1))
+        self.assertEqual(Salary.objects.filter(period=date(2024, 2, 1)).count(), 3)
+        salary.refresh_from_db()
+        self.assertEqual(salary.total_salary, Decimal('26750.00'))
+        self.assertEqual(Salary.objects.get(staff=self.staff[0]).total_salary, Decimal('25000.00'))
+
+    def test_overlapping_first_runs_do_not_collide(self):
+        # A concurrent first run inserts the period's rows after this run has read it.
+        other_run = Salary.objects.filter(period=date(2024, 5, 1))
+        with mock.patch.object(Salary.objects, 'select_for_update', return_value=Salary.objects.none()):
+            Salary.objects.create(staff=self.staff[2], period=date(2024, 5, 1), salary_payment_date=date(2024, 5, 31))
+            self.run_payroll({'period': '2024-05'})
+        self.assertEqual(other_run.count(), 3)
+        self.assertEqual(other_run.get(staff=self.staff[2]).total_salary, Decimal('25000.00'))
+
+    def test_query_count_independent_of_staff(self):
+        with CaptureQueriesContext(connection) as context:
+            self.run_payroll({'period': '2024-03'})
+        User = get_user_model()
+        for n in range(20):
+            User.objects.create_user(username=f"extra{n}", password="x", department=self.department)
+        with self.assertNumQueries(len(context.captured_queries)):
+            self.run_payroll({'period': '2024-04'})
+
+
+class SoftDeleteTestCase(ClinicDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_visit()
+        self.create_visit()
+        self.appointment, self.other = Appointment.objects.order_by('pk')
+
+    def test_default_managers_hide_inactive_rows(self):
+        self.appointment.is_active = False
+        self.appointment.save()
+        Token.objects.filter(appointment=self.other).get().complete()
+        Schedule.objects.filter(doctor=self.other.doctor).update(status=False)
+
+        self.assertEqual(list(Appointment.objects.all()), [self.other])
+        self.assertEqual(Appointment.all_objects.count(), 2)
+        self.assertEqual(Token.objects.count(), 1)
+        self.assertEqual(Schedule.objects.count(), 1)
+        # Reverse relations and foreign keys still reach inactive rows.
+        self.assertEqual(list(self.appointment.patient.appointments_patient.all()), [self.appointment])
+        self.assertEqual(Bill.objects.get(appointment_id=self.appointment.pk).appointment, self.appointment)
+
+        self.assertEqual([row['id'] for row in self.client.get('/api/api/appointments/').data], [self.other.pk])
+        self.assertEqual(self.client.get(f'/api/api/appointments/{self.appointment.pk}/').status_code, 404)
+
+        # Switching an appointment back on restores its schedule capacity.
+        schedule = self.appointment.schedule
+        schedule.refresh_from_db()
+        self.appointment.is_active = True
+        self.appointment.save()
+        self.assertEqual(Schedule.objects.get(pk=schedule.pk).remaining_tokens, schedule.remaining_tokens - 1)
+
+    def test_unique_checks_see_inactive_rows(self):
+        get_user_model().objects.create_user(username="retired", password="test123", is_active=False)
+        response = self.client.post('/api/api/staff/', {'username': 'retired'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('username', response.data)
+        with self.assertRaises(ValidationError):
+            Staff(username='retired', password='x').validate_unique()
+
+    def test_archive_inactive_moves_old_unreferenced_rows(self):
+        old = date(2023, 1, 2)
+        cancelled = Appointment.objects.create(
+            patient=self.appointment.patient, doctor=self.appointment.doctor, appointment_date=old, is_active=False
+        )
+        billed = Appointment.objects.create(
+            patient=self.appointment.patient, doctor=self.appointment.doctor, appointment_date=old, is_active=False
+        )
+        Bill.objects.create(appointment=billed, total_amount=50)
+        recent = Appointment.objects.create(
+            patient=self.appointment.patient, doctor=self.appointment.doctor,
+            appointment_date=timezone.localdate(), is_active=False,
+        )
+        token = Token.objects.create(appointment=self.other, token_number=9, status=False)
+        Token.all_objects.filter(pk=token.pk).update(issued_at=timezone.now() - timedelta(days=400))
+        rollups = sorted(DailyRollup.objects.values_list('dimension', 'key', 'date', 'appointments', 'bills'))
+
+        out = StringIO()
+        call_command('archive_inactive', days=30, dry_run=True, stdout=out)
+        self.assertIn("Would archive 0 consultations, 1 tokens, 1 appointments, 0 schedules.", out.getvalue())
+        call_command('archive_inactive', days=30, stdout=StringIO())
+
+        self.assertEqual(
+            set(Appointment.all_objects.values_list('pk', flat=True)),
+            {self.appointment.pk, self.other.pk, billed.pk, recent.pk},
+        )
+        archived = ArchivedAppointment.objects.get()
+        self.assertEqual(
+            (archived.pk, archived.doctor_id, archived.appointment_date, archived.is_active),
+            (cancelled.pk, cancelled.doctor_id, old, False),
+        )
+        self.assertEqual(ArchivedToken.objects.get().pk, token.pk)
+        self.assertFalse(Token.all_objects.filter(pk=token.pk).exists())
+        self.assertEqual(
+            sorted(DailyRollup.objects.values_list('dimension', 'key', 'date', 'appointments', 'bills')), rollups
+        )
+
+
+class HistoryArchiveTestCase(ClinicDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_visit()
+        self.create_visit()
+        self.old, self.recent = Consultation.objects.order_by('pk')
+        months_ago = timezone.now() - timedelta(days=150)
+        Token.all_objects.filter(pk=self.old.token_id).update(issued_at=months_ago)
+        Consultation.all_objects.filter(pk=self.old.pk).update(created_at=months_ago)
+
+    def test_partition_archives_is_postgresql_only(self):
+        out = StringIO()
+        call_command('partition_archives', stdout=out)
+        expected = "skipped, not PostgreSQL" if connection.vendor != 'postgresql' else "partitioned by month"
+        self.assertIn(f"clinic_token_archive: {expected}", out.getvalue())
+
+    def test_lists_default_to_hot_months(self):
+        for path, old_id in (('tokens', self.old.token_id), ('consultations', self.old.pk)):
+            recent = self.client.get(f'/api/api/{path}/').data
+            self.assertNotIn(old_id, [row['id'] for row in recent])
+            self.assertEqual(len(recent), 1)
+            widened = self.client.get(f'/api/api/{path}/', {'since': '2020-01-01'}).data
+            self.assertIn(old_id, [row['id'] for row in widened])
+            self.assertEqual(self.client.get(f'/api/api/{path}/{old_id}/').status_code, 200)
+            self.assertEqual(self.client.get(f'/api/api/{path}/', {'since': 'soon'}).status_code, 400)
+
+    def test_archive_history_keeps_records_readable(self):
+        out = StringIO()
+        call_command('archive_history', dry_run=True, stdout=out)
+        self.assertIn("Would archive 1 tokens and 1 consultations", out.getvalue())
+        channel = channel_name(self.old.token.appointment.doctor_id, self.old.token.appointment.appointment_date)
+        events = []
+        token_broker.subscribe(channel, events.append)
+        self.addCleanup(token_broker.unsubscribe, channel, events.append)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('archive_history', stdout=StringIO())
+        # Archiving is not a queue change.
+        self.assertEqual(events, [])
+
+        self.assertEqual(list(Consultation.all_objects.all()), [self.recent])
+        self.assertEqual(ArchivedConsultation.objects.get().pk, self.old.pk)
+        self.assertEqual(ArchivedToken.objects.get().pk, self.old.token_id)
+        record = MedicalRecord.objects.get(consultation_id=self.old.pk)
+        self.assertTrue(record.consultation.archived)
+        self.assertEqual(record.consultation.token.token_number, 1)
+        with self.assertRaises(ValueError):
+            record.consultation.save()
+
+        response = self.client.get(f'/api/api/medical-records/{record.pk}/')
+        self.assertEqual(response.data['consultation_details']['diagnosis'], 'Cold')
+        self.assertEqual(response.data['consultation_details']['tokens']['token_number'], 1)
+        self.assertEqual(len(self.client.get('/api/api/medical-records/').data), 2)
+        response = self.client.get('/api/api/medical-records/export/?output=ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['diagnosis'] for row in rows], ['Cold', 'Cold'])
+
+        # Retrieving by id reaches the archive; other detail actions do not.
+        response = self.client.get(f'/api/api/tokens/{self.old.token_id}/')
+        self.assertEqual((response.status_code, response.data['token_number']), (200, 1))
+        self.assertEqual(self.client.get(f'/api/api/consultations/{self.old.pk}/').data['diagnosis'], 'Cold')
+        self.assertEqual(
+            self.client.patch(f'/api/api/consultations/{self.old.pk}/', {'notes': 'x'}, format='json').status_code, 404
+        )
+        self.assertEqual(self.client.get('/api/api/tokens/999999/').status_code, 404)
+
+        # Deleting a live consultation still deletes its records.
+        self.recent.delete()
+        self.assertEqual(list(MedicalRecord.objects.values_list('pk', flat=True)), [record.pk])
+
+
+class DailyRollupTestCase(ClinicDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_visit()
+        self.create_visit()
+        self.today = timezone.localdate()
+
+    def report(self, path, **params):
+        params = {'date_from': '2024-01-01', 'date_to': self.today.isoformat(), **params}
+        response = self.client.get(f'/api/reports/{path}/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def rollup_rows(self):
+        return sorted(
+            DailyRollup.objects.values_list(
+                'dimension', 'key', 'date', 'appointments', 'consultations', 'bills', 'billed_amount', 'unpaid_amount'
+            )
+        ) + sorted(DailyDiagnosisRollup.objects.values_list('date', 'diagnosis', 'consultations'))
+
+    def test_writes_update_rollups(self):
+        doctors = self.report('summary')
+        self.assertEqual([row['name'] for row in doctors], ["Dr.  ", "Dr.  "])
+        self.assertEqual(
+            [(row['appointments'], row['consultations'], row['bills'], row['unpaid_amount']) for row in doctors],
+            [(1, 1, 1, 300), (1, 1, 1, 300)],
+        )
+        department, = self.report('summary', dimension='department')
+        self.assertEqual((department['name'], department['appointments'], department['billed_amount']), ("General", 2, 600))
+
+        bill = Bill.objects.first()
+        bill.payment_status = True
+        bill.save()
+        appointment = Appointment.objects.first()
+        appointment.is_active = False
+        appointment.save()
+        Consultation.objects.first().delete()
+
+        specialization, = self.report('summary', dimension='specialization')
+        self.assertEqual(
+            (specialization['appointments'], specialization['consultations'], specialization['unpaid_amount']),
+            (1, 1, 300),
+        )
+        self.assertEqual(self.report('diagnoses'), [{'diagnosis': "Cold", 'consultations': 1}])
+        daily = self.report('daily', dimension='doctor', key=appointment.doctor_id)
+        self.assertEqual([(row['date'], row['appointments']) for row in daily], [('2024-02-01', 0), (self.today.isoformat(), 0)])
+
+    def test_backfill_matches_incremental_rollups(self):
+        Bill.objects.create(appointment=Appointment.objects.first(), total_amount=Decimal('49.50'), payment_status=True)
+        incremental = self.rollup_rows()
+        DailyRollup.objects.all().delete()
+        call_command('backfill_rollups', stdout=StringIO())
+        self.assertEqual(self.rollup_rows(), incremental)
+
+    def test_bills_and_consultations_follow_their_appointment_doctor(self):
+        first, second = Appointment.objects.order_by('pk')
+        first.doctor = second.doctor
+        first.save()
+        self.assertEqual(
+            sorted((row['appointments'], row['consultations'], row['bills']) for row in self.report('summary')),
+            [(0, 0, 0), (2, 2, 2)],
+        )
+        first.doctor, second.doctor = Doctor.objects.exclude(pk=second.doctor_id).get(), first.doctor
+        Appointment.objects.bulk_update([first, second], ['doctor'])
+        self.assertEqual(
+            [(row['appointments'], row['consultations'], row['bills']) for row in self.report('summary')],
+            [(1, 1, 1), (1, 1, 1)],
+        )
+        incremental = self.rollup_rows()
+        DailyRollup.objects.all().delete()
+        DailyDiagnosisRollup.objects.all().delete()
+        call_command('backfill_rollups', stdout=StringIO())
+        self.assertEqual(self.rollup_rows(), incremental)
+
+    def test_summary_reads_rollups_only(self):
+        with self.assertNumQueries(2):
+            self.client.get('/api/reports/summary/', {'date_from': '2024-01-01', 'date_to': '2024-12-31'})
+        response = self.client.get('/api/reports/summary/', {'date_from': '2024-02-01', 'date_to': '2024-01-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+@modify_settings(MIDDLEWARE={'append': 'clinic.profiling.QueryProfilingMiddleware'})
+class ProfilingMiddlewareTestCase(ClinicDataTestCase):
+    def setUp(self):
+        super().setUp()
+        profile_store.reset()
+        self.user.is_staff = True
+        self.user.save()
+
+    def test_reports_endpoints_and_duplicate_queries(self):
+        for _ in range(4):
+            self.create_visit()
+        self.client.get('/api/api/tokens/')
+        self.client.get('/api/api/staff/')
+        report = self.client.get('/api/profiling/').data['endpoints']
+
+        tokens = report['TokenViewSet.list']
+        self.assertEqual(tokens['requests'], 1)
+        self.assertGreater(tokens['response_bytes']['max'], 0)
+        self.assertGreaterEqual(tokens['total_ms']['max'], tokens['serializer_ms']['max'])
+        self.assertGreater(tokens['serializer_ms']['max'], 0)
+        self.assertEqual(tokens['duplicate_queries'], [])
+        # Serializers are instrumented per request, not patched process-wide.
+        self.assertEqual(serializers.Serializer.data.fget.__module__, 'rest_framework.serializers')
+
+        # StaffViewSet has no query plan, so nested gender/department load per row.
+        fields = {row['field'] for row in report['StaffViewSet.list']['duplicate_queries']}
+        self.assertIn('StaffSerializer.gender', fields)
+
+        self.client.delete('/api/profiling/')
+        self.assertNotIn('TokenViewSet.list', self.client.get('/api/profiling/').data['endpoints'])
+
+
+class ReplicaRouterTestCase(TestCase):
+    @override_settings(CLINIC_READ_REPLICAS=['replica'])
+    def test_reads_follow_the_request_until_it_writes(self):
+        router = ReplicaRouter()
+        seen = []
+
+        def view(request):
+            state = _routing.get()
+            state.replica = 'replica'
+            seen.append(router.db_for_read(Bill))
+            seen.append(router.db_for_write(Bill))
+            seen.append(router.db_for_read(Bill))
+            return HttpResponse()
+
+        response = PrimaryPinningMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(seen, ['replica', 'default', 'default'])
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(router.db_for_read(Bill), 'default')
+
+        replica_row = Bill(total_amount=1)
+        replica_row._state.db = 'replica'
+        self.assertEqual(router.db_for_read(Appointment, instance=replica_row), 'replica')
+
+
+@skipUnless('replica' in settings.DATABASES, "needs a second database alias named 'replica'")
+@override_settings(DATABASE_ROUTERS=['clinic.routing.ReplicaRouter'], CLINIC_READ_REPLICAS=['replica'])
+@modify_settings(MIDDLEWARE={'append': 'clinic.routing.PrimaryPinningMiddleware'})
+class ReplicaRoutingTestCase(ClinicDataTestCase):
+    """The 'replica' alias must be a separate, empty database, so replica reads see no rows."""
+
+    databases = {'default', 'replica'} if 'replica' in settings.DATABASES else {'default'}
+
+    def test_safe_requests_read_replica_until_client_writes(self):
+        self.create_visit()
+        bill = Bill.objects.get()
+        self.assertEqual(self.client.get('/api/api/bills/').data, [])
+        export = self.client.get('/api/api/consultations/export/?output=ndjson')
+        self.assertEqual(b''.join(export.streaming_content), b'')
+
+        response = self.client.patch(f'/api/api/bills/{bill.id}/', {'payment_status': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(len(self.client.get('/api/api/bills/').data), 1)
+
+        # Views without the mixin always use the primary.
+        del self.client.cookies[PIN_COOKIE]
+        self.assertEqual(self.client.get('/api/api/bills/').data, [])
+        self.assertEqual(len(self.client.get('/api/api/tokens/').data), 1)
+
+
+class ConnectionSettingsTestCase(TestCase):
+    def test_connection_settings_pool_or_persistent(self):
+        postgres = {'ENGINE': 'django.db.backends.postgresql', 'NAME': 'clinic', 'OPTIONS': {'pool': {'max_size': 4}}}
+        pooled = connection_settings(postgres, pool=True, pool_max=20)
+        self.assertEqual(pooled['CONN_MAX_AGE'], 0)
+        self.assertEqual(pooled['OPTIONS']['pool'], {'min_size': 2, 'max_size': 4, 'timeout': 10})
+        self.assertEqual(postgres['OPTIONS'], {'pool': {'max_size': 4}})
+
+        persistent = connection_settings(postgres, pool=False, max_age=300)
+        self.assertEqual((persistent['CONN_MAX_AGE'], persistent['CONN_HEALTH_CHECKS']), (300, True))
+        self.assertNotIn('pool', persistent['OPTIONS'])
+        self.assertEqual(connection_mode(connection_settings({'ENGINE': 'django.db.backends.sqlite3'})), 'persistent')
+
+    def test_report_counts_requests_and_connects(self):
+        admin = get_user_model().objects.create_superuser(username="root", password="test123", mobile_number="1")
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        connection_stats.reset()
+        client.get('/api/api/genders/')
+        connection_stats.connection_created('default')
+        report = client.get('/api/db-connections/').data
+        self.assertEqual(report['requests'], 2)
+        self.assertEqual(report['databases']['default']['connects'], 1)
+        self.assertEqual(report['databases']['default']['mode'], connection_mode(settings.DATABASES['default']))
+
+
+class EndpointBenchmarkTestCase(TestCase):
+    def test_seed_and_benchmark(self):
+        counts = ClinicDataGenerator(scale=0.01, tag='unit').generate()
+        self.assertEqual(counts['tokens'], counts['appointments'])
+        self.assertFalse(Schedule.objects.filter(remaining_tokens__lt=0).exists())
+        self.assertGreater(counts['consultations'], 0)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.json')
+            call_command('bench_endpoints', scale=0.01, repeat=1, only=['tokens', 'genders'], output=path,
+                         stdout=StringIO())
+            with open(path) as handle:
+                results = json.load(handle)
+            self.assertEqual(results['scenarios']['tokens.list']['status'], {'200': 1})
+            self.assertIn('genders.create', results['scenarios'])
+
+            out = StringIO()
+            call_command('bench_endpoints', scale=0.01, repeat=1, only=['genders'], compare=path,
+                         threshold=10000, stdout=out)
+            self.assertIn('genders.list', out.getvalue())
+
+        ClinicDataGenerator(tag='unit').cleanup()
+        self.assertFalse(Patient.objects.exists())
+        self.assertFalse(Token.objects.exists())
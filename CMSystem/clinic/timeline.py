@@ -0,0 +1,118 @@
+from datetime import datetime, time
+
+from django.db.models import F, Min
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .field_selection import parse_selection
+from .models import Appointment, Bill, Consultation, MedicalRecord, Prescription
+from .query_plans import apply_query_plan
+from .serializers import (
+    AppointmentSerializer, BillSerializer, ConsultationSerializer, MedicalRecordSerializer,
+    PrescriptionSerializer,
+)
+
+
+# Patient timeline
+# A patient's appointments, consultations, prescriptions, medical records and
+# bills merged into one history, newest first. Each kind is rendered by its
+# usual serializer with a field selection that leaves out the patient, so
+# the patient is serialized once as the header. A page covers whole days:
+# one query finds the next ``days`` dates that have entries, then one query
+# per kind (plus its prefetches) loads those days, so the query count does
+# not grow with the history. Prescriptions carry no date of their own and
+# are placed on the day of their first consultation; prescriptions without
+# a consultation are not shown.
+
+def _kind(model, serializer_class, day, moment, fields, expand='', patient='patient'):
+    return {
+        'model': model,
+        'serializer_class': serializer_class,
+        'day': day,
+        'moment': moment,
+        'patient': patient,
+        'selection': parse_selection(fields, expand),
+    }
+
+
+KINDS = {
+    'appointment': _kind(
+        Appointment, AppointmentSerializer, F('appointment_date'), 'appointment_date',
+        'id,schedule,appointment_date',
+    ),
+    'consultation': _kind(
+        Consultation, ConsultationSerializer, TruncDate('created_at'), 'created_at',
+        'id,token,prescription,symptoms,diagnosis,notes,additional_notes,created_at,is_active',
+    ),
+    'prescription': _kind(
+        Prescription, PrescriptionSerializer, TruncDate(Min('consultations__created_at')), 'first_consulted',
+        'id,medicines_details,dosage,frequency,duration', expand='medicines_details',
+    ),
+    'medical_record': _kind(
+        MedicalRecord, MedicalRecordSerializer, F('record_date'), 'record_date',
+        'id,doctors,record_date,consultation,updated_at',
+    ),
+    'bill': _kind(
+        Bill, BillSerializer, TruncDate('created_at'), 'created_at',
+        'id,appointment,total_amount,payment_status,created_at', patient='appointment__patient',
+    ),
+}
+
+# Kinds whose days are a subset of another kind's, so the date scan can skip them.
+DERIVED_DAYS = {'prescription'}
+
+
+def _dated(name, patient, before=None):
+    kind = KINDS[name]
+    queryset = kind['model'].objects.filter(**{kind['patient']: patient}).annotate(timeline_day=kind['day'])
+    if name == 'prescription':
+        queryset = queryset.annotate(first_consulted=Min('consultations__created_at'))
+    if before is not None:
+        queryset = queryset.filter(timeline_day__lt=before)
+    return queryset
+
+
+def timeline_days(patient, before=None, days=30):
+    """The most recent ``days + 1`` dates before ``before`` with any entry, newest first."""
+    scans = [
+        _dated(name, patient, before).order_by().values_list('timeline_day', flat=True)
+        for name in KINDS if name not in DERIVED_DAYS
+    ]
+    return list(scans[0].union(*scans[1:]).order_by('-timeline_day')[:days + 1])
+
+
+def _sort_key(name, moment, pk):
+    if isinstance(moment, datetime):
+        if timezone.is_aware(moment):
+            moment = timezone.localtime(moment)
+        moment = moment.replace(tzinfo=None)
+    else:
+        moment = datetime.combine(moment, time.min)
+    return moment, list(KINDS).index(name), pk
+
+
+def patient_timeline(patient, before=None, days=30, context=None):
+    """Return ``(entries, next_before)`` for one page of the patient's history."""
+    found = timeline_days(patient, before, days)
+    if not found:
+        return [], None
+    oldest = found[:days][-1]
+    next_before = oldest if len(found) > days else None
+
+    entries = []
+    for name, kind in KINDS.items():
+        queryset = _dated(name, patient, before).filter(timeline_day__gte=oldest)
+        queryset = apply_query_plan(queryset, kind['serializer_class'], kind['selection'])
+        objects = list(queryset)
+        data = kind['serializer_class'](
+            objects, many=True, selection=kind['selection'], context=context or {},
+        ).data
+        for obj, row in zip(objects, data):
+            moment = getattr(obj, kind['moment'])
+            entries.append((_sort_key(name, moment, obj.pk), {
+                'type': name,
+                'date': obj.timeline_day,
+                'data': row,
+            }))
+    entries.sort(key=lambda entry: entry[0], reverse=True)
+    return [entry for _, entry in entries], next_before
@@ -0,0 +1,178 @@
+import threading
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Appointment, Token
+
+
+# Token queue events
+# Saving or deleting a Token publishes a small delta (issued, called,
+# completed, updated, removed) on the channel of its doctor and day once the
+# transaction commits. Subscribers, such as the waiting-room stream in
+# async_views.py, receive each event through a callback, so one save fans out
+# to every open screen without a query per screen. The broker lives in
+# process memory: run the stream in the same ASGI process that saves tokens,
+# or replace the broker with a shared pub/sub when running several workers.
+# The channel comes from the token's appointment when it is already loaded;
+# otherwise the events of a transaction look up all their appointments in
+# one query as it commits, so cascades and bulk deletes do not query once per
+# token. Appointments deleted in the same transaction leave their channel
+# behind for that lookup (see remember_deleted_appointment).
+# Moves that are not queue changes, such as archiving old tokens, run inside
+# muted_token_events() and publish nothing.
+
+_muted = ContextVar('clinic_token_events_muted', default=False)
+
+def channel_name(doctor_id, day):
+    return f"{doctor_id}:{day.isoformat()}"
+
+
+def token_payload(token):
+    return {
+        'id': token.pk,
+        'token_number': token.token_number,
+        'appointment': token.appointment_id,
+        'state': token.queue_state,
+        'called_at': token.called_at.isoformat() if token.called_at else None,
+    }
+
+
+def queue_snapshot(doctor_id, day):
+    """The current queue as a list of payloads; a single query."""
+    tokens = (
+        Token.all_objects.filter(appointment__doctor_id=doctor_id, appointment__appointment_date=day)
+        .only('id', 'token_number', 'appointment', 'status', 'called_at')
+        .order_by('token_number', 'id')
+    )
+    return [token_payload(token) for token in tokens]
+
+
+class TokenEventBroker:
+    """In-process pub/sub keyed by channel, keeping recent events for reconnects.
+
+    Event ids count up per channel. History is kept for the most recently
+    used ``max_channels`` channels, ``history`` events each.
+    """
+
+    def __init__(self, history=100, max_channels=1000):
+        self.history_size = history
+        self.max_channels = max_channels
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+        self.history = OrderedDict()  # channel -> (last event id, deque of events)
+
+    def publish(self, channel, event_type, payload):
+        with self.lock:
+            last_id, events = self.history.pop(channel, (0, None))
+            if events is None:
+                events = deque(maxlen=self.history_size)
+            event = {'id': last_id + 1, 'type': event_type, 'token': payload}
+            events.append(event)
+            self.history[channel] = (event['id'], events)
+            while len(self.history) > self.max_channels:
+                self.history.popitem(last=False)
+            callbacks = list(self.subscribers.get(channel, ()))
+        for callback in callbacks:
+            callback(event)
+        return event
+
+    def subscribe(self, channel, callback, last_event_id=None):
+        """Register ``callback`` and return the events missed since ``last_event_id``.
+
+        Returns ``None`` instead when those events are no longer all kept, in
+        which case the subscriber should start from a fresh snapshot.
+        """
+        with self.lock:
+            self.subscribers[channel].add(callback)
+            if last_event_id is None or channel not in self.history:
+                return None
+            last_id, events = self.history[channel]
+            events = list(events)
+        if last_event_id > last_id or (events and events[0]['id'] > last_event_id + 1):
+            return None
+        return [event for event in events if event['id'] > last_event_id]
+
+    def unsubscribe(self, channel, callback):
+        with self.lock:
+            subscribers = self.subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(callback)
+                if not subscribers:
+                    del self.subscribers[channel]
+
+
+token_broker = TokenEventBroker(getattr(settings, 'CLINIC_TOKEN_EVENT_HISTORY', 100))
+
+
+@contextmanager
+def muted_token_events():
+    token = _muted.set(True)
+    try:
+        yield
+    finally:
+        _muted.reset(token)
+
+
+class PendingEvents:
+    """Events waiting for their transaction to commit, with the appointments whose channel they need."""
+
+    def __init__(self):
+        self.appointments = set()
+        self.deleted = {}
+        self.channels = None
+
+    def publish(self, appointment_id, event_type, payload):
+        if self.channels is None:
+            # The first event to commit looks up the channels of all the others.
+            self.channels = dict(self.deleted)
+            self.channels.update(
+                (pk, channel_name(doctor_id, day)) for pk, doctor_id, day in
+                Appointment.all_objects.filter(pk__in=self.appointments)
+                .values_list('pk', 'doctor_id', 'appointment_date')
+            )
+        channel = self.channels.get(appointment_id)
+        if channel is not None:
+            token_broker.publish(channel, event_type, payload)
+
+
+_pending = threading.local()
+
+
+def pending_events():
+    pending = getattr(_pending, 'events', None)
+    if pending is None or pending.channels is not None:
+        pending = _pending.events = PendingEvents()
+    return pending
+
+
+def publish_token_event(token, event_type):
+    if _muted.get():
+        return
+    payload = token_payload(token)
+    if Token.appointment.is_cached(token):
+        appointment = token.appointment
+        channel = channel_name(appointment.doctor_id, appointment.appointment_date)
+        transaction.on_commit(lambda: token_broker.publish(channel, event_type, payload))
+        return
+    pending, appointment_id = pending_events(), token.appointment_id
+    pending.appointments.add(appointment_id)
+    transaction.on_commit(lambda: pending.publish(appointment_id, event_type, payload))
+
+
+def remember_deleted_appointment(appointment):
+    """Keep the channel of a deleted appointment for token events still waiting to commit."""
+    pending = getattr(_pending, 'events', None)
+    if pending is not None and pending.channels is None and appointment.pk in pending.appointments:
+        pending.deleted[appointment.pk] = channel_name(appointment.doctor_id, appointment.appointment_date)
+
+
+def token_event_type(token, created):
+    if created:
+        return 'issued'
+    if token.queue_state == 'waiting':
+        return 'updated'
+    return token.queue_state
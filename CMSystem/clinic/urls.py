@@ -1,4 +1,4 @@
-from .import views
+from .import views, async_views
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
@@ -8,6 +8,11 @@ from .views import (
     ListGroupsView,
     DeleteGroupView,
     ChangePasswordView,
+    ProfilingReportView,
+    DatabaseConnectionsView,
+    RollupSummaryView,
+    RollupDailyView,
+    DiagnosisSummaryView,
 )
 
 # Create a router object
@@ -42,6 +47,15 @@ urlpatterns = [
     path('groups/', ListGroupsView.as_view(), name='list-groups'),
     path('groups/delete/<int:group_id>/', DeleteGroupView.as_view(), name='delete-group'),
     path('staff/change-password/', ChangePasswordView.as_view(), name='staff-change-password'),
+    path('profiling/', ProfilingReportView.as_view(), name='profiling-report'),
+    path('db-connections/', DatabaseConnectionsView.as_view(), name='db-connections'),
+    path('reports/summary/', RollupSummaryView.as_view(), name='report-summary'),
+    path('reports/daily/', RollupDailyView.as_view(), name='report-daily'),
+    path('reports/diagnoses/', DiagnosisSummaryView.as_view(), name='report-diagnoses'),
+    path('async/appointments/', async_views.doctor_appointments, name='async-doctor-appointments'),
+    path('async/tokens/queue/', async_views.token_queue, name='async-token-queue'),
+    path('async/tokens/stream/', async_views.token_stream, name='async-token-stream'),
+    path('async/patients/lookup/', async_views.patient_lookup, name='async-patient-lookup'),
 ]
 
 urlpatterns+=router.urls
\ No newline at end of file
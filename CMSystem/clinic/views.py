@@ -2,14 +2,16 @@ from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, viewsets
-from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.utils.urls import replace_query_param
 from django.contrib.auth.models import Group
 from django.contrib.auth.hashers import check_password
 
 from .models import (
     Department, Gender, MedicineType, Prescription, Receptionist, Salary, Medicine, Staff, 
-    Patient, Appointment, Specialization, Doctor, Schedule, TimeSlot, 
+    Patient, Appointment, AppointmentConflict, Specialization, Doctor, Schedule, ScheduleFull, TimeSlot, 
     Token, Consultation, MedicalRecord, Bill
 )
 from .serializers import (
@@ -18,8 +20,26 @@ from .serializers import (
     ScheduleSerializer, TimeSlotSerializer, TokenSerializer, 
     ConsultationSerializer, MedicalRecordSerializer, BillSerializer, 
     PrescriptionSerializer, MedicineSerializer, SalarySerializer, 
-    MedicineTypeSerializer, ReceptionistSerializer, GenderSerializer, DepartmentSerializer
+    MedicineTypeSerializer, ReceptionistSerializer, GenderSerializer, DepartmentSerializer,
+    AvailabilityQuerySerializer, TokenIssueSerializer, PatientBulkSerializer,
+    AppointmentBulkSerializer, ScheduleBulkSerializer, PatientSearchQuerySerializer, PayrollRunSerializer,
+    ReportQuerySerializer, TimelineQuerySerializer
 )
+from .query_plans import QueryPlanMixin
+from .pagination import ClinicCursorPagination
+from .bulk import BulkActionMixin
+from .conflicts import check_batch, check_capacity
+from .exports import StreamingExportMixin, CONSULTATION_EXPORT, MEDICAL_RECORD_EXPORT
+from .history import HotHistoryMixin
+from .caching import ReferenceCacheMixin
+from .search import search_patients
+from .payroll import run_payroll
+from .pooling import connection_report
+from .profiling import profile_store
+from .reporting import diagnosis_summary, rollup_daily, rollup_summary
+from .routing import ReplicaReadMixin
+from .timeline import patient_timeline
+from .authentication import CachedJWTAuthentication
 
 # Login
 class LoginView(APIView):
@@ -52,13 +72,16 @@ class SignupView(APIView):
 class StaffViewSet(viewsets.ModelViewSet):
     queryset = Staff.objects.all()
     serializer_class = StaffSerializer
+    pagination_class = ClinicCursorPagination
     permission_classes = [AllowAny]
 
 
 # Patient
-class PatientViewSet(viewsets.ModelViewSet):
+class PatientViewSet(BulkActionMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Patient.objects.all()
     serializer_class = PatientSerializer
+    pagination_class = ClinicCursorPagination
+    bulk_serializer_class = PatientBulkSerializer
     permission_classes = [AllowAny]
 
     def create(self, request, *args, **kwargs):
@@ -69,96 +92,224 @@ class PatientViewSet(viewsets.ModelViewSet):
                             status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        query = PatientSearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        patients = search_patients(self.get_queryset(), query.validated_data['q'], query.validated_data['limit'])
+        return Response(self.get_serializer(patients, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def timeline(self, request, pk=None):
+        query = TimelineQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        patient = self.get_object()
+        entries, next_before = patient_timeline(
+            patient, params.get('before'), params['days'], context=self.get_serializer_context(),
+        )
+        next_url = None
+        if next_before is not None:
+            next_url = replace_query_param(request.build_absolute_uri(), 'before', next_before.isoformat())
+        return Response({
+            'patient': self.get_serializer(patient).data,
+            'next': next_url,
+            'results': entries,
+        })
+
 
 # Appointment
-class AppointmentViewSet(viewsets.ModelViewSet):
+class AppointmentViewSet(BulkActionMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Appointment.objects.all()
     serializer_class = AppointmentSerializer
+    pagination_class = ClinicCursorPagination
+    bulk_serializer_class = AppointmentBulkSerializer
     permission_classes = [AllowAny]
-    # authentication_classes = [JWTAuthentication]
+    # authentication_classes = [CachedJWTAuthentication]
     # permission_classes = [IsAuthenticated]
 
+    def perform_create(self, serializer):
+        try:
+            serializer.save()
+        except (AppointmentConflict, ScheduleFull) as exc:
+            raise ValidationError(exc.message_dict)
+
+    def perform_update(self, serializer):
+        try:
+            serializer.save()
+        except (AppointmentConflict, ScheduleFull) as exc:
+            raise ValidationError(exc.message_dict)
+
+    def check_bulk_instances(self, instances):
+        rejected = check_batch(instances)
+        positions = [position for position in range(len(instances)) if position not in rejected]
+        full = check_capacity([instances[position] for position in positions])
+        rejected.update({positions[position]: errors for position, errors in full.items()})
+        return rejected
+
 
 # Specialization
-class SpecializationViewSet(viewsets.ModelViewSet):
+class SpecializationViewSet(ReferenceCacheMixin, viewsets.ModelViewSet):
     queryset = Specialization.objects.all()
     serializer_class = SpecializationSerializer
-    authentication_classes = [JWTAuthentication]
+    pagination_class = ClinicCursorPagination
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
 
 # Doctor
-class DoctorViewSet(viewsets.ModelViewSet):
+class DoctorViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Doctor.objects.all()
     serializer_class = DoctorSerializer
-    authentication_classes = [JWTAuthentication]
+    pagination_class = ClinicCursorPagination
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
 
 # Schedule
-class ScheduleViewSet(viewsets.ModelViewSet):
+class ScheduleViewSet(BulkActionMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Schedule.objects.all()
     serializer_class = ScheduleSerializer
-    authentication_classes = [JWTAuthentication]
+    pagination_class = ClinicCursorPagination
+    bulk_serializer_class = ScheduleBulkSerializer
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
+    @action(detail=False, methods=['get'])
+    def available(self, request):
+        query = AvailabilityQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        queryset = self.get_queryset().filter(
+            status=True,
+            remaining_tokens__gt=0,
+            schedule_date__range=(params['date_from'], params['date_to']),
+        )
+        if params.get('specialization'):
+            queryset = queryset.filter(doctor__specialization=params['specialization'])
+        queryset = queryset.order_by('schedule_date', 'id')
+        # Pages keep the date order too. The cursor keys on the date and
+        # offsets past the few schedules that share it.
+        self.cursor_ordering = ('schedule_date', 'id')
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(queryset, many=True).data)
+
 
 # Time Slot
-class TimeSlotViewSet(viewsets.ModelViewSet):
+class TimeSlotViewSet(ReferenceCacheMixin, viewsets.ModelViewSet):
     queryset = TimeSlot.objects.all()
     serializer_class = TimeSlotSerializer
-    authentication_classes = [JWTAuthentication]
+    pagination_class = ClinicCursorPagination
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
 
 # Token
-class TokenViewSet(viewsets.ModelViewSet):
+class TokenViewSet(HotHistoryMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Token.objects.all()
     serializer_class = TokenSerializer
+    pagination_class = ClinicCursorPagination
+    history_field = 'issued_at'
     permission_classes = [AllowAny]
-    # authentication_classes = [JWTAuthentication]
+    # authentication_classes = [CachedJWTAuthentication]
     # permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        if self.action in ('call', 'complete'):
+            # Completed tokens drop out of Token.objects; these actions still find them.
+            self.queryset = Token.all_objects.all()
+        return super().get_queryset()
+
+    @action(detail=False, methods=['post'])
+    def issue(self, request):
+        serializer = TokenIssueSerializer(data=request.data)
+        if serializer.is_valid():
+            token = Token.issue(serializer.validated_data['appointment'])
+            token = self.get_queryset().get(pk=token.pk)
+            return Response(self.get_serializer(token).data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['post'])
+    def call(self, request, pk=None):
+        token = self.get_object()
+        if not token.status:
+            return Response({"error": "Token is already completed"}, status=status.HTTP_400_BAD_REQUEST)
+        token.call()
+        return Response(self.get_serializer(token).data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        token = self.get_object()
+        token.complete()
+        return Response(self.get_serializer(token).data, status=status.HTTP_200_OK)
+
 
 # Consultation
-class ConsultationViewSet(viewsets.ModelViewSet):
+class ConsultationViewSet(
+    HotHistoryMixin, ReplicaReadMixin, StreamingExportMixin, QueryPlanMixin, viewsets.ModelViewSet,
+):
     queryset = Consultation.objects.all()
     serializer_class = ConsultationSerializer
+    pagination_class = ClinicCursorPagination
+    export_spec = CONSULTATION_EXPORT
+    history_field = 'created_at'
     permission_classes = [AllowAny]
-    # authentication_classes = [JWTAuthentication]
+    # authentication_classes = [CachedJWTAuthentication]
     # permission_classes = [IsAuthenticated]
 
 
 # Medical Record
-class MedicalRecordViewSet(viewsets.ModelViewSet):
+class MedicalRecordViewSet(ReplicaReadMixin, StreamingExportMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = MedicalRecord.objects.all()
     serializer_class = MedicalRecordSerializer
-    authentication_classes = [JWTAuthentication]
+    pagination_class = ClinicCursorPagination
+    export_spec = MEDICAL_RECORD_EXPORT
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
 
 # Bill
-class BillViewSet(viewsets.ModelViewSet):
+class BillViewSet(ReplicaReadMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Bill.objects.all()
     serializer_class = BillSerializer
-    authentication_classes = [JWTAuthentication]
+    pagination_class = ClinicCursorPagination
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
 
 # Prescription
-class PrescriptionViewSet(viewsets.ModelViewSet):
-    authentication_classes = [JWTAuthentication]
+class PrescriptionViewSet(QueryPlanMixin, viewsets.ModelViewSet):
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     queryset = Prescription.objects.all()
     serializer_class = PrescriptionSerializer
+    pagination_class = ClinicCursorPagination
 
 
 # Salary
-class SalaryViewSet(viewsets.ModelViewSet):
-    authentication_classes = [JWTAuthentication]
+class SalaryViewSet(QueryPlanMixin, viewsets.ModelViewSet):
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     queryset = Salary.objects.all()
     serializer_class = SalarySerializer
+    pagination_class = ClinicCursorPagination
+
+    @action(detail=False, methods=['post'], url_path='payroll-run')
+    def payroll_run(self, request):
+        serializer = PayrollRunSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        adjustments = {}
+        for adjustment in data.get('adjustments', []):
+            staff = adjustment.pop('staff')
+            adjustments[staff.pk] = adjustment
+        result = run_payroll(data['period'], data.get('payment_date'), adjustments)
+        return Response(result, status=status.HTTP_200_OK)
 
 
 # Group Management
@@ -190,6 +341,59 @@ class DeleteGroupView(APIView):
             return Response({"error": "Group not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
+# Profiling report (populated when QueryProfilingMiddleware is enabled)
+class ProfilingReportView(APIView):
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({"endpoints": profile_store.report()}, status=status.HTTP_200_OK)
+
+    def delete(self, request):
+        profile_store.reset()
+        return Response({"message": "Profiling data cleared"}, status=status.HTTP_200_OK)
+
+
+# Database connection counters of the worker answering the request (see pooling.py)
+class DatabaseConnectionsView(APIView):
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(connection_report(), status=status.HTTP_200_OK)
+
+
+# Dashboard reports, answered from the daily rollups (see reporting.py)
+class ReportView(ReplicaReadMixin, APIView):
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = ReportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        return Response({
+            'date_from': params['date_from'],
+            'date_to': params['date_to'],
+            'results': self.report(params),
+        }, status=status.HTTP_200_OK)
+
+
+class RollupSummaryView(ReportView):
+    def report(self, params):
+        return rollup_summary(params['dimension'], params['date_from'], params['date_to'])
+
+
+class RollupDailyView(ReportView):
+    def report(self, params):
+        return rollup_daily(params['dimension'], params['date_from'], params['date_to'], params.get('key'))
+
+
+class DiagnosisSummaryView(ReportView):
+    def report(self, params):
+        return diagnosis_summary(params['date_from'], params['date_to'])
+
+
 # Change Password
 class ChangePasswordView(APIView):
     def post(self, request):
@@ -214,39 +418,45 @@ class ChangePasswordView(APIView):
 
 
 # Medicine Type
-class MedicineTypeViewSet(viewsets.ModelViewSet):
-    authentication_classes = [JWTAuthentication]
+class MedicineTypeViewSet(ReferenceCacheMixin, viewsets.ModelViewSet):
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     queryset = MedicineType.objects.all()
     serializer_class = MedicineTypeSerializer
+    pagination_class = ClinicCursorPagination
 
 
 # Receptionist
 class ReceptionistViewSet(viewsets.ModelViewSet):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     queryset = Receptionist.objects.all()
     serializer_class = ReceptionistSerializer
+    pagination_class = ClinicCursorPagination
 
 
 # Medicine
-class MedicineViewSet(viewsets.ModelViewSet):
-    authentication_classes = [JWTAuthentication]
+class MedicineViewSet(ReferenceCacheMixin, QueryPlanMixin, viewsets.ModelViewSet):
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     queryset = Medicine.objects.all()
     serializer_class = MedicineSerializer
+    pagination_class = ClinicCursorPagination
+    cache_models = (Medicine, MedicineType)
 
 #gender
-class GenderViewSet(viewsets.ModelViewSet):
-    authentication_classes = [JWTAuthentication]  # Authenticate using JWT
+class GenderViewSet(ReferenceCacheMixin, viewsets.ModelViewSet):
+    authentication_classes = [CachedJWTAuthentication]  # Authenticate using JWT
     permission_classes = [IsAuthenticated]  # Only allow authenticated users
     queryset = Gender.objects.all()  # Fetch all genders
     serializer_class = GenderSerializer  # Use the GenderSerializer
+    pagination_class = ClinicCursorPagination
 
 #dep
 #Department
-class DepartmentViewSet(viewsets.ModelViewSet):
-    authentication_classes = [JWTAuthentication]  # Authenticate using JWT
+class DepartmentViewSet(ReferenceCacheMixin, viewsets.ModelViewSet):
+    authentication_classes = [CachedJWTAuthentication]  # Authenticate using JWT
     permission_classes = [IsAuthenticated]  # Only allow authenticated users
     queryset = Department.objects.all()  # Fetch all departments
     serializer_class = DepartmentSerializer  # Use the DepartmentSerializer
+    pagination_class = ClinicCursorPagination